@@ -0,0 +1,222 @@
+"""应用设置（app_config.json）
+
+设置保存在内存中，读取不碰磁盘；修改后发出 changed 信号，并由后台线程合并写盘：
+停止修改一段时间后才写，先写临时文件再改名，写到一半崩溃也不会损坏配置。
+外部编辑配置文件时通过文件监视自动重新加载。
+"""
+import copy
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from PyQt5.QtCore import QObject, QThread, QTimer, QFileSystemWatcher, pyqtSignal
+
+CONFIG_FILE = "app_config.json"
+SAVE_DELAY = 500  # 最后一次修改后多久写盘（毫秒）
+
+
+@dataclass(frozen=True)
+class Setting:
+    """设置项：键名与默认值，值的类型以默认值为准"""
+    key: str
+    default: Any
+    
+    def coerce(self, value):
+        """把配置文件中的值转换为正确的类型，无法转换时返回默认值"""
+        kind = type(self.default)
+        if isinstance(value, kind) and not (kind is int and isinstance(value, bool)):
+            return value
+        try:
+            if kind is bool:
+                if isinstance(value, str):
+                    return value.strip().lower() in ("1", "true", "yes", "on")
+                return bool(value)
+            if kind in (int, float, str):
+                return kind(value)
+        except (TypeError, ValueError):
+            pass
+        return copy.deepcopy(self.default)
+
+
+BACKGROUND = Setting("background", "")
+BLUR = Setting("blur", 0)
+WARM_POOL = Setting("warm_pool", False)
+SNIPPETS = Setting("snippets", [])  # [{"name": ..., "command": ...}]
+RESTORE_TABS = Setting("restore_tabs", True)
+SCROLLBACK_KB = Setting("restore_scrollback_kb", 64)  # 恢复标签页时保留的终端内容（KB），0表示不保存
+ENGINE = Setting("engine", False)  # 在独立进程中处理SSH连接
+LAG_MONITOR = Setting("lag_monitor", False)  # 记录界面卡顿及其调用位置
+
+
+class _SettingsWriter(QThread):
+    """单一的写盘线程，只写最新的一份内容"""
+    
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._cond = threading.Condition()
+        self._pending: Optional[str] = None
+        self._running = True
+    
+    def submit(self, text: str):
+        with self._cond:
+            self._pending = text
+            self._cond.notify()
+        if not self.isRunning():
+            self.start(QThread.LowPriority)
+    
+    def stop(self):
+        """写完待写的内容后退出"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+        if self._pending is not None:
+            # 线程尚未启动或已退出，在当前线程补写
+            self._write(self._pending)
+            self._pending = None
+    
+    def run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                text, self._pending = self._pending, None
+                running = self._running
+            if text is not None:
+                self._write(text)
+            if not running:
+                return
+    
+    def _write(self, text: str):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"保存配置失败: {e}")
+
+
+class AppSettings(QObject):
+    """内存中的应用设置"""
+    
+    changed = pyqtSignal(str)  # 变化的键名，新值用 get() 读取
+    
+    def __init__(self, path: str = None, save_delay: int = SAVE_DELAY):
+        super().__init__()
+        self.path = path or os.path.join(os.path.dirname(__file__), CONFIG_FILE)
+        self.save_delay = save_delay
+        self._data: Dict[str, Any] = self._read()
+        self._written = deque(maxlen=8)  # 最近自己写入的内容，用于忽略自己触发的文件变化
+        self._writer = _SettingsWriter(self.path)
+        self._timer: Optional[QTimer] = None
+        self._watcher: Optional[QFileSystemWatcher] = None
+        self._file_state = None  # 上次看到的配置文件 (修改时间, 大小, inode)
+        self.write_count = 0
+    
+    def _read(self) -> Dict[str, Any]:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                if text.strip():
+                    data = json.loads(text)
+                    if isinstance(data, dict):
+                        return data
+        except Exception as e:
+            print(f"加载配置失败: {e}")
+        return {}
+    
+    def get(self, setting: Setting):
+        if setting.key not in self._data:
+            return copy.deepcopy(setting.default)
+        value = setting.coerce(self._data[setting.key])
+        return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+    
+    def set(self, setting: Setting, value):
+        """修改设置，值没有变化时不做任何事"""
+        value = setting.coerce(value)
+        if setting.key in self._data and self.get(setting) == value:
+            return
+        self._data[setting.key] = copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+        self.changed.emit(setting.key)
+        self._schedule_save()
+    
+    def _schedule_save(self):
+        if self._timer is None:
+            self._timer = QTimer(self)
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self.save)
+        self._timer.start(self.save_delay)
+    
+    def save(self):
+        """把当前设置交给写盘线程"""
+        if self._timer is not None:
+            self._timer.stop()
+        text = json.dumps(self._data, ensure_ascii=False, indent=2)
+        self._written.append(text)
+        self.write_count += 1
+        self._writer.submit(text)
+    
+    def flush(self):
+        """立即写入尚未保存的修改（退出前调用）"""
+        if self._timer is not None and self._timer.isActive():
+            self.save()
+        self._writer.stop()
+    
+    def watch(self):
+        """监视配置文件，外部修改后重新加载（需要在QApplication创建后调用）"""
+        if self._watcher is None:
+            self._watcher = QFileSystemWatcher(self)
+            self._watcher.fileChanged.connect(self._on_file_changed)
+            self._watcher.directoryChanged.connect(self._on_file_changed)
+        # 写临时文件再改名会替换掉原文件，监视其所在目录才能一直收到通知
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if self._file_state is None:
+            self._file_state = self._stat_file()
+        for path in (self.path, directory):
+            if os.path.exists(path) and path not in self._watcher.files() + self._watcher.directories():
+                self._watcher.addPath(path)
+    
+    def _stat_file(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+    
+    def _on_file_changed(self, _path: str):
+        # 目录中其它文件（servers.db-wal、history.json 等）的写入也会触发，配置文件没变时不读取
+        state = self._stat_file()
+        if state == self._file_state:
+            return
+        self._file_state = state
+        self.watch()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            return
+        if text in self._written or self._timer is not None and self._timer.isActive():
+            # 自己写入的内容，或者本地还有没保存的修改（以本地为准）
+            return
+        try:
+            data = json.loads(text) if text.strip() else {}
+        except ValueError:
+            return  # 外部编辑器可能正写到一半
+        if not isinstance(data, dict) or data == self._data:
+            return
+        old, self._data = self._data, data
+        for key in set(old) | set(data):
+            if old.get(key) != data.get(key):
+                self.changed.emit(key)
+
+
+# 全局设置
+app_settings = AppSettings()
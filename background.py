@@ -0,0 +1,192 @@
+"""背景图片渲染
+
+解码、缩放和模糊都在后台线程完成，界面线程只负责显示结果。
+模糊用"逐级缩小再逐级放大"近似高斯模糊，比 QGraphicsBlurEffect 快得多；
+渲染结果按 (路径, 修改时间, 尺寸档位, 模糊半径) 做LRU缓存，
+新的一帧准备好之前界面上保持显示上一帧。
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal, QRect, QRectF, QSize
+from PyQt5.QtGui import QImage, QImageReader, QPainter
+
+SIZE_BUCKET = 128  # 窗口尺寸按该粒度向上取整，微小的尺寸变化可以复用同一帧
+CACHE_SIZE = 8
+STRIP_HEIGHT = 64  # 分条带缩放时每条的行数
+BLUR_SCALE = 0.5  # 设置中的模糊程度0-100映射到半径0-50
+
+CacheKey = Tuple[str, int, int, int, int]
+
+
+def size_bucket(width: int, height: int) -> Tuple[int, int]:
+    return (max(1, math.ceil(width / SIZE_BUCKET)) * SIZE_BUCKET,
+            max(1, math.ceil(height / SIZE_BUCKET)) * SIZE_BUCKET)
+
+
+def _paint_scaled(image: QImage, width: int, height: int, rect: QRect = None) -> QImage:
+    """把image中的rect区域（默认整张）双线性缩放到指定尺寸，按条带分多次绘制
+    
+    PyQt调用Qt函数时不释放GIL，一次性缩放大图会让界面线程卡住几十毫秒；
+    分条带绘制并在每条之后主动让出GIL，界面线程最多只等一条的时间。
+    """
+    result = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(result)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    target, source = QRectF(0, 0, width, height), QRectF(rect or image.rect())
+    for y in range(0, height, STRIP_HEIGHT):
+        painter.setClipRect(0, y, width, STRIP_HEIGHT)
+        painter.drawImage(target, image, source)
+        time.sleep(0)
+    painter.end()
+    return result
+
+
+def resample(image: QImage, width: int, height: int, rect: QRect = None) -> QImage:
+    """把rect区域缩放到指定尺寸；缩小超过2倍时先逐级减半（每级恰好是2x2平均），避免锯齿"""
+    rect = rect or image.rect()
+    while rect.width() >= width * 2 and rect.height() >= height * 2:
+        image = _paint_scaled(image, rect.width() // 2, rect.height() // 2, rect)
+        rect = image.rect()
+    return _paint_scaled(image, width, height, rect)
+
+
+def fast_blur(image: QImage, radius: float, width: int = 0, height: int = 0, rect: QRect = None) -> QImage:
+    """把rect区域（默认整张）缩放到 width x height（默认原尺寸），同时做近似半径为radius的模糊
+    
+    先逐级减半到 1/2^n（盒式滤波），再每次放大2倍逐级还原；
+    逐级的双线性放大相当于叠加了多次三角滤波，效果接近高斯模糊，且没有一次放大时的块状纹理。
+    """
+    width, height = width or image.width(), height or image.height()
+    levels = max(0, round(math.log2(max(radius, 1))))
+    image = resample(image, max(1, round(width / 2 ** levels)), max(1, round(height / 2 ** levels)), rect)
+    for level in range(levels - 1, -1, -1):
+        image = _paint_scaled(image, max(1, round(width / 2 ** level)), max(1, round(height / 2 ** level)))
+    return image
+
+
+def cover_rect(source_width: int, source_height: int, width: int, height: int) -> QRect:
+    """源图中按"铺满并居中裁剪"方式对应到目标尺寸的区域"""
+    scale = max(width / source_width, height / source_height)
+    crop_width = min(source_width, max(1, round(width / scale)))
+    crop_height = min(source_height, max(1, round(height / scale)))
+    return QRect((source_width - crop_width) // 2, (source_height - crop_height) // 2,
+                 crop_width, crop_height)
+
+
+class BackgroundRenderer(QThread):
+    """后台背景渲染线程
+    
+    request() 可以在界面线程频繁调用：命中缓存时立即发出 frameReady，
+    否则只保留最新的一个请求交给后台线程，过时的请求直接丢弃。
+    """
+    
+    frameReady = pyqtSignal(QImage)
+    
+    def __init__(self, parent=None, cache_size: int = CACHE_SIZE, max_size: QSize = None):
+        super().__init__(parent)
+        self.max_size = max_size  # 超过该尺寸的图片解码时直接缩小（通常为屏幕尺寸）
+        self._cond = threading.Condition()
+        self._pending: Optional[Tuple[CacheKey, str]] = None
+        self._wanted: Optional[CacheKey] = None  # 当前需要显示的帧
+        self._running = True
+        self._cache: "OrderedDict[CacheKey, QImage]" = OrderedDict()
+        self._cache_size = cache_size
+        self._source: Optional[Tuple[str, int, QImage]] = None  # 最近解码的原图 (路径, 修改时间, 图片)
+    
+    def request(self, path: str, width: int, height: int, blur: int):
+        """请求渲染指定尺寸和模糊程度的背景"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.cancel()
+            return
+        bucket_width, bucket_height = size_bucket(width, height)
+        key = (path, mtime, bucket_width, bucket_height, blur)
+        with self._cond:
+            if key == self._wanted and self._pending is None:
+                return
+            self._wanted = key
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+                self._pending = None
+            else:
+                self._pending = (key, path)
+                self._cond.notify()
+        if image is not None:
+            self.frameReady.emit(image)
+        elif not self.isRunning():
+            self.start(QThread.LowPriority)
+    
+    def cancel(self):
+        """不再需要背景（已清除）"""
+        with self._cond:
+            self._wanted = None
+            self._pending = None
+    
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+    
+    def run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                key, path = self._pending
+                self._pending = None
+            
+            try:
+                image = self._render(path, key)
+            except Exception as e:
+                print(f"渲染背景失败: {e}")
+                continue
+            if image is None:
+                continue
+            
+            with self._cond:
+                self._cache[key] = image
+                self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+                wanted = key == self._wanted
+            if wanted:
+                self.frameReady.emit(image)
+    
+    def _load_source(self, path: str, mtime: int) -> QImage:
+        if self._source is not None and self._source[:2] == (path, mtime):
+            return self._source[2]
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if self.max_size is not None and size.isValid():
+            # 4K壁纸在小屏幕上不需要全分辨率，JPEG可以在解码时直接缩小，快得多
+            scale = max(self.max_size.width() / size.width(), self.max_size.height() / size.height())
+            if scale < 1:
+                reader.setScaledSize(QSize(max(1, round(size.width() * scale)),
+                                           max(1, round(size.height() * scale))))
+        image = reader.read()
+        if image.isNull():
+            print(f"加载背景图片失败: {reader.errorString()}")
+            return image
+        image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        self._source = (path, mtime, image)
+        return image
+    
+    def _render(self, path: str, key: CacheKey) -> Optional[QImage]:
+        _, mtime, width, height, blur = key
+        source = self._load_source(path, mtime)
+        if source.isNull():
+            return None
+        # 只缩放铺满窗口时可见的区域
+        rect = cover_rect(source.width(), source.height(), width, height)
+        return fast_blur(source, blur * BLUR_SCALE, width, height, rect)
@@ -0,0 +1,316 @@
+"""界面性能基准测试
+
+在 offscreen 平台上把合成的数据喂给真实的组件，每个场景在新的子进程中运行（峰值内存互不影响）：
+- flood：TerminalWidget.append_output 持续接收日志输出（默认100MB，每块4KB，与 SSHWorker 一致）
+- top：TerminalWidget 接收 top 式的整屏刷新（清屏、反色标题、40行进程表）
+- listing：SFTPFileInterface.load_directory 显示20万个条目的目录
+- inventory：ServerListWidget.load_server_list 加载2万台服务器（临时数据库），以及逐字输入筛选
+
+报告吞吐、卡顿（界面线程两次心跳之间超过50ms，即掉帧）与峰值内存。
+数据按块经由事件循环送入，和真实信号一样与绘制、定时器交替执行。
+
+用法：
+    python benchmarks/gui_bench.py [--quick] [--only 场景,...] [--json 输出文件]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("flood", "top", "listing", "inventory")
+HEARTBEAT_MS = 16  # 一帧
+STALL_MS = 50  # 超过这个间隔记为卡顿
+CHUNK = 4096
+
+LOG_LINE = "2024-05-17 12:00:{sec:02d}.{ms:03d} INFO  worker[{pid}]: GET /api/v1/items/{i} 200 {cost}ms bytes={size}\n"
+
+
+def peak_rss_mb() -> float:
+    """本进程的峰值内存（MB），无法获取时返回0"""
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        import ctypes
+        from ctypes import wintypes
+        
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return 0.0
+        return counters.PeakWorkingSetSize / 1048576
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+
+
+# ---- 子进程中运行的场景 ----
+
+class FrameMonitor:
+    """界面线程心跳：记录相邻两次心跳的间隔，超过 STALL_MS 记为卡顿"""
+    
+    def __init__(self):
+        from PyQt5.QtCore import QTimer
+        self.gaps = []
+        self._last = None
+        self.timer = QTimer()
+        self.timer.setInterval(HEARTBEAT_MS)
+        self.timer.timeout.connect(self._beat)
+    
+    def start(self):
+        self._last = time.perf_counter()
+        self.timer.start()
+    
+    def stop(self):
+        self.timer.stop()
+        self._beat()
+    
+    def _beat(self):
+        now = time.perf_counter()
+        self.gaps.append((now - self._last) * 1000)
+        self._last = now
+    
+    def summary(self) -> dict:
+        stalls = [gap for gap in self.gaps if gap > STALL_MS]
+        return {
+            "stalls": len(stalls),
+            "stalled_ms": sum(stalls),
+            "max_gap_ms": max(self.gaps, default=0.0),
+        }
+
+
+def pump(app, feed, items) -> float:
+    """每次事件循环迭代送入一项，全部送完后返回耗时（秒）"""
+    from PyQt5.QtCore import QTimer
+    iterator = iter(items)
+    timer = QTimer()
+    timer.setInterval(0)
+    
+    def step():
+        item = next(iterator, None)
+        if item is None:
+            timer.stop()
+            app.quit()
+            return
+        feed(item)
+    timer.timeout.connect(step)
+    started = time.perf_counter()
+    timer.start()
+    app.exec_()
+    return time.perf_counter() - started
+
+
+def log_chunks(total: int):
+    """约 total 字节的日志输出，按 CHUNK 切块"""
+    buffer, sent, i = "", 0, 0
+    while sent < total:
+        while len(buffer) < CHUNK:
+            buffer += LOG_LINE.format(sec=i % 60, ms=i % 1000, pid=1000 + i % 64, i=i,
+                                      cost=i % 250, size=i * 37 % 65536)
+            i += 1
+        chunk, buffer = buffer[:CHUNK], buffer[CHUNK:]
+        sent += len(chunk)
+        yield chunk
+
+
+def top_frames(count: int):
+    """top 式的整屏刷新，每帧约3KB"""
+    for frame in range(count):
+        lines = ["\x1b[H\x1b[2J",
+                 f"top - 12:{frame // 60 % 60:02d}:{frame % 60:02d} up 12 days,  3 users,  load average: 0.{frame % 100:02d}, 0.42, 0.40\n",
+                 "Tasks: 312 total,   2 running, 310 sleeping,   0 stopped,   0 zombie\n",
+                 f"%Cpu(s): {frame % 97:4.1f} us,  1.2 sy,  0.0 ni, 90.1 id,  0.1 wa,  0.0 hi,  0.2 si\n",
+                 "MiB Mem :  32012.4 total,   1203.9 free,  12004.2 used,  18804.3 buff/cache\n\n",
+                 "\x1b[7m    PID USER      PR  NI    VIRT    RES    SHR S  %CPU  %MEM     TIME+ COMMAND \x1b[m\n"]
+        for row in range(40):
+            pid = 1000 + (row * 7919 + frame) % 30000
+            cpu = (row * 13 + frame) % 100
+            lines.append(f"\x1b[1m{pid:7d}\x1b[m root      20   0  {row * 1024 + 2048:6d}  {row * 97:5d}  {row * 31:5d} "
+                         f"{'R' if row < 2 else 'S'}  {cpu:4.1f}   0.{row % 10}   {row}:{frame % 60:02d}.{row % 100:02d} process-{row}\n")
+        yield "".join(lines)
+
+
+def run_flood(app, args) -> dict:
+    from terminal import TerminalWidget
+    terminal = TerminalWidget()
+    terminal.resize(1000, 700)
+    terminal.show()
+    app.processEvents()
+    
+    total = args.flood_mb * 1000000
+    monitor = FrameMonitor()
+    monitor.start()
+    elapsed = pump(app, terminal.append_output, log_chunks(total))
+    monitor.stop()
+    return {"mb_per_s": total / elapsed / 1e6, "seconds": elapsed, **monitor.summary()}
+
+
+def run_top(app, args) -> dict:
+    from terminal import TerminalWidget
+    terminal = TerminalWidget()
+    terminal.resize(1000, 700)
+    terminal.show()
+    app.processEvents()
+    
+    costs = []
+    
+    def feed(frame):
+        started = time.perf_counter()
+        terminal.append_output(frame)
+        costs.append((time.perf_counter() - started) * 1000)
+    monitor = FrameMonitor()
+    monitor.start()
+    elapsed = pump(app, feed, top_frames(args.top_frames))
+    monitor.stop()
+    costs.sort()
+    return {"frames_per_s": len(costs) / elapsed, "frame_p50_ms": costs[len(costs) // 2],
+            "frame_p99_ms": costs[min(len(costs) - 1, int(len(costs) * 0.99))], **monitor.summary()}
+
+
+class _ListingClient:
+    """只提供 load_directory 用到的两个方法，返回合成的目录内容（已按 list_dir 的规则排序）"""
+    
+    def __init__(self, entries: int):
+        files = [(f"dir-{i:05d}", True, 4096) for i in range(entries // 50)]
+        files += [(f"file-{i:06d}.log", False, i * 37 % 10000000) for i in range(entries - len(files))]
+        self.files = sorted(files, key=lambda x: (not x[1], x[0].lower()))
+    
+    def is_connected(self) -> bool:
+        return True
+    
+    def list_dir(self, path: str):
+        return list(self.files)
+
+
+def run_listing(app, args) -> dict:
+    from sftp import SFTPFileInterface
+    interface = SFTPFileInterface(_ListingClient(args.entries))
+    interface.resize(600, 800)
+    interface.show()
+    app.processEvents()
+    
+    monitor = FrameMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    interface.load_directory("/var/log")
+    loaded = time.perf_counter() - started
+    pump(app, lambda _: None, range(10))  # 让视图完成一次布局与绘制
+    painted = time.perf_counter() - started
+    monitor.stop()
+    if interface.file_tree.topLevelItemCount() != args.entries:
+        raise RuntimeError(f"条目数不正确: {interface.file_tree.topLevelItemCount()}")
+    return {"load_ms": loaded * 1000, "first_paint_ms": painted * 1000,
+            "entries_per_s": args.entries / loaded, **monitor.summary()}
+
+
+def run_inventory(app, args) -> dict:
+    import servers
+    from config import ServerConfig, ServerConfigManager
+    
+    manager = ServerConfigManager(db_path=os.path.join(args.workdir, "servers.db"))
+    manager.upsert_servers(
+        ServerConfig(id=f"bench-{i}", name=f"{['web', 'db', 'cache', 'worker'][i % 4]}-{i:05d}",
+                     host=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", username="deploy",
+                     group=f"region-{i % 12}", tags=[f"env-{i % 3}", f"team-{i % 7}"],
+                     description=f"benchmark server {i}")
+        for i in range(args.servers))
+    servers.config_manager = manager  # 只在本子进程中替换，不会触碰项目目录下的配置
+    
+    widget = servers.ServerListWidget()
+    widget.resize(1000, 800)
+    widget.show()
+    app.processEvents()
+    
+    monitor = FrameMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    widget.load_server_list()
+    loaded = time.perf_counter() - started
+    
+    filters = []
+    
+    def type_text(text):
+        started = time.perf_counter()
+        widget.search_edit.setText(text)
+        widget.apply_filter()
+        filters.append((time.perf_counter() - started) * 1000)
+    query = "web-0123"
+    pump(app, type_text, [query[:n] for n in range(1, len(query) + 1)] + [""])
+    monitor.stop()
+    return {"load_ms": loaded * 1000, "filter_p50_ms": statistics.median(filters),
+            "filter_max_ms": max(filters), **monitor.summary()}
+
+
+def run_child(scenario: str, args):
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv[:1])
+    result = globals()[f"run_{scenario}"](app, args)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print("RESULT " + json.dumps(result), flush=True)
+    os._exit(0)  # 不触发组件析构与退出时的保存
+
+
+# ---- 主进程 ----
+
+def run_scenario(scenario: str, args, workdir: str) -> dict:
+    env = dict(os.environ)
+    if args.platform:
+        env["QT_QPA_PLATFORM"] = args.platform
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario,
+               "--flood-mb", str(args.flood_mb), "--top-frames", str(args.top_frames),
+               "--entries", str(args.entries), "--servers", str(args.servers), "--workdir", workdir]
+    proc = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"场景 {scenario} 异常退出（返回码 {proc.returncode}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面性能基准测试")
+    parser.add_argument("--flood-mb", type=int, default=100, help="flood 场景的输出大小（MB，默认100）")
+    parser.add_argument("--top-frames", type=int, default=2000, help="top 场景的刷新帧数（默认2000）")
+    parser.add_argument("--entries", type=int, default=200000, help="listing 场景的条目数（默认200000）")
+    parser.add_argument("--servers", type=int, default=20000, help="inventory 场景的服务器数量（默认20000）")
+    parser.add_argument("--quick", action="store_true", help="快速模式：更小的数据量")
+    parser.add_argument("--only", help="只运行指定场景，逗号分隔（flood,top,listing,inventory）")
+    parser.add_argument("--platform", default="offscreen", help="Qt平台插件（默认offscreen，传空字符串使用系统默认）")
+    parser.add_argument("--json", help="把结果保存为JSON文件")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)  # 子进程的临时目录，由主进程负责删除
+    args = parser.parse_args()
+    
+    if args.child:
+        sys.path.insert(0, ROOT)
+        run_child(args.child, args)
+        return
+    if args.quick:
+        args.flood_mb, args.top_frames, args.entries, args.servers = 10, 300, 20000, 2000
+    
+    scenarios = args.only.split(",") if args.only else list(SCENARIOS)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="sshbox-bench-") as workdir:
+        for scenario in scenarios:
+            result = results[scenario] = run_scenario(scenario, args, workdir)
+            details = ", ".join(f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}"
+                                for key, value in result.items())
+            print(f"{scenario}: {details}")
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
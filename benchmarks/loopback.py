@@ -0,0 +1,281 @@
+"""进程内的SSH/SFTP测试服务器（仅监听127.0.0.1，供基准测试使用）
+
+基于paramiko的 ServerInterface 与 SFTPServer，接受任意用户名和固定密码，支持：
+- exec：hostname、echo <文本>、true、stream <字节数>（输出指定字节数的文本行，用于测吞吐）、
+  cat（原样回显输入，用于测按键回显延迟）
+- pty、keepalive 等全局请求（客户端的往返时间探测）
+- sftp：以临时目录为根；另有一个虚拟目录 /many，包含指定数量的文件条目，
+  用于测试大目录列表而不必在磁盘上创建文件
+
+    with LoopbackServer(many_entries=100000) as server:
+        config = server.server_config()
+"""
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from typing import List, Optional
+
+import paramiko
+
+PASSWORD = "bench"
+MANY_DIR = "/many"
+STREAM_LINE = b"x" * 79 + b"\n"
+STREAM_CHUNK = STREAM_LINE * 400  # 32000 字节
+READ_SIZE = 32768
+# 服务端传输层的日志通道：客户端断开、只做TCP探测等情况paramiko会记录异常和完整的调用栈，
+# 基准测试中这些都是正常现象，只保留严重错误，避免混进结果输出
+LOG_CHANNEL = "paramiko.transport.loopback"
+
+
+class _Server(paramiko.ServerInterface):
+    def __init__(self, loopback: "LoopbackServer"):
+        self.loopback = loopback
+    
+    def get_allowed_auths(self, username):
+        return "password"
+    
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == PASSWORD else paramiko.AUTH_FAILED
+    
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+    
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+    
+    def check_global_request(self, kind, msg):
+        return True
+    
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode("utf-8", errors="replace")),
+                         daemon=True).start()
+        return True
+    
+    def _exec(self, channel, command: str):
+        status = 0
+        try:
+            name, _, arg = command.partition(" ")
+            if name == "hostname":
+                channel.sendall(b"loopback\n")
+            elif name == "echo":
+                channel.sendall(arg.encode("utf-8") + b"\n")
+            elif name == "stream":
+                remaining = int(arg)
+                while remaining > 0:
+                    chunk = STREAM_CHUNK[:remaining]
+                    channel.sendall(chunk)
+                    remaining -= len(chunk)
+            elif name == "cat":
+                while True:
+                    data = channel.recv(READ_SIZE)
+                    if not data:
+                        break
+                    channel.sendall(data)
+            elif name != "true":
+                channel.sendall_stderr(f"{name}: command not found\n".encode("utf-8"))
+                status = 127
+        except (OSError, EOFError, ValueError):
+            status = 1
+        finally:
+            # 只发送EOF，由客户端关闭channel：处理线程可能先于exec请求的应答运行，
+            # 这时直接关闭会让客户端的 exec_command 报 "Channel closed"
+            try:
+                channel.send_exit_status(status)
+                channel.shutdown_write()
+            except (OSError, EOFError):
+                pass
+
+
+class _Handle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class _SFTPServer(paramiko.SFTPServerInterface):
+    """以临时目录为根的SFTP服务端"""
+    
+    def __init__(self, server: _Server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.loopback = server.loopback
+    
+    def _local(self, path: str) -> str:
+        path = self.canonicalize(path)
+        return os.path.join(self.loopback.root, path.lstrip("/"))
+    
+    def canonicalize(self, path):
+        return os.path.normpath("/" + path).replace("\\", "/").replace("//", "/")
+    
+    def list_folder(self, path):
+        if self.canonicalize(path) == MANY_DIR:
+            return self.loopback.many_attrs()
+        try:
+            local = self._local(path)
+            result = []
+            for name in os.listdir(local):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, name)))
+                attr.filename = name
+                result.append(attr)
+            return result
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+    
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+    
+    lstat = stat
+    
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _Handle(flags)
+        handle.filename = local
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+    
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+    
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+    
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+    
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+    
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+
+class LoopbackServer:
+    """在后台线程中运行的SSH服务器，每个连接一个paramiko传输线程"""
+    
+    def __init__(self, many_entries: int = 100000, host_key: Optional[paramiko.PKey] = None):
+        self.many_entries = many_entries
+        self.host_key = host_key or paramiko.ECDSAKey.generate()
+        self.root = ""
+        self.port = 0
+        self._listener: Optional[socket.socket] = None
+        self._transports: List[paramiko.Transport] = []
+        self._many: Optional[list] = None
+        self._lock = threading.Lock()
+    
+    def start(self) -> "LoopbackServer":
+        logging.getLogger(LOG_CHANNEL).setLevel(logging.CRITICAL)
+        self.root = tempfile.mkdtemp(prefix="sshbox-bench-")
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name="loopback-accept", daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+        if self.root:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = ""
+    
+    def __enter__(self) -> "LoopbackServer":
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def server_config(self):
+        """连接到本服务器的 ServerConfig"""
+        from config import ServerConfig
+        return ServerConfig(id="bench-loopback", name="loopback", host="127.0.0.1", port=self.port,
+                            username="bench", password=PASSWORD)
+    
+    def local_path(self, remote_path: str) -> str:
+        """远程路径在服务器临时目录中对应的本地路径"""
+        return os.path.join(self.root, remote_path.lstrip("/"))
+    
+    def many_attrs(self) -> list:
+        """虚拟目录 /many 的条目（第一次列出时生成）"""
+        with self._lock:
+            if self._many is None:
+                entries = []
+                for i in range(self.many_entries):
+                    attr = paramiko.SFTPAttributes()
+                    attr.filename = f"file-{i:06d}.log"
+                    attr.st_mode = 0o100644
+                    attr.st_size = i
+                    attr.st_uid = attr.st_gid = 1000
+                    attr.st_atime = attr.st_mtime = 1700000000
+                    entries.append(attr)
+                self._many = entries
+            return self._many
+    
+    def _accept_loop(self):
+        listener = self._listener
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), name="loopback-conn", daemon=True).start()
+    
+    def _handle(self, conn: socket.socket):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # 与sshd一样关闭Nagle，避免服务端成为瓶颈
+        transport = paramiko.Transport(conn)
+        transport.set_log_channel(LOG_CHANNEL)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTPServer)
+        with self._lock:
+            self._transports.append(transport)
+        try:
+            transport.start_server(server=_Server(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+        # 接受channel，exec与sftp由各自的处理线程负责；
+        # 需要保留引用直到channel关闭，否则被回收时会直接关闭channel
+        channels = []
+        while transport.is_active():
+            channel = transport.accept(1)
+            channels = [c for c in channels if not c.closed]
+            if channel is not None:
+                channels.append(channel)
+        with self._lock:
+            if transport in self._transports:
+                self._transports.remove(transport)
@@ -0,0 +1,250 @@
+"""SSH/SFTP基准测试
+
+在本进程中启动一个只监听127.0.0.1的paramiko服务器（见 loopback.py），
+用项目自己的 SSHClient / SSHWorker 测量：
+- connect：建立连接（TCP、密钥交换、认证、主机名探测）到断开的耗时
+- exec：execute_command 一次往返的耗时
+- echo：交互命令中按键发送到收到回显的耗时
+- stream：SSHWorker 实时输出的吞吐（包括信号送到界面线程）
+- listdir：list_dir 列出10万个条目的耗时（含排序）
+- upload / download：SFTP上传、下载的速度
+
+结果可以保存为JSON；传入 --baseline 时与之前保存的结果比较，
+任何一项变慢超过容差（默认20%）即打印回退项并以返回码1退出。
+传入 --wan 时所有连接经由 wanem.py 的模拟链路（延迟、带宽、丢包、停顿），
+在高延迟下建议同时减小数据量。
+
+用法：
+    python benchmarks/ssh_bench.py [--quick] [--wan 预设] [--json 输出文件] [--baseline 基准文件] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import paramiko
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from loopback import LoopbackServer, MANY_DIR
+from wanem import PROFILES, WanProxy
+from ssh import SSHClient
+
+LOWER, HIGHER = "lower", "higher"
+SIZE_ARGS = ("runs", "stream_mb", "transfer_mb", "entries", "wan")  # 影响结果可比性的参数
+
+
+def measure(samples, unit: str, better: str, reduce=statistics.median) -> dict:
+    return {"value": reduce(samples), "unit": unit, "better": better, "samples": samples}
+
+
+def connect_client(server) -> SSHClient:
+    client = SSHClient(server)
+    client.jump_hosts = []  # 不经过配置管理器解析跳板机
+    client.error_occurred.connect(lambda message: print(f"  错误: {message}"))
+    if not client.connect():
+        raise RuntimeError("无法连接到测试服务器")
+    return client
+
+
+def bench_connect(server, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        client = connect_client(server)
+        client.disconnect()
+        samples.append((time.perf_counter() - started) * 1000)
+    return measure(samples, "ms", LOWER)
+
+
+def bench_exec(client: SSHClient, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output, _ = client.execute_command("echo ping")
+        samples.append((time.perf_counter() - started) * 1000)
+        if output.strip() != "ping":
+            raise RuntimeError(f"命令输出不正确: {output!r}")
+    return measure(samples, "ms", LOWER)
+
+
+def bench_echo(client: SSHClient, keys: int) -> dict:
+    """在 cat 中逐个发送按键，收到回显后再发送下一个（从调用 send_input 到界面线程收到输出）"""
+    samples = []
+    loop = QEventLoop()
+    worker = client.command_worker("cat")
+    worker.output_ready.connect(loop.quit)
+    worker.start()
+    for i in range(keys):
+        timeout = QTimer()
+        timeout.setSingleShot(True)
+        timeout.timeout.connect(loop.quit)
+        timeout.start(10000)
+        started = time.perf_counter()
+        worker.send_input("abcdefghij"[i % 10])
+        loop.exec_()
+        if not timeout.isActive():
+            raise RuntimeError("等待回显超时")
+        timeout.stop()
+        samples.append((time.perf_counter() - started) * 1000)
+    finished = QEventLoop()
+    worker.finished_signal.connect(finished.quit)
+    worker.stop()
+    finished.exec_()
+    return measure(samples, "ms", LOWER)
+
+
+def bench_stream(client: SSHClient, size: int, runs: int) -> dict:
+    """SSHWorker 的信号在界面线程中处理，这里用事件循环等待结束"""
+    samples = []
+    for _ in range(runs):
+        received = [0]
+        loop = QEventLoop()
+        worker = client.command_worker(f"stream {size}")
+        worker.output_ready.connect(lambda data: received.__setitem__(0, received[0] + len(data)))
+        worker.finished_signal.connect(loop.quit)
+        QTimer.singleShot(120000, loop.quit)
+        started = time.perf_counter()
+        worker.start()
+        loop.exec_()
+        elapsed = time.perf_counter() - started
+        # pty会把 \n 转换为 \r\n
+        if received[0] < size:
+            raise RuntimeError(f"输出不完整: 收到 {received[0]} / {size} 字节")
+        samples.append(size / elapsed / 1e6)
+    return measure(samples, "MB/s", HIGHER)
+
+
+def bench_listdir(client: SSHClient, entries: int, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = client.list_dir(MANY_DIR)
+        samples.append((time.perf_counter() - started) * 1000)
+        if len(result) != entries:
+            raise RuntimeError(f"条目数不正确: {len(result)} / {entries}")
+    return measure(samples, "ms", LOWER)
+
+
+def bench_transfer(client: SSHClient, size: int, runs: int, workdir: str):
+    source = os.path.join(workdir, "upload.bin")
+    target = os.path.join(workdir, "download.bin")
+    with open(source, 'wb') as f:
+        f.write(os.urandom(size))
+    uploads, downloads = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        if not client.upload_file(source, "/bench.bin"):
+            raise RuntimeError("上传失败")
+        uploads.append(size / (time.perf_counter() - started) / 1e6)
+        started = time.perf_counter()
+        if not client.download_file("/bench.bin", target):
+            raise RuntimeError("下载失败")
+        downloads.append(size / (time.perf_counter() - started) / 1e6)
+        if os.path.getsize(target) != size:
+            raise RuntimeError("下载的文件大小不正确")
+    return measure(uploads, "MB/s", HIGHER), measure(downloads, "MB/s", HIGHER)
+
+
+def run(args) -> dict:
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)  # noqa: F841 SSHWorker 的信号需要事件循环
+    results = {}
+    with LoopbackServer(many_entries=args.entries) as server, tempfile.TemporaryDirectory() as workdir:
+        config = server.server_config()
+        proxy = None
+        if args.wan:
+            proxy = WanProxy(config.host, config.port, PROFILES[args.wan]).start()
+            config.port = proxy.port
+        results["connect"] = bench_connect(config, args.runs)
+        client = connect_client(config)
+        try:
+            results["exec"] = bench_exec(client, args.runs * 4)
+            results["echo"] = bench_echo(client, args.runs * 10)
+            results["stream"] = bench_stream(client, args.stream_mb * 1000000, args.runs)
+            results["listdir"] = bench_listdir(client, args.entries, max(1, args.runs // 2))
+            results["upload"], results["download"] = bench_transfer(
+                client, args.transfer_mb * 1000000, args.runs, workdir)
+        finally:
+            client.disconnect()
+            if proxy is not None:
+                proxy.stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """打印与基准的对比，返回回退的项目"""
+    regressions = []
+    print(f"\n{'项目':<12}{'基准':>12}{'本次':>12}{'变化':>10}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<14}{'-':>12}{result['value']:>12.2f}{'新增':>10}")
+            continue
+        change = (result["value"] - base["value"]) / base["value"] if base["value"] else 0.0
+        worse = change > tolerance if result["better"] == LOWER else change < -tolerance
+        mark = "  << 回退" if worse else ""
+        print(f"{name:<14}{base['value']:>12.2f}{result['value']:>12.2f}{change * 100:>+9.1f}%{mark}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSH/SFTP基准测试")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="每项的运行轮数（默认5）")
+    parser.add_argument("--stream-mb", type=int, default=16, help="stream 测试的输出大小（MB，默认16）")
+    parser.add_argument("--transfer-mb", type=int, default=32, help="上传下载测试的文件大小（MB，默认32）")
+    parser.add_argument("--entries", type=int, default=100000, help="listdir 测试的条目数（默认100000）")
+    parser.add_argument("--quick", action="store_true", help="快速模式：更少轮数与更小的数据量")
+    parser.add_argument("--wan", choices=sorted(PROFILES), help="经由模拟的广域网链路连接（见 wanem.py）")
+    parser.add_argument("--json", help="把结果保存为JSON文件")
+    parser.add_argument("--baseline", help="与之前保存的JSON结果比较，有回退时返回码为1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的变慢比例（默认0.2，即20%%）")
+    args = parser.parse_args()
+    if args.quick:
+        args.runs, args.stream_mb, args.transfer_mb = 2, 4, 8
+    
+    results = run(args)
+    
+    print(f"{'项目':<12}{'中位数':>12}{'最好':>12}{'最差':>12}  单位")
+    for name, result in results.items():
+        samples = result["samples"]
+        best, worst = (min(samples), max(samples)) if result["better"] == LOWER else (max(samples), min(samples))
+        print(f"{name:<14}{result['value']:>12.2f}{best:>12.2f}{worst:>12.2f}  {result['unit']}")
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                "meta": {
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "python": platform.python_version(),
+                    "paramiko": paramiko.__version__,
+                    "platform": platform.platform(),
+                    "args": vars(args),
+                },
+                "results": results,
+            }, f, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        base_args = saved.get("meta", {}).get("args", {})
+        changed = [key for key in SIZE_ARGS if key in base_args and base_args[key] != getattr(args, key)]
+        if changed:
+            print(f"\n注意：基准使用了不同的参数（{', '.join(changed)}），结果不完全可比")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n性能回退（超过 {args.tolerance * 100:.0f}%）: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n没有超过容差的回退")
+
+
+if __name__ == "__main__":
+    main()
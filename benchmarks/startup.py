@@ -0,0 +1,114 @@
+"""启动速度基准测试
+
+每轮在新的子进程中启动主窗口，报告：
+- import：导入 main 模块的耗时
+- window：创建 MainWindow 的耗时
+- first_paint：从开始导入到窗口首次绘制的耗时
+- ready：从开始导入到服务器列表、背景等加载完成的耗时
+- process：从启动子进程到首次绘制的总耗时（含解释器启动）
+以及首次绘制时已经导入的重量级模块（应当为空）。
+
+用法：
+    python benchmarks/startup.py [-n 轮数] [--json 输出文件]
+
+默认使用 offscreen 平台，不会弹出窗口；使用项目目录下的真实配置，退出时不保存任何内容。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("paramiko", "cryptography", "connection", "ssh", "terminal", "sftp", "tabs", "settings", "importers")
+
+# 子进程中执行的脚本：首次绘制与启动完成时记录时间，然后直接退出（不触发关闭窗口时的保存）
+CHILD = r"""
+import os, sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+import main
+imported = time.perf_counter()
+from PyQt5.QtCore import QObject, QEvent
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+created_at = time.perf_counter()
+window = main.MainWindow()
+created = time.perf_counter()
+result = {"import": imported - start, "window": created - created_at}
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "first_paint" not in result:
+            result["first_paint"] = time.perf_counter() - start
+            result["loaded"] = [m for m in HEAVY_MODULES if m in sys.modules]
+        return False
+
+finish_startup = window.finish_startup
+def finish_and_report():
+    finish_startup()
+    result["ready"] = time.perf_counter() - start
+    print("RESULT " + json.dumps(result), flush=True)
+    os._exit(0)
+window.finish_startup = finish_and_report
+
+paint_filter = FirstPaint()
+window.installEventFilter(paint_filter)
+window.show()
+app.exec_()
+"""
+
+
+def run_once(platform: str) -> dict:
+    env = dict(os.environ)
+    if platform:
+        env["QT_QPA_PLATFORM"] = platform
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + CHILD
+    spawned = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    result = None
+    for line in proc.stdout:
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+            # first_paint 相对于子进程开始导入，加上解释器启动时间近似为整体耗时
+            result["process"] = time.perf_counter() - spawned - (result["ready"] - result["first_paint"])
+    proc.wait()
+    if result is None:
+        raise RuntimeError(f"子进程异常退出（返回码 {proc.returncode}）")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动速度基准测试")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="运行轮数（默认5）")
+    parser.add_argument("--platform", default="offscreen", help="Qt平台插件（默认offscreen，传空字符串使用系统默认）")
+    parser.add_argument("--json", help="把结果保存为JSON文件")
+    args = parser.parse_args()
+    
+    runs = []
+    for i in range(args.runs):
+        result = run_once(args.platform)
+        runs.append(result)
+        print(f"第{i + 1}轮: import {result['import'] * 1000:.0f} ms, "
+              f"首次绘制 {result['first_paint'] * 1000:.0f} ms, 加载完成 {result['ready'] * 1000:.0f} ms")
+    
+    summary = {}
+    print()
+    print(f"{'指标':<12}{'中位数':>10}{'最小':>10}{'最大':>10}")
+    for key in ("import", "window", "first_paint", "ready", "process"):
+        values = [r[key] * 1000 for r in runs]
+        summary[key] = {"median_ms": statistics.median(values), "min_ms": min(values), "max_ms": max(values)}
+        print(f"{key:<14}{summary[key]['median_ms']:>10.1f}{summary[key]['min_ms']:>10.1f}{summary[key]['max_ms']:>10.1f}")
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    print(f"\n首次绘制时已导入的重量级模块: {', '.join(loaded) if loaded else '无'}")
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"runs": runs, "summary": summary, "loaded_at_first_paint": loaded}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""广域网条件模拟代理
+
+在本机监听一个端口，把连接转发到目标地址，并在两个方向上分别加入：
+- 延迟与抖动：每个数据块按单程延迟（往返时间的一半）加上随机抖动后送达，保持先后顺序
+- 带宽限制：按链路速率计算每块的发送时间，超过带宽的数据在代理中排队
+- 丢包：TCP下丢包表现为重传等待，被"丢弃"的数据块额外推迟一个重传超时，后面的数据随之阻塞
+- 停顿：按平均间隔随机出现一段时间完全不送达数据（如移动网络切换基站）
+随机数使用固定种子，同样的参数每次得到同样的条件序列。
+
+作为库使用（基准测试与测试脚本）：
+    with WanProxy("127.0.0.1", 22, PROFILES["wan"]) as proxy:
+        server.port = proxy.port
+
+作为工具使用：
+    python benchmarks/wanem.py --target host:port [--listen 2222] [--profile wan] [--rtt 200 --jitter 20 ...]
+"""
+import argparse
+import heapq
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+READ_SIZE = 16384
+MAX_QUEUED = 4 * 1024 * 1024  # 每个方向最多排队的字节数，超过后停止读取（反压）
+MIN_RTO_MS = 200.0  # 重传超时下限，与Linux一致
+
+
+@dataclass(frozen=True)
+class WanProfile:
+    """链路条件（两个方向相同）"""
+    rtt_ms: float = 0.0  # 往返时间
+    jitter_ms: float = 0.0  # 单程延迟的随机波动（±）
+    bandwidth_kbps: float = 0.0  # 每个方向的速率（千比特/秒），0表示不限
+    loss: float = 0.0  # 数据块"丢失"（需要重传）的概率
+    stall_every_s: float = 0.0  # 平均多久出现一次停顿，0表示没有
+    stall_ms: float = 0.0  # 每次停顿的时长
+    seed: int = 1
+
+
+PROFILES = {
+    "lan": WanProfile(rtt_ms=1),
+    "broadband": WanProfile(rtt_ms=30, jitter_ms=5, bandwidth_kbps=50000),
+    "wan": WanProfile(rtt_ms=200, jitter_ms=20, bandwidth_kbps=10000),
+    "lossy": WanProfile(rtt_ms=250, jitter_ms=40, bandwidth_kbps=5000, loss=0.02),
+    "mobile": WanProfile(rtt_ms=120, jitter_ms=60, bandwidth_kbps=4000, loss=0.01,
+                         stall_every_s=20, stall_ms=1500),
+    "satellite": WanProfile(rtt_ms=600, jitter_ms=50, bandwidth_kbps=2000, loss=0.005,
+                            stall_every_s=60, stall_ms=3000),
+}
+
+
+class _Direction:
+    """一个方向的模拟链路：读线程按条件计算送达时间入队，写线程按时间送出"""
+    
+    def __init__(self, source: socket.socket, target: socket.socket, profile: WanProfile, seed: int, stats: dict):
+        self.source = source
+        self.target = target
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.stats = stats
+        self._queue = []  # (送达时间, 序号, 数据)
+        self._queued_bytes = 0
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._link_free = 0.0  # 链路空闲的时刻（带宽限制）
+        self._last_delivery = 0.0  # 上一块的送达时间，保证顺序
+        self._next_stall = self._schedule_stall(time.monotonic())
+    
+    def _schedule_stall(self, now: float) -> Optional[float]:
+        if self.profile.stall_every_s <= 0:
+            return None
+        return now + self.random.expovariate(1 / self.profile.stall_every_s)
+    
+    def _delivery_time(self, now: float, size: int) -> float:
+        profile = self.profile
+        if profile.bandwidth_kbps > 0:
+            self._link_free = max(self._link_free, now) + size * 8 / (profile.bandwidth_kbps * 1000)
+            sent = self._link_free
+        else:
+            sent = now
+        delay = profile.rtt_ms / 2
+        if profile.jitter_ms > 0:
+            delay += self.random.uniform(-profile.jitter_ms, profile.jitter_ms)
+        if profile.loss > 0 and self.random.random() < profile.loss:
+            delay += max(MIN_RTO_MS, profile.rtt_ms * 2)
+            self.stats["lost"] += 1
+        delivery = sent + max(0.0, delay) / 1000
+        if self._next_stall is not None and delivery >= self._next_stall:
+            # 停顿期间到达的数据推迟到停顿结束
+            stall_end = self._next_stall + profile.stall_ms / 1000
+            self.stats["stalls"] += 1
+            self._next_stall = self._schedule_stall(stall_end)
+            delivery = max(delivery, stall_end)
+        delivery = max(delivery, self._last_delivery)
+        self._last_delivery = delivery
+        return delivery
+    
+    def start(self, name: str):
+        threading.Thread(target=self._read_loop, name=f"wanem-{name}-read", daemon=True).start()
+        threading.Thread(target=self._write_loop, name=f"wanem-{name}-write", daemon=True).start()
+    
+    def _read_loop(self):
+        while True:
+            try:
+                data = self.source.recv(READ_SIZE)
+            except OSError:
+                data = b""
+            with self._cond:
+                if not data:
+                    self._closed = True
+                    self._cond.notify_all()
+                    return
+                while self._queued_bytes > MAX_QUEUED and not self._closed:
+                    self._cond.wait()
+                heapq.heappush(self._queue, (self._delivery_time(time.monotonic(), len(data)), self._seq, data))
+                self._seq += 1
+                self._queued_bytes += len(data)
+                self._cond.notify_all()
+    
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._queue:
+                        wait = self._queue[0][0] - time.monotonic()
+                        if wait <= 0:
+                            _, _, data = heapq.heappop(self._queue)
+                            self._queued_bytes -= len(data)
+                            self._cond.notify_all()
+                            break
+                        self._cond.wait(wait)
+                    elif self._closed:
+                        self._shutdown_target()
+                        return
+                    else:
+                        self._cond.wait()
+            try:
+                self.target.sendall(data)
+            except OSError:
+                with self._cond:
+                    self._closed = True
+                    self._queue.clear()
+                    self._cond.notify_all()
+                self._shutdown_target()
+                return
+            self.stats["bytes"] += len(data)
+    
+    def _shutdown_target(self):
+        try:
+            self.target.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+class WanProxy:
+    """监听127.0.0.1上的随机端口（或指定端口），每个连接按 profile 模拟链路"""
+    
+    def __init__(self, target_host: str, target_port: int, profile: WanProfile = WanProfile(),
+                 listen_host: str = "127.0.0.1", listen_port: int = 0):
+        self.target = (target_host, target_port)
+        self.profile = profile
+        self.listen = (listen_host, listen_port)
+        self.port = 0
+        self.stats = {"connections": 0, "up": {"bytes": 0, "lost": 0, "stalls": 0},
+                      "down": {"bytes": 0, "lost": 0, "stalls": 0}}
+        self._listener: Optional[socket.socket] = None
+        self._sockets = []
+        self._lock = threading.Lock()
+    
+    def start(self) -> "WanProxy":
+        self._listener = socket.create_server(self.listen)
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name="wanem-accept", daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            try:
+                sock.close()
+            except OSError:
+                pass
+    
+    def __enter__(self) -> "WanProxy":
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _accept_loop(self):
+        listener = self._listener
+        while True:
+            try:
+                client, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(self.target, timeout=10)
+            except OSError as e:
+                print(f"连接目标失败: {e}")
+                client.close()
+                continue
+            upstream.settimeout(None)
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # 延迟由代理模拟，不叠加Nagle
+            with self._lock:
+                self.stats["connections"] += 1
+                index = self.stats["connections"]
+                self._sockets += [client, upstream]
+            # 每个连接、每个方向使用不同但确定的随机序列
+            seed = self.profile.seed * 1000 + index * 2
+            _Direction(client, upstream, self.profile, seed, self.stats["up"]).start(f"{index}-up")
+            _Direction(upstream, client, self.profile, seed + 1, self.stats["down"]).start(f"{index}-down")
+
+
+def parse_target(text: str):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="广域网条件模拟代理")
+    parser.add_argument("--target", required=True, help="转发目标 host:port")
+    parser.add_argument("--listen", type=int, default=0, help="监听端口（默认随机）")
+    parser.add_argument("--bind", default="127.0.0.1", help="监听地址（默认127.0.0.1）")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="wan", help="预设条件（默认wan）")
+    parser.add_argument("--rtt", type=float, help="往返时间（毫秒）")
+    parser.add_argument("--jitter", type=float, help="抖动（毫秒）")
+    parser.add_argument("--bandwidth", type=float, help="每个方向的速率（千比特/秒，0为不限）")
+    parser.add_argument("--loss", type=float, help="丢包概率（0~1）")
+    parser.add_argument("--stall-every", type=float, help="平均停顿间隔（秒）")
+    parser.add_argument("--stall", type=float, help="停顿时长（毫秒）")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    args = parser.parse_args()
+    
+    overrides = {"rtt_ms": args.rtt, "jitter_ms": args.jitter, "bandwidth_kbps": args.bandwidth, "loss": args.loss,
+                 "stall_every_s": args.stall_every, "stall_ms": args.stall, "seed": args.seed}
+    profile = replace(PROFILES[args.profile], **{k: v for k, v in overrides.items() if v is not None})
+    host, port = parse_target(args.target)
+    with WanProxy(host, port, profile, args.bind, args.listen) as proxy:
+        print(f"{args.bind}:{proxy.port} -> {host}:{port}  {profile}")
+        try:
+            while True:
+                time.sleep(10)
+                print(f"连接 {proxy.stats['connections']} 个，上行 {proxy.stats['up']}，下行 {proxy.stats['down']}")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 """服务器配置数据模型"""
 import json
 import os
+import sqlite3
+import threading
 import uuid
-from dataclasses import dataclass, asdict, field
-from typing import List, Optional
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, List, Optional, Tuple
 
-CONFIG_FILE = "servers.json"
+from vault import vault, is_sealed
+
+DB_FILE = "servers.db"
+CONFIG_FILE = "servers.json"  # 旧版JSON配置，首次启动时自动迁移到数据库
 
 @dataclass
 class ServerConfig:
@@ -19,77 +24,398 @@ class ServerConfig:
     description: str = ""  # 服务器描述
     key_file: str = ""  # SSH私钥文件路径
     use_key: bool = False  # 是否使用密钥认证
+    forwards: List[str] = field(default_factory=list)  # 端口转发，如 "-L 5433:db:5432"、"-D 1080"
+    proxy_jump: str = ""  # 跳板机，逗号分隔，每项为服务器名称/ID或 user@host:port
+    pinned: bool = False  # 常用服务器，开启预连接时启动即建立连接
+    tags: List[str] = field(default_factory=list)  # 标签
+    group: str = ""  # 分组，为空时显示在"未分组"下
     
     def to_dict(self) -> dict:
-        return asdict(self)
+        # 比 asdict 的递归深拷贝快得多，批量导入/保存时很明显
+        data = dict(self.__dict__)
+        data["forwards"] = list(self.forwards)
+        data["tags"] = list(self.tags)
+        return data
     
     @classmethod
     def from_dict(cls, data: dict) -> 'ServerConfig':
+        # 忽略未知字段，兼容其他版本导出的配置
+        if not _SERVER_FIELDS.issuperset(data):
+            data = {k: v for k, v in data.items() if k in _SERVER_FIELDS}
         return cls(**data)
 
 
+_SERVER_FIELDS = frozenset(f.name for f in fields(ServerConfig))
+
+
 class ServerConfigManager:
-    """服务器配置管理器"""
+    """服务器配置管理器
+
+    数据保存在SQLite数据库（WAL模式）中，每次增删改都是一个独立事务，
+    只写入变化的行，崩溃时不会损坏已有数据。内存中按ID维护有序索引，
+    get_server为O(1)；按名称、主机、标签的查询走数据库索引。
+    """
     
-    def __init__(self):
-        self.servers: List[ServerConfig] = []
-        self.config_path = os.path.join(os.path.dirname(__file__), CONFIG_FILE)
+    def __init__(self, db_path: str = None):
+        base_dir = os.path.dirname(__file__)
+        self.db_path = db_path or os.path.join(base_dir, DB_FILE)
+        self.config_path = os.path.join(os.path.dirname(self.db_path), CONFIG_FILE)
+        self._lock = threading.RLock()
+        self._by_id: Dict[str, ServerConfig] = {}  # 按插入顺序保存
+        self._rows: Dict[str, str] = {}  # 已持久化的序列化数据，用于只写入变化的行
+        self._positions: Dict[str, int] = {}  # 已持久化的排序位置
+        self._next_position = 0
+        self.revision = 0  # 每次数据变化加1，界面可据此判断是否需要刷新缓存
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA secure_delete=ON")  # 删除和覆盖的内容清零，旧密码不会留在空闲页中
+        self._create_schema()
         self.load()
     
+    def _create_schema(self):
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS servers (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                host TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_servers_name ON servers(name);
+            CREATE INDEX IF NOT EXISTS idx_servers_host ON servers(host);
+            CREATE INDEX IF NOT EXISTS idx_servers_endpoint ON servers(host, port, username);
+            CREATE TABLE IF NOT EXISTS server_tags (
+                server_id TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (server_id, tag)
+            );
+            CREATE INDEX IF NOT EXISTS idx_server_tags_tag ON server_tags(tag);
+        """)
+    
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+    
+    @property
+    def servers(self) -> List[ServerConfig]:
+        with self._lock:
+            return list(self._by_id.values())
+    
+    @servers.setter
+    def servers(self, servers: List[ServerConfig]):
+        with self._lock:
+            self._by_id = {s.id: s for s in servers}
+    
     def load(self):
-        """从文件加载服务器配置"""
-        if os.path.exists(self.config_path):
-            try:
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.servers = [ServerConfig.from_dict(s) for s in data]
-            except Exception as e:
-                print(f"加载配置失败: {e}")
-                self.servers = []
+        """从数据库加载服务器配置（数据库为空时迁移旧版servers.json）"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM servers").fetchone()[0]
+            if count == 0 and os.path.exists(self.config_path):
+                self._migrate_json()
+            
+            self._by_id = {}
+            self._rows = {}
+            self._positions = {}
+            for server_id, position, data in self._conn.execute(
+                    "SELECT id, position, data FROM servers ORDER BY position"):
+                try:
+                    self._by_id[server_id] = ServerConfig.from_dict(json.loads(data))
+                    self._rows[server_id] = data
+                    self._positions[server_id] = position
+                except Exception as e:
+                    print(f"加载服务器配置失败: {e}")
+            row = self._conn.execute("SELECT MAX(position) FROM servers").fetchone()
+            self._next_position = (row[0] + 1) if row[0] is not None else 0
+            self.revision += 1
+    
+    def _migrate_json(self):
+        """把旧版servers.json导入数据库，原文件保留为servers.json.bak"""
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            servers = [ServerConfig.from_dict(s) for s in data]
+        except Exception as e:
+            print(f"迁移旧配置失败: {e}")
+            return
+        with self._transaction() as cur:
+            for position, server in enumerate(servers):
+                self._write_row(cur, server, position)
+        try:
+            os.replace(self.config_path, self.config_path + ".bak")
+        except OSError as e:
+            print(f"备份旧配置失败: {e}")
+    
+    def _write_row(self, cur, server: ServerConfig, position: int = None) -> str:
+        data = json.dumps(server.to_dict(), ensure_ascii=False)
+        if position is None:
+            cur.execute(
+                "UPDATE servers SET name=?, host=?, port=?, username=?, data=? WHERE id=?",
+                (server.name, server.host, server.port, server.username, data, server.id)
+            )
         else:
-            self.servers = []
+            cur.execute(
+                "INSERT OR REPLACE INTO servers (id, name, host, port, username, position, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (server.id, server.name, server.host, server.port, server.username, position, data)
+            )
+        cur.execute("DELETE FROM server_tags WHERE server_id=?", (server.id,))
+        cur.executemany(
+            "INSERT OR IGNORE INTO server_tags (server_id, tag) VALUES (?, ?)",
+            [(server.id, tag) for tag in server.tags]
+        )
+        return data
     
     def save(self):
-        """保存服务器配置到文件"""
+        """把内存中的服务器列表同步到数据库（单个事务，只写入变化的行）"""
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                data = [s.to_dict() for s in self.servers]
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with self._transaction() as cur:
+                current = self._by_id
+                removed = [sid for sid in self._rows if sid not in current]
+                for server_id in removed:
+                    cur.execute("DELETE FROM servers WHERE id=?", (server_id,))
+                    cur.execute("DELETE FROM server_tags WHERE server_id=?", (server_id,))
+                    del self._rows[server_id]
+                    self._positions.pop(server_id, None)
+                for position, server in enumerate(current.values()):
+                    server.password = vault.seal(server.password)
+                    data = json.dumps(server.to_dict(), ensure_ascii=False)
+                    if self._rows.get(server.id) != data:
+                        self._rows[server.id] = self._write_row(cur, server, position)
+                    elif self._positions.get(server.id) != position:
+                        cur.execute("UPDATE servers SET position=? WHERE id=?", (position, server.id))
+                    self._positions[server.id] = position
+                self._next_position = len(current)
+                self.revision += 1
         except Exception as e:
             print(f"保存配置失败: {e}")
+            self._reload_rows()
+    
+    def _reload_rows(self):
+        """事务失败后按数据库实际内容重建已持久化快照"""
+        with self._lock:
+            self._rows = {}
+            self._positions = {}
+            for server_id, position, data in self._conn.execute("SELECT id, position, data FROM servers"):
+                self._rows[server_id] = data
+                self._positions[server_id] = position
     
     def add_server(self, server: ServerConfig) -> None:
-        """添加服务器"""
-        self.servers.append(server)
-        self.save()
+        """添加服务器，写入失败时抛出异常（内存中的列表已回滚到数据库内容）"""
+        self.upsert_servers([server])
+    
+    def upsert_servers(self, servers: Iterable[ServerConfig]) -> int:
+        """批量添加或更新服务器（单个事务，批量写入），返回写入的数量"""
+        batch = {server.id: server for server in servers}
+        try:
+            with self._transaction() as cur:
+                inserts, updates, tags = [], [], []
+                for server in batch.values():
+                    # 凭据库已解锁时密码加密后再落盘
+                    server.password = vault.seal(server.password)
+                    data = json.dumps(server.to_dict(), ensure_ascii=False)
+                    if server.id in self._rows:
+                        updates.append((server.name, server.host, server.port, server.username, data, server.id))
+                    else:
+                        inserts.append((server.id, server.name, server.host, server.port, server.username,
+                                        self._next_position, data))
+                        self._positions[server.id] = self._next_position
+                        self._next_position += 1
+                    tags.extend((server.id, tag) for tag in server.tags)
+                    self._rows[server.id] = data
+                    self._by_id[server.id] = server
+                cur.executemany(
+                    "UPDATE servers SET name=?, host=?, port=?, username=?, data=? WHERE id=?", updates
+                )
+                cur.executemany(
+                    "INSERT OR REPLACE INTO servers (id, name, host, port, username, position, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", inserts
+                )
+                cur.executemany("DELETE FROM server_tags WHERE server_id=?", [(u[-1],) for u in updates])
+                cur.executemany("INSERT OR IGNORE INTO server_tags (server_id, tag) VALUES (?, ?)", tags)
+                self.revision += 1
+        except Exception as e:
+            print(f"保存配置失败: {e}")
+            self.load()
+            raise
+        return len(batch)
+    
+    def seal_passwords(self) -> int:
+        """把仍为明文的密码加密保存（凭据库解锁后调用），返回加密的数量
+        
+        同时加密旧版配置的备份，并清理数据库文件中残留的明文（WAL与空闲页）。
+        """
+        if not vault.is_unlocked():
+            return 0
+        with self._lock:
+            plain = [s for s in self._by_id.values() if s.password and not is_sealed(s.password)]
+        if plain:
+            self.upsert_servers(plain)
+        if self._seal_backup() or plain:
+            self._scrub()
+        return len(plain)
+    
+    def _seal_backup(self) -> bool:
+        """加密 servers.json.bak 中的明文密码，返回是否有改动"""
+        path = self.config_path + ".bak"
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            changed = False
+            for item in data:
+                password = item.get("password")
+                if password and not is_sealed(password):
+                    item["password"] = vault.seal(password)
+                    changed = True
+            if changed:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, path)
+            return changed
+        except Exception as e:
+            print(f"加密旧配置备份失败: {e}")
+            return False
+    
+    def _scrub(self):
+        """重建数据库文件并清空WAL，去掉被覆盖前的明文行"""
+        try:
+            with self._lock:
+                self._conn.execute("VACUUM")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            print(f"清理数据库失败: {e}")
     
     def update_server(self, server: ServerConfig) -> None:
-        """更新服务器配置"""
-        for i, s in enumerate(self.servers):
-            if s.id == server.id:
-                self.servers[i] = server
-                break
-        self.save()
+        """更新服务器配置，写入失败时抛出异常（内存中的列表已回滚到数据库内容）"""
+        with self._lock:
+            if server.id not in self._by_id:
+                return
+        self.upsert_servers([server])
     
     def delete_server(self, server_id: str) -> None:
         """删除服务器"""
-        self.servers = [s for s in self.servers if s.id != server_id]
-        self.save()
+        try:
+            with self._transaction() as cur:
+                cur.execute("DELETE FROM servers WHERE id=?", (server_id,))
+                cur.execute("DELETE FROM server_tags WHERE server_id=?", (server_id,))
+                self._by_id.pop(server_id, None)
+                self._rows.pop(server_id, None)
+                self._positions.pop(server_id, None)
+                self.revision += 1
+        except Exception as e:
+            print(f"删除服务器失败: {e}")
+            self.load()
     
     def get_server(self, server_id: str) -> Optional[ServerConfig]:
         """获取服务器配置"""
-        for s in self.servers:
-            if s.id == server_id:
-                return s
-        return None
+        with self._lock:
+            return self._by_id.get(server_id)
     
     def get_all_servers(self) -> List[ServerConfig]:
         """获取所有服务器"""
-        return self.servers.copy()
+        return self.servers
+    
+    def count(self) -> int:
+        with self._lock:
+            return len(self._by_id)
+    
+    def _query_ids(self, sql: str, params: tuple) -> List[ServerConfig]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            return [self._by_id[r[0]] for r in rows if r[0] in self._by_id]
+    
+    def find_by_name(self, name: str) -> List[ServerConfig]:
+        """按名称查找服务器"""
+        return self._query_ids("SELECT id FROM servers WHERE name=? ORDER BY position", (name,))
+    
+    def find_by_host(self, host: str) -> List[ServerConfig]:
+        """按主机地址查找服务器"""
+        return self._query_ids("SELECT id FROM servers WHERE host=? ORDER BY position", (host,))
+    
+    def find_by_endpoint(self, host: str, port: int, username: str) -> Optional[ServerConfig]:
+        """按 (主机, 端口, 用户名) 查找服务器"""
+        found = self._query_ids(
+            "SELECT id FROM servers WHERE host=? AND port=? AND username=? ORDER BY position LIMIT 1",
+            (host, port, username)
+        )
+        return found[0] if found else None
+    
+    def endpoint_index(self) -> Dict[Tuple[str, int, str], ServerConfig]:
+        """(主机, 端口, 用户名) -> 服务器，供批量导入一次性去重"""
+        with self._lock:
+            index = {}
+            for server in self._by_id.values():
+                index.setdefault((server.host, server.port, server.username), server)
+            return index
+    
+    def find_by_tag(self, tag: str) -> List[ServerConfig]:
+        """按标签查找服务器"""
+        return self._query_ids(
+            "SELECT s.id FROM server_tags t JOIN servers s ON s.id = t.server_id "
+            "WHERE t.tag=? ORDER BY s.position", (tag,)
+        )
+    
+    def all_tags(self) -> List[str]:
+        """所有已使用的标签"""
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT tag FROM server_tags ORDER BY tag")]
+
+
+class _Transaction:
+    """持有管理器锁的 BEGIN IMMEDIATE ... COMMIT/ROLLBACK 事务"""
+    
+    def __init__(self, conn: sqlite3.Connection, lock):
+        self._conn = conn
+        self._lock = lock
+    
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._lock.release()
+            raise
+        return self._conn.cursor()
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.execute("COMMIT")
+            else:
+                self._conn.execute("ROLLBACK")
+        finally:
+            self._lock.release()
+        return False
+
+
+class _LazyConfigManager:
+    """第一次使用时才打开数据库并加载配置，import config 本身不做任何IO"""
+    
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_init_lock", threading.Lock())
+    
+    def _get(self) -> ServerConfigManager:
+        if self._instance is None:
+            with self._init_lock:
+                if self._instance is None:
+                    object.__setattr__(self, "_instance", self._factory())
+        return self._instance
+    
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
 
 
 # 创建全局管理器实例
-config_manager = ServerConfigManager()
+config_manager = _LazyConfigManager(ServerConfigManager)
 
 
 def load_servers():
@@ -101,158 +427,3 @@ def save_servers(servers: List[ServerConfig]):
     """保存服务器配置"""
     config_manager.servers = servers
     config_manager.save()
-
-
-# ServerConfigDialog implementation
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit, QPushButton, QDialogButtonBox, QMessageBox, QLabel
-from PyQt5.QtCore import Qt
-from qfluentwidgets import CardWidget, SubtitleLabel, LineEdit, PushButton, PrimaryPushButton, ComboBox, Theme, setTheme
-
-
-class ServerConfigDialog(QDialog):
-    def __init__(self, parent=None, server: ServerConfig = None):
-        super().__init__(parent)
-        self.setWindowTitle("服务器配置" if server is None else "编辑服务器")
-        self.setFixedSize(450, 400)
-        
-        self.server = server or ServerConfig()
-        
-        # 主布局
-        main_layout = QVBoxLayout()
-        main_layout.setContentsMargins(20, 20, 20, 20)
-        main_layout.setSpacing(15)
-        
-        # 标题
-        title = SubtitleLabel("服务器配置", self)
-        title.setStyleSheet("font-size: 18px; font-weight: bold;")
-        main_layout.addWidget(title)
-        
-        # 卡片容器
-        card = CardWidget(self)
-        card_layout = QVBoxLayout(card)
-        card_layout.setContentsMargins(20, 20, 20, 20)
-        card_layout.setSpacing(15)
-        
-        # 表单布局
-        form_layout = QFormLayout()
-        form_layout.setSpacing(10)
-        form_layout.setFieldGrowthPolicy(QFormLayout.ExpandingFieldsGrow)
-        
-        # 名称输入
-        self.name_edit = LineEdit(card)
-        self.name_edit.setText(self.server.name)
-        self.name_edit.setPlaceholderText("输入服务器名称")
-        form_layout.addRow("名称:", self.name_edit)
-        
-        # 主机输入
-        self.host_edit = LineEdit(card)
-        self.host_edit.setText(self.server.host)
-        self.host_edit.setPlaceholderText("例如: 192.168.1.1")
-        form_layout.addRow("主机:", self.host_edit)
-        
-        # 端口输入
-        self.port_edit = LineEdit(card)
-        self.port_edit.setText(str(self.server.port))
-        self.port_edit.setPlaceholderText("默认: 22")
-        form_layout.addRow("端口:", self.port_edit)
-        
-        # 用户名输入
-        self.username_edit = LineEdit(card)
-        self.username_edit.setText(self.server.username)
-        self.username_edit.setPlaceholderText("输入用户名")
-        form_layout.addRow("用户名:", self.username_edit)
-        
-        # 密码输入
-        self.password_edit = LineEdit(card)
-        self.password_edit.setText(self.server.password)
-        self.password_edit.setEchoMode(QLineEdit.Password)
-        self.password_edit.setPlaceholderText("输入密码")
-        form_layout.addRow("密码:", self.password_edit)
-        
-        # 认证方式选择
-        auth_layout = QHBoxLayout()
-        self.auth_combo = ComboBox(card)
-        self.auth_combo.addItems(["密码认证", "密钥认证"])
-        self.auth_combo.setCurrentIndex(0 if not self.server.use_key else 1)
-        auth_layout.addWidget(self.auth_combo)
-        
-        self.key_file_btn = PushButton("选择密钥文件", card)
-        self.key_file_btn.setVisible(self.server.use_key)
-        auth_layout.addWidget(self.key_file_btn)
-        
-        form_layout.addRow("认证方式:", auth_layout)
-        
-        # 描述输入
-        self.description_edit = LineEdit(card)
-        self.description_edit.setText(self.server.description)
-        self.description_edit.setPlaceholderText("服务器描述信息")
-        form_layout.addRow("描述:", self.description_edit)
-        
-        card_layout.addLayout(form_layout)
-        main_layout.addWidget(card)
-        
-        # 按钮布局
-        button_layout = QHBoxLayout()
-        button_layout.addStretch()
-        
-        self.cancel_btn = PushButton("取消", card)
-        button_layout.addWidget(self.cancel_btn)
-        
-        self.ok_btn = PrimaryPushButton("确定", card)
-        button_layout.addWidget(self.ok_btn)
-        
-        card_layout.addLayout(button_layout)
-        
-        self.setLayout(main_layout)
-        
-        # 连接信号
-        self.cancel_btn.clicked.connect(self.reject)
-        self.ok_btn.clicked.connect(self.accept)
-        self.auth_combo.currentTextChanged.connect(self.on_auth_changed)
-        
-    def on_auth_changed(self, text):
-        # 根据认证方式显示/隐藏密钥文件按钮
-        is_key_auth = text == "密钥认证"
-        self.key_file_btn.setVisible(is_key_auth)
-        if is_key_auth:
-            self.key_file_btn.clicked.connect(self.select_key_file)
-    
-    def select_key_file(self):
-        from PyQt5.QtWidgets import QFileDialog
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择密钥文件", "", "密钥文件 (*.pem *.key *.ppk);;所有文件 (*)")
-        if file_path:
-            self.key_file_btn.setText(file_path.split("/")[-1])
-    
-    def get_config(self):
-        # Validate inputs
-        if not self.name_edit.text().strip():
-            QMessageBox.warning(self, "警告", "请输入服务器名称")
-            return None
-        if not self.host_edit.text().strip():
-            QMessageBox.warning(self, "警告", "请输入主机地址")
-            return None
-        if not self.username_edit.text().strip():
-            QMessageBox.warning(self, "警告", "请输入用户名")
-            return None
-        
-        try:
-            port = int(self.port_edit.text().strip())
-            if not (1 <= port <= 65535):
-                raise ValueError("Port out of range")
-        except ValueError:
-            QMessageBox.warning(self, "警告", "请输入有效的端口号(1-65535)")
-            return None
-        
-        # Create and return server config
-        config = ServerConfig(
-            id=self.server.id,  # Keep the same ID when editing
-            name=self.name_edit.text().strip(),
-            host=self.host_edit.text().strip(),
-            port=port,
-            username=self.username_edit.text().strip(),
-            password=self.password_edit.text().strip(),
-            description=self.description_edit.text().strip(),
-            use_key=self.auth_combo.currentText() == "密钥认证",
-            key_file=self.key_file_btn.text() if self.key_file_btn.isVisible() else ""
-        )
-        return config
\ No newline at end of file
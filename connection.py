@@ -0,0 +1,565 @@
+"""SSH连接核心（不依赖Qt）
+
+建立连接（跳板机、预连接池、各阶段计时）、执行命令、SFTP操作与端口转发。
+界面通过 ssh.py 中的 SSHClient（本模块 SSHConnection 加上Qt信号）使用，
+命令行工具 sshbox.py 与引擎进程直接使用。
+"""
+import select
+import socket
+import stat
+import time
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+import paramiko
+
+from config import ServerConfig, config_manager
+from forward import ForwardManager, parse_forward
+from jump import JumpHostPool, parse_jump_spec
+from telemetry import ConnectionTelemetry
+from vault import vault
+from warmpool import WarmPool
+
+
+def _ignore(*args):
+    pass
+
+
+def tcp_ping(host: str, port: int, timeout: float = 3) -> int:
+    """TCP连接耗时（毫秒），无法连接时返回-1"""
+    try:
+        start_time = time.time()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        result = sock.connect_ex((host, port))
+        end_time = time.time()
+        sock.close()
+    except Exception:
+        return -1
+    return int((end_time - start_time) * 1000) if result == 0 else -1
+
+
+def open_tcp_socket(host: str, port: int, timeout: float, telemetry: ConnectionTelemetry) -> socket.socket:
+    """解析地址并建立TCP连接，分别记录DNS与TCP耗时"""
+    with telemetry.phase("dns"):
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    error: Optional[OSError] = None
+    with telemetry.phase("tcp"):
+        for family, socktype, proto, _, address in addresses:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(address)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+    raise error or OSError(f"无法解析地址 {host}")
+
+
+def open_paramiko_client(server: ServerConfig, sock=None,
+                         telemetry: Optional[ConnectionTelemetry] = None) -> paramiko.SSHClient:
+    """建立并认证一个paramiko连接，sock不为空时经由该channel（跳板机）连接
+    
+    传入telemetry时记录DNS、TCP、密钥交换与认证各阶段的耗时，并统计线路上的字节数。
+    """
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    
+    if server.use_key and server.key_file:
+        # 使用密钥认证，私钥加密时密码栏作为口令；解析结果由凭据库缓存
+        key = vault.load_key(server.key_file, server.password)
+        auth = {"pkey": key}
+    else:
+        # 使用密码认证
+        auth = {"password": vault.reveal(server.password)}
+    
+    if telemetry is not None:
+        if sock is None:
+            sock = open_tcp_socket(server.host, server.port, 10, telemetry)
+        sock = telemetry.wrap_socket(sock)
+        
+        def transport_factory(*args, **kwargs):
+            # 密钥交换在 start_client 中完成，其后到 connect 返回之间是认证
+            transport = paramiko.Transport(*args, **kwargs)
+            start_client = transport.start_client
+            
+            def timed_start_client(*a, **k):
+                with telemetry.phase("kex"):
+                    return start_client(*a, **k)
+            transport.start_client = timed_start_client
+            return transport
+        auth["transport_factory"] = transport_factory
+    
+    started = time.perf_counter()
+    try:
+        client.connect(
+            hostname=server.host,
+            port=server.port,
+            username=server.username,
+            timeout=10,
+            sock=sock,
+            **auth
+        )
+    except Exception:
+        client.close()
+        raise
+    if telemetry is not None and "kex" in telemetry.phases:
+        telemetry.set_phase("auth", (time.perf_counter() - started) * 1000 - telemetry.phases["kex"])
+    return client
+
+
+def resolve_jump_hosts(server: ServerConfig) -> List[ServerConfig]:
+    """把 server.proxy_jump 解析为各跳的配置
+
+    每一跳可以是服务器列表中的名称/ID（使用其自身的认证信息），
+    也可以是 [user@]host[:port]（沿用目标服务器的认证信息）。
+    """
+    hops = []
+    for item in server.proxy_jump.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        known = config_manager.get_server(item) or next(
+            (s for s in config_manager.get_all_servers() if s.name == item), None
+        )
+        if known is not None and known.id != server.id:
+            hops.append(known)
+            continue
+        username, host, port = parse_jump_spec(item)
+        hops.append(ServerConfig(
+            id=f"jump:{item}", name=item, host=host, port=port,
+            username=username or server.username, password=server.password,
+            key_file=server.key_file, use_key=server.use_key
+        ))
+    return hops
+
+
+# 全局跳板机传输层池，同一跳板后的所有标签页共享
+jump_pool = JumpHostPool(open_paramiko_client)
+
+
+class EstablishedConnection:
+    """已认证的连接（含跳板链引用与主机名）"""
+    
+    def __init__(self, client: paramiko.SSHClient, jump_key=None, hostname: str = "",
+                 telemetry: Optional[ConnectionTelemetry] = None):
+        self.client = client
+        self.jump_key = jump_key
+        self.hostname = hostname
+        self.telemetry = telemetry
+    
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+    
+    def close(self):
+        self.client.close()
+        if self.jump_key is not None:
+            jump_pool.release(self.jump_key)
+            self.jump_key = None
+
+
+def establish_connection(server: ServerConfig, hops: List[ServerConfig] = None) -> EstablishedConnection:
+    """建立到服务器的已认证连接（必要时经由跳板机），并获取主机名
+    
+    hops为None时按 server.proxy_jump 解析跳板机。
+    """
+    telemetry = ConnectionTelemetry(server.host, server.port)
+    sock, jump_key = None, None
+    if hops is None:
+        hops = resolve_jump_hosts(server)
+    if hops:
+        # 经由跳板机链打开到目标的 direct-tcpip channel
+        with telemetry.phase("jump"):
+            sock, jump_key = jump_pool.open_channel(hops, server.host, server.port)
+    
+    try:
+        client = open_paramiko_client(server, sock, telemetry)
+    except Exception:
+        if jump_key is not None:
+            jump_pool.release(jump_key)
+        raise
+    
+    conn = EstablishedConnection(client, jump_key, server.host, telemetry)
+    # 获取主机名
+    try:
+        with telemetry.phase("probe"):
+            _, hostname_output, _ = client.exec_command("hostname")
+            conn.hostname = hostname_output.read().decode('utf-8', errors='replace').strip() or server.host
+    except:
+        pass
+    return conn
+
+
+def _warm_connector(server: ServerConfig) -> EstablishedConnection:
+    conn = establish_connection(server)
+    conn.client.get_transport().set_keepalive(30)  # 空闲时保活，避免被NAT/防火墙断开
+    return conn
+
+
+# 全局预连接池（默认关闭，由设置开启）
+warm_pool = WarmPool(_warm_connector)
+
+
+
+
+class SSHConnection:
+    """一个SSH连接：命令执行、SFTP与端口转发（不依赖Qt）
+    
+    出错时调用 on_error 回调并返回 False/空结果，不抛出异常；
+    连接建立与断开时调用 on_connected / on_disconnected。
+    界面使用的 ssh.SSHClient 只是把这三个回调接到Qt信号上。
+    """
+    
+    def __init__(self, server: ServerConfig):
+        self.server = server
+        self.on_connected: Callable[[], None] = _ignore
+        self.on_disconnected: Callable[[], None] = _ignore
+        self.on_error: Callable[[str], None] = _ignore
+        self.client: Optional[paramiko.SSHClient] = None
+        self.sftp: Optional[paramiko.SFTPClient] = None
+        self.channel = None
+        self.current_channel = None  # 当前执行命令的channel
+        self.forwards: Optional[ForwardManager] = None  # 端口转发管理
+        self._jump_key = None  # 使用中的跳板链
+        self.jump_hosts: Optional[List[ServerConfig]] = None  # 预先解析好的跳板机，为None时按配置解析
+        self._connected = False
+        self.hostname = ""
+        self.current_path = "~"
+        self.telemetry = ConnectionTelemetry(server.host, server.port)
+        self._sftp_record = None
+        
+    def connect(self) -> bool:
+        """连接到服务器"""
+        try:
+            # 优先接管预连接池中已就绪的连接，省去握手
+            started = time.perf_counter()
+            conn = warm_pool.take(self.server)
+            if conn is not None:
+                conn.telemetry.set_phase("warm_take", (time.perf_counter() - started) * 1000)
+            else:
+                conn = establish_connection(self.server, self.jump_hosts)
+            
+            self.client = conn.client
+            self._jump_key = conn.jump_key
+            self.hostname = conn.hostname
+            self.telemetry = conn.telemetry
+            self.telemetry.connected_at = time.time()
+            self.telemetry.start_rtt_probe(self.client.get_transport())
+            self._connected = True
+            
+            # 启动配置中的端口转发（失败不影响连接本身）
+            for forward in self.server.forwards:
+                self.start_forward(forward)
+            
+            self.on_connected()
+            return True
+            
+        except paramiko.PasswordRequiredException:
+            self.on_error("认证失败：私钥已加密，请在密码栏填写私钥口令")
+            return False
+        except paramiko.AuthenticationException:
+            self.on_error("认证失败：用户名或密码错误")
+            return False
+        except paramiko.SSHException as e:
+            self.on_error(f"SSH错误：{str(e)}")
+            return False
+        except TimeoutError:
+            self.on_error(f"连接超时：无法连接到 {self.server.host}:{self.server.port}")
+            return False
+        except OSError as e:
+            if "No route to host" in str(e) or "Network is unreachable" in str(e):
+                self.on_error(f"网络错误：无法访问 {self.server.host}")
+            elif "Connection refused" in str(e):
+                self.on_error(f"连接被拒绝：请检查端口 {self.server.port} 是否正确")
+            else:
+                self.on_error(f"连接错误：{str(e)}")
+            return False
+        except Exception as e:
+            error_msg = str(e)
+            if "timed out" in error_msg.lower():
+                self.on_error(f"连接超时：请检查IP地址和端口是否正确")
+            else:
+                self.on_error(f"连接失败：{error_msg}")
+            return False
+    
+    def disconnect(self):
+        """断开连接"""
+        try:
+            if self.forwards:
+                self.forwards.stop_all()
+                self.forwards = None
+            self.telemetry.stop()
+            if self.sftp:
+                self.sftp.close()
+                self.sftp = None
+                self._sftp_record.close()
+            if self.channel:
+                self.channel.close()
+                self.channel = None
+            if self.client:
+                self.client.close()
+                self.client = None
+            self._release_jump()
+            self._connected = False
+            self.on_disconnected()
+        except Exception as e:
+            self.on_error(f"断开连接失败: {str(e)}")
+    
+    def _release_jump(self):
+        """释放对共享跳板链的引用"""
+        if self._jump_key is not None:
+            jump_pool.release(self._jump_key)
+            self._jump_key = None
+    
+    def is_connected(self) -> bool:
+        """检查是否已连接"""
+        return self._connected and self.client is not None
+    
+    def execute_command(self, command: str) -> Tuple[str, str]:
+        """执行命令（快速命令，等待完成）"""
+        if not self.is_connected():
+            return "", "未连接到服务器"
+        
+        record = self.telemetry.open_channel("exec", command)
+        try:
+            stdin, stdout, stderr = self.client.exec_command(command, timeout=30)
+            output = stdout.read()
+            error = stderr.read()
+            record.add_in(len(output) + len(error))
+            return output.decode('utf-8', errors='replace'), error.decode('utf-8', errors='replace')
+        except Exception as e:
+            return "", str(e)
+        finally:
+            record.close()
+    
+    def execute_command_interactive(self, command: str):
+        """执行交互式命令（支持实时输出和中断）"""
+        if not self.is_connected():
+            return None
+        
+        try:
+            transport = self.client.get_transport()
+            self.current_channel = transport.open_session()
+            self.current_channel.get_pty()  # 获取伪TTY，支持Ctrl+C
+            self.current_channel.exec_command(command)
+            return self.current_channel
+        except Exception as e:
+            self.on_error(f"执行命令失败: {str(e)}")
+            return None
+    
+    def run_command(self, command: str, stdout: BinaryIO, stderr: BinaryIO) -> int:
+        """执行命令，输出实时写入 stdout/stderr（二进制文件对象），返回退出码，失败时返回-1"""
+        if not self.is_connected():
+            self.on_error("未连接到服务器")
+            return -1
+        
+        record = self.telemetry.open_channel("exec", command)
+        try:
+            channel = self.client.get_transport().open_session()
+            channel.exec_command(command)
+            while True:
+                drained = True
+                if channel.recv_ready():
+                    data = channel.recv(32768)
+                    record.add_in(len(data))
+                    stdout.write(data)
+                    drained = False
+                if channel.recv_stderr_ready():
+                    data = channel.recv_stderr(32768)
+                    record.add_in(len(data))
+                    stderr.write(data)
+                    drained = False
+                if drained:
+                    if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                        break
+                    select.select([channel], [], [], 0.1)
+            stdout.flush()
+            stderr.flush()
+            status = channel.recv_exit_status()
+            channel.close()
+            return status
+        except Exception as e:
+            self.on_error(f"执行命令失败: {str(e)}")
+            return -1
+        finally:
+            record.close()
+    
+    def send_ctrl_c(self):
+        """发送Ctrl+C中断信号"""
+        if self.current_channel:
+            try:
+                self.current_channel.send('\x03')  # Ctrl+C
+            except:
+                pass
+    
+    def close_current_channel(self):
+        """关闭当前命令channel"""
+        if self.current_channel:
+            try:
+                self.current_channel.close()
+            except:
+                pass
+            self.current_channel = None
+    
+    def start_forward(self, text: str) -> bool:
+        """启动端口转发，text为OpenSSH风格描述，如 -L 5433:db:5432"""
+        if not self.is_connected():
+            return False
+        
+        try:
+            spec = parse_forward(text)
+            if self.forwards is None:
+                self.forwards = ForwardManager(self.client.get_transport())
+            self.forwards.start_forward(spec)
+            return True
+        except Exception as e:
+            self.on_error(f"端口转发失败 {text}: {str(e)}")
+            return False
+    
+    def stop_forward(self, key: str):
+        """停止端口转发，key为 forward_stats() 中的 spec"""
+        if self.forwards:
+            self.forwards.stop_forward(key)
+    
+    def forward_stats(self) -> List[dict]:
+        """各端口转发的吞吐量与连接数"""
+        if not self.forwards:
+            return []
+        return self.forwards.stats()
+    
+    def telemetry_snapshot(self) -> dict:
+        """连接的性能数据（见 telemetry.py）"""
+        return self.telemetry.snapshot()
+    
+    def get_sftp(self) -> Optional[paramiko.SFTPClient]:
+        """获取SFTP客户端"""
+        if not self.is_connected():
+            return None
+        
+        try:
+            if self.sftp is None:
+                with self.telemetry.sftp_request("open"):
+                    self.sftp = self.client.open_sftp()
+                self._sftp_record = self.telemetry.open_channel("sftp")
+            return self.sftp
+        except Exception as e:
+            self.on_error(f"打开SFTP失败: {str(e)}")
+            return None
+    
+    def list_dir(self, path: str) -> List[Tuple[str, bool, int]]:
+        """列出目录内容，返回 (文件名, 是否为目录, 文件大小) 列表"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return []
+        
+        try:
+            result = []
+            with self.telemetry.sftp_request("listdir"):
+                attrs = sftp.listdir_attr(path)
+            for attr in attrs:
+                is_dir = stat.S_ISDIR(attr.st_mode)
+                result.append((attr.filename, is_dir, attr.st_size))
+            return sorted(result, key=lambda x: (not x[1], x[0].lower()))
+        except Exception as e:
+            self.on_error(f"列出目录失败: {str(e)}")
+            return []
+    
+    def _counting_callback(self, is_upload: bool, progress_callback: Optional[Callable[[int, int], None]]):
+        """把传输进度同时计入SFTP channel的收发字节数"""
+        record, last = self._sftp_record, [0]
+        
+        def callback(transferred, total):
+            delta, last[0] = transferred - last[0], transferred
+            (record.add_out if is_upload else record.add_in)(delta)
+            if progress_callback is not None:
+                progress_callback(transferred, total)
+        return callback
+    
+    def download_file(self, remote_path: str, local_path: str, 
+                     progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        """下载文件"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return False
+        
+        try:
+            with self.telemetry.sftp_request("get"):
+                sftp.get(remote_path, local_path, callback=self._counting_callback(False, progress_callback))
+            return True
+        except Exception as e:
+            self.on_error(f"下载失败: {str(e)}")
+            return False
+    
+    def upload_file(self, local_path: str, remote_path: str,
+                   progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        """上传文件"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return False
+        
+        try:
+            with self.telemetry.sftp_request("put"):
+                sftp.put(local_path, remote_path, callback=self._counting_callback(True, progress_callback))
+            return True
+        except Exception as e:
+            self.on_error(f"上传失败: {str(e)}")
+            return False
+    
+    def mkdir(self, path: str) -> bool:
+        """创建目录"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return False
+        
+        try:
+            with self.telemetry.sftp_request("mkdir"):
+                sftp.mkdir(path)
+            return True
+        except Exception as e:
+            self.on_error(f"创建目录失败: {str(e)}")
+            return False
+    
+    def remove_file(self, path: str) -> bool:
+        """删除文件"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return False
+        
+        try:
+            with self.telemetry.sftp_request("remove"):
+                sftp.remove(path)
+            return True
+        except Exception as e:
+            self.on_error(f"删除文件失败: {str(e)}")
+            return False
+    
+    def rename(self, old_path: str, new_path: str) -> bool:
+        """重命名文件或目录"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return False
+        
+        try:
+            with self.telemetry.sftp_request("rename"):
+                sftp.rename(old_path, new_path)
+            return True
+        except Exception as e:
+            self.on_error(f"重命名失败: {str(e)}")
+            return False
+    
+    def rmdir(self, path: str) -> bool:
+        """删除目录"""
+        sftp = self.get_sftp()
+        if not sftp:
+            return False
+        
+        try:
+            with self.telemetry.sftp_request("rmdir"):
+                sftp.rmdir(path)
+            return True
+        except Exception as e:
+            self.on_error(f"删除目录失败: {str(e)}")
+            return False
+
+
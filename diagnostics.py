@@ -0,0 +1,214 @@
+"""连接诊断面板
+
+显示一个标签页的连接阶段耗时、往返时间、线路与各channel的收发字节数、
+SFTP请求耗时分布，每秒刷新，可以导出为JSON方便附在问题报告里。
+数据在任务池中获取（引擎模式下是一次进程间调用），拿到后再刷新表格，不阻塞界面线程。
+"""
+import json
+import time
+from typing import Callable, Optional
+
+from PyQt5.QtCore import QTimer, pyqtSignal
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFileDialog, QTableWidgetItem,
+                             QHeaderView, QAbstractItemView)
+from qfluentwidgets import (SubtitleLabel, BodyLabel, StrongBodyLabel, PushButton, PrimaryPushButton,
+                            TableWidget, InfoBar, InfoBarPosition)
+
+from sftp import format_size
+from tasks import Task, BACKGROUND
+
+REFRESH_INTERVAL = 1000  # 毫秒
+
+PHASE_NAMES = {
+    "jump": "跳板机",
+    "dns": "DNS",
+    "tcp": "TCP",
+    "kex": "密钥交换",
+    "auth": "认证",
+    "probe": "主机名",
+    "warm_take": "取用预连接",
+}
+CHANNEL_KINDS = {"command": "命令", "exec": "执行", "sftp": "SFTP"}
+SFTP_OPS = {"open": "打开", "listdir": "列目录", "get": "下载", "put": "上传", "mkdir": "新建目录",
+            "remove": "删除", "rmdir": "删除目录", "rename": "重命名"}
+
+
+def format_phases(phases: dict) -> str:
+    if not phases:
+        return "无（尚未连接）"
+    parts = [f"{PHASE_NAMES.get(name, name)} {ms:.0f} ms" for name, ms in phases.items()]
+    return " · ".join(parts) + f"  （合计 {sum(phases.values()):.0f} ms）"
+
+
+def format_rtt(rtt: dict) -> str:
+    if not rtt.get("count"):
+        return "暂无数据（连接后每15秒测量一次）"
+    text = (f"最近 {rtt['last_ms']:.1f} ms · 中位数 {rtt['p50_ms']:.1f} ms · "
+            f"P99 {rtt['p99_ms']:.1f} ms · 最大 {rtt['max_ms']:.1f} ms · 共 {rtt['count']} 次")
+    if rtt.get("timeouts"):
+        text += f" · 超时 {rtt['timeouts']} 次"
+    if rtt.get("waiting_s"):
+        text += f" · 已等待 {rtt['waiting_s']:.0f} 秒无回应"
+    return text
+
+
+class SnapshotTask(Task):
+    """获取一次诊断数据"""
+    
+    pool_name = BACKGROUND
+    timeout = 5.0  # 排队太久的刷新直接丢弃，下一秒会再取
+    
+    snapshot_ready = pyqtSignal(object)
+    finished_signal = pyqtSignal()
+    
+    def __init__(self, snapshot: Callable[[], Optional[dict]], parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+    
+    def run(self):
+        try:
+            self.snapshot_ready.emit(self.snapshot())
+        finally:
+            self.finished_signal.emit()
+    
+    def on_skipped(self, reason: str):
+        self.finished_signal.emit()
+
+
+class ConnectionDiagnosticsDialog(QDialog):
+    """单个连接的诊断面板（非模态，关闭时停止刷新）"""
+    
+    def __init__(self, title: str, snapshot: Callable[[], Optional[dict]], parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"连接诊断 - {title}")
+        self.resize(760, 600)
+        self.snapshot = snapshot
+        self.data: Optional[dict] = None
+        self._fetching = False  # 上一次获取还没有返回时跳过这次刷新
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+        
+        heading = SubtitleLabel(f"连接诊断：{title}", self)
+        heading.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(heading)
+        
+        self.summary_label = BodyLabel("", self)
+        layout.addWidget(self.summary_label)
+        
+        layout.addWidget(StrongBodyLabel("连接阶段", self))
+        self.phase_label = BodyLabel("", self)
+        self.phase_label.setWordWrap(True)
+        layout.addWidget(self.phase_label)
+        
+        layout.addWidget(StrongBodyLabel("往返时间（keepalive）", self))
+        self.rtt_label = BodyLabel("", self)
+        self.rtt_label.setWordWrap(True)
+        layout.addWidget(self.rtt_label)
+        
+        self.channel_label = StrongBodyLabel("Channel", self)
+        layout.addWidget(self.channel_label)
+        self.channel_table = self.create_table(["类型", "说明", "接收", "发送", "状态", "时长"])
+        self.channel_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        layout.addWidget(self.channel_table, 3)
+        
+        layout.addWidget(StrongBodyLabel("SFTP 请求耗时", self))
+        self.sftp_table = self.create_table(["操作", "次数", "平均", "中位数", "P90", "P99", "最大"])
+        layout.addWidget(self.sftp_table, 2)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        
+        self.export_btn = PushButton("导出JSON", self)
+        self.export_btn.clicked.connect(self.export_json)
+        button_layout.addWidget(self.export_btn)
+        
+        self.close_btn = PrimaryPushButton("关闭", self)
+        self.close_btn.clicked.connect(self.close)
+        button_layout.addWidget(self.close_btn)
+        
+        layout.addLayout(button_layout)
+        
+        self.timer = QTimer(self)
+        self.timer.setInterval(REFRESH_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        self.finished.connect(self.timer.stop)  # 按Esc关闭时不经过 closeEvent
+        self.timer.start()
+        self.refresh()
+    
+    def create_table(self, headers) -> TableWidget:
+        table = TableWidget(self)
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.verticalHeader().hide()
+        table.verticalHeader().setDefaultSectionSize(28)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setWordWrap(False)
+        return table
+    
+    def fill_table(self, table: TableWidget, rows):
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(str(value)))
+        table.setUpdatesEnabled(True)
+    
+    def refresh(self):
+        """在任务池中获取诊断数据，返回后由 show_snapshot 更新界面"""
+        if self._fetching:
+            return
+        self._fetching = True
+        task = SnapshotTask(self.snapshot)
+        task.snapshot_ready.connect(self.show_snapshot)
+        task.finished_signal.connect(self._on_fetch_finished)
+        task.start()
+    
+    def _on_fetch_finished(self):
+        self._fetching = False
+    
+    def show_snapshot(self, data: Optional[dict]):
+        if data is None:
+            self.summary_label.setText("未连接")
+            return
+        self.data = data
+        
+        wire = data["wire"]
+        summary = f"{data['host']}:{data['port']} · 线路接收 {format_size(wire['bytes_in'])} · 发送 {format_size(wire['bytes_out'])}"
+        if data["connected_at"]:
+            summary += f" · 已连接 {int(time.time() - data['connected_at'])} 秒"
+        self.summary_label.setText(summary)
+        self.phase_label.setText(format_phases(data["phases_ms"]))
+        self.rtt_label.setText(format_rtt(data["rtt"]))
+        
+        channels = data["channels"]
+        self.channel_label.setText(f"Channel（打开 {channels['open']} 个，累计 {channels['total']} 个）")
+        self.fill_table(self.channel_table, [
+            (CHANNEL_KINDS.get(item["kind"], item["kind"]), item["label"], format_size(item["bytes_in"]),
+             format_size(item["bytes_out"]), "打开" if item["open"] else "已关闭", f"{item['duration_s']:.1f} 秒")
+            for item in channels["items"]
+        ])
+        self.fill_table(self.sftp_table, [
+            (SFTP_OPS.get(op, op), stats["count"], f"{stats['mean_ms']:.1f} ms", f"{stats['p50_ms']:.1f} ms",
+             f"{stats['p90_ms']:.1f} ms", f"{stats['p99_ms']:.1f} ms", f"{stats['max_ms']:.1f} ms")
+            for op, stats in data["sftp"].items()
+        ])
+    
+    def export_json(self):
+        if self.data is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出诊断数据", "diagnostics.json", "JSON 文件 (*.json)")
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            InfoBar.error("错误", f"导出失败: {e}", parent=self, position=InfoBarPosition.TOP)
+            return
+        InfoBar.success("成功", "诊断数据已导出", parent=self, position=InfoBarPosition.TOP)
+    
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
@@ -0,0 +1,736 @@
+"""独立进程SSH引擎（可选）
+
+开启后，SSH连接、channel、SFTP以及加解密都在单独的引擎进程中运行，
+界面进程只通过管道发送简短的命令（元组），不再与这些工作争抢GIL：
+- 连接、SFTP操作、命令执行等请求带请求ID，引擎完成后回复 ("result", 请求ID, 是否成功, 值)
+- 终端输出通过每条命令一个的共享内存环形缓冲区（ShmRing）传回，界面定时批量读取
+- 传输进度、错误、命令结束等事件走事件管道
+
+EngineSSHClient 与 SSHClient 接口一致，终端和SFTP界面无需区分两种模式。
+引擎进程内部直接使用 connection.SSHConnection，预连接池只在界面进程中工作，引擎模式下不使用。
+"""
+import codecs
+import itertools
+import multiprocessing
+import queue
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from config import ServerConfig
+
+RING_SIZE = 1024 * 1024  # 每条命令的输出缓冲区大小
+RING_HEADER_SIZE = 64
+POLL_INTERVAL = 10  # 界面读取输出缓冲区的间隔（毫秒）
+READ_BUDGET = 256 * 1024  # 每次每条命令最多读取的字节数，避免一次渲染过多
+PROGRESS_INTERVAL = 0.05  # 传输进度事件的最小间隔（秒）
+CALL_TIMEOUT = 60.0  # 同步请求的默认超时（秒）
+
+# 引擎进程中允许远程调用的 SSHConnection 方法
+REMOTE_METHODS = {"execute_command", "list_dir", "mkdir", "remove_file", "rmdir", "rename",
+                  "forward_stats", "start_forward", "stop_forward", "telemetry_snapshot"}
+
+_U64 = struct.Struct("<Q")
+_WRITE_POS, _READ_POS, _CLOSED, _CAPACITY = 0, 8, 16, 24
+
+
+class EngineError(Exception):
+    """引擎请求失败或引擎进程不可用"""
+
+
+class ShmRing:
+    """共享内存上的单生产者单消费者字节环形缓冲区
+    
+    布局：[写入总量][读取总量][写端已关闭][容量]（各8字节，补齐到64字节）+ 数据区。
+    写入总量只由生产者修改，读取总量只由消费者修改，两者单调递增，读写都不需要加锁；
+    数据先写入再更新写入总量，消费者看到新的写入总量时数据一定已就绪（x86/ARM64的8字节对齐写入是原子的）。
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self._owner = owner
+        self.capacity = self._get(_CAPACITY)
+    
+    @classmethod
+    def create(cls, capacity: int = RING_SIZE) -> "ShmRing":
+        """创建缓冲区（由读取端创建并负责删除）"""
+        shm = shared_memory.SharedMemory(create=True, size=RING_HEADER_SIZE + capacity)
+        shm.buf[:RING_HEADER_SIZE] = bytes(RING_HEADER_SIZE)
+        _U64.pack_into(shm.buf, _CAPACITY, capacity)
+        return cls(shm, owner=True)
+    
+    @classmethod
+    def attach(cls, name: str) -> "ShmRing":
+        """按名称打开已有的缓冲区"""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python 3.13 以前打开已有的共享内存也会登记到 resource_tracker；
+            # 引擎进程由界面进程启动，两者共用同一个 resource_tracker，重复登记不影响创建方删除
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+    
+    @property
+    def name(self) -> str:
+        return self._shm.name
+    
+    def _get(self, offset: int) -> int:
+        return _U64.unpack_from(self._buf, offset)[0]
+    
+    def _set(self, offset: int, value: int):
+        _U64.pack_into(self._buf, offset, value)
+    
+    def write(self, data: bytes, should_stop: Callable[[], bool] = None) -> int:
+        """写入全部数据，缓冲区满时等待读取端（形成背压）；返回实际写入的字节数"""
+        view = memoryview(data)
+        capacity, written, delay = self.capacity, 0, 0.0005
+        while written < len(view):
+            position = self._get(_WRITE_POS)
+            free = capacity - (position - self._get(_READ_POS))
+            if free == 0:
+                if should_stop is not None and should_stop():
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
+                continue
+            delay = 0.0005
+            n = min(free, len(view) - written)
+            start = position % capacity
+            first = min(n, capacity - start)
+            base = RING_HEADER_SIZE
+            self._buf[base + start:base + start + first] = view[written:written + first]
+            if n > first:
+                self._buf[base:base + n - first] = view[written + first:written + n]
+            written += n
+            self._set(_WRITE_POS, position + n)
+        return written
+    
+    def read(self, limit: int = READ_BUDGET) -> bytes:
+        """读取最多limit字节，没有数据时返回空bytes"""
+        position = self._get(_READ_POS)
+        n = min(self._get(_WRITE_POS) - position, limit)
+        if n <= 0:
+            return b""
+        capacity, base = self.capacity, RING_HEADER_SIZE
+        start = position % capacity
+        first = min(n, capacity - start)
+        data = bytes(self._buf[base + start:base + start + first])
+        if n > first:
+            data += bytes(self._buf[base:base + n - first])
+        self._set(_READ_POS, position + n)
+        return data
+    
+    def available(self) -> int:
+        return self._get(_WRITE_POS) - self._get(_READ_POS)
+    
+    def close_writer(self):
+        """生产者标记不会再写入"""
+        self._set(_CLOSED, 1)
+    
+    def writer_closed(self) -> bool:
+        return self._get(_CLOSED) != 0
+    
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ---- 引擎进程 ----
+
+def engine_main(commands, events):
+    """引擎进程入口"""
+    _Engine(events).serve(commands)
+
+
+class _Engine:
+    """在引擎进程中执行界面进程发来的命令"""
+    
+    def __init__(self, events):
+        self._events = events
+        self._send_lock = threading.Lock()
+        self._clients = {}  # 连接ID -> SSHConnection
+        self._channels: Dict[int, dict] = {}  # 命令ID -> {"channel", "stop", "ring", "input"}
+        self._transfers: Dict[int, threading.Event] = {}  # 请求ID -> 取消标记
+        # 连接、远程调用与传输的应答；命令输出的转发各自使用专用线程，长时间运行的命令不会占满这里
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="engine")
+    
+    def send(self, *message):
+        with self._send_lock:
+            try:
+                self._events.send(message)
+            except (OSError, EOFError, BrokenPipeError):
+                pass
+    
+    def serve(self, commands):
+        while True:
+            try:
+                message = commands.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == "shutdown":
+                break
+            handler = getattr(self, f"_on_{message[0]}", None)
+            if handler is None:
+                print(f"引擎收到未知命令: {message[0]}")
+                continue
+            try:
+                handler(*message[1:])
+            except Exception as e:
+                print(f"引擎处理命令失败 {message[0]}: {e}")
+        for info in list(self._channels.values()):
+            info["stop"].set()
+        for client in list(self._clients.values()):
+            client.disconnect()
+        self._executor.shutdown(wait=False)
+    
+    def _reply(self, request_id: int, func, *args):
+        """在线程池中执行并回复结果"""
+        def run():
+            try:
+                self.send("result", request_id, True, func(*args))
+            except Exception as e:
+                self.send("result", request_id, False, str(e))
+        self._executor.submit(run)
+    
+    def _on_connect(self, request_id: int, client_id: int, server: dict, hops: List[dict]):
+        from connection import SSHConnection
+        
+        def connect():
+            client = SSHConnection(ServerConfig.from_dict(server))
+            client.jump_hosts = [ServerConfig.from_dict(hop) for hop in hops]
+            client.on_error = lambda message: self.send("error", client_id, message)
+            if not client.connect():
+                return None
+            self._clients[client_id] = client
+            return client.hostname
+        self._reply(request_id, connect)
+    
+    def _on_disconnect(self, client_id: int):
+        client = self._clients.pop(client_id, None)
+        if client is not None:
+            self._executor.submit(client.disconnect)
+    
+    def _on_call(self, request_id: int, client_id: int, method: str, args: tuple):
+        client = self._clients.get(client_id)
+        if client is None or method not in REMOTE_METHODS:
+            self.send("result", request_id, False, "未连接到服务器")
+            return
+        self._reply(request_id, getattr(client, method), *args)
+    
+    def _on_transfer(self, request_id: int, client_id: int, is_upload: bool, local_path: str, remote_path: str):
+        client = self._clients.get(client_id)
+        if client is None:
+            self.send("result", request_id, False, "未连接到服务器")
+            return
+        last = [0.0]
+        cancel = self._transfers[request_id] = threading.Event()
+        
+        def progress(transferred, total):
+            if cancel.is_set():
+                raise EngineError("已取消")  # 在paramiko的回调中抛出异常即可中止传输
+            now = time.monotonic()
+            if now - last[0] >= PROGRESS_INTERVAL or transferred >= total:
+                last[0] = now
+                self.send("progress", request_id, transferred, total)
+        
+        def transfer():
+            try:
+                if is_upload:
+                    return client.upload_file(local_path, remote_path, progress)
+                return client.download_file(remote_path, local_path, progress)
+            finally:
+                self._transfers.pop(request_id, None)
+        self._reply(request_id, transfer)
+    
+    def _on_cancel(self, request_id: int):
+        cancel = self._transfers.get(request_id)
+        if cancel is not None:
+            cancel.set()
+    
+    def _on_exec(self, command_id: int, client_id: int, command: str, ring_name: str):
+        client = self._clients.get(client_id)
+        if client is None:
+            self.send("stderr", command_id, "未连接到服务器\n")
+            self.send("exit", command_id)
+            return
+        info = {"channel": None, "stop": threading.Event(), "ring": ShmRing.attach(ring_name),
+                "record": client.telemetry.open_channel("command", command), "input": queue.Queue()}
+        self._channels[command_id] = info
+        threading.Thread(target=self._pump, args=(command_id, client, command, info),
+                         name=f"engine-pump-{command_id}", daemon=True).start()
+    
+    def _pump(self, command_id: int, client, command: str, info: dict):
+        """把channel的输出写入共享内存缓冲区，直到命令结束"""
+        ring, stop, record = info["ring"], info["stop"], info["record"]
+        channel = client.execute_command_interactive(command)
+        info["channel"] = channel
+        try:
+            if channel is None:
+                self.send("stderr", command_id, "无法执行命令\n")
+                return
+            threading.Thread(target=self._write_input, args=(channel, info),
+                             name=f"engine-input-{command_id}", daemon=True).start()
+            while not stop.is_set():
+                if channel.recv_ready():
+                    data = channel.recv(65536)
+                    record.add_in(len(data))
+                    ring.write(data, stop.is_set)
+                elif channel.recv_stderr_ready():
+                    data = channel.recv_stderr(65536)
+                    record.add_in(len(data))
+                    self.send("stderr", command_id, data.decode('utf-8', errors='replace'))
+                elif channel.exit_status_ready():
+                    break
+                else:
+                    try:
+                        select.select([channel], [], [], 0.05)
+                    except (OSError, ValueError):
+                        time.sleep(0.05)
+            while channel.recv_ready() and not stop.is_set():
+                data = channel.recv(65536)
+                record.add_in(len(data))
+                ring.write(data, stop.is_set)
+        except Exception as e:
+            self.send("stderr", command_id, f"\n错误: {str(e)}\n")
+        finally:
+            info["input"].put(None)
+            if channel is not None:
+                channel.close()
+            client.current_channel = None
+            record.close()
+            ring.close_writer()
+            ring.close()
+            self._channels.pop(command_id, None)
+            self.send("exit", command_id)
+    
+    @staticmethod
+    def _write_input(channel, info: dict):
+        """写线程：把输入写入channel，远程不读取输入时只阻塞这一条命令"""
+        while True:
+            data = info["input"].get()
+            if data is None:
+                break
+            try:
+                channel.sendall(data)
+            except Exception:
+                break
+            info["record"].add_out(len(data))
+    
+    def _on_input(self, command_id: int, text: str):
+        # 只入队，不能在命令循环中阻塞（大段粘贴时会卡住所有会话）
+        info = self._channels.get(command_id)
+        if info is not None:
+            info["input"].put(text.encode('utf-8'))
+    
+    def _on_stop(self, command_id: int):
+        info = self._channels.get(command_id)
+        if info is None:
+            return
+        if info["channel"] is not None:
+            try:
+                info["channel"].send('\x03')  # 发送Ctrl+C
+            except Exception:
+                pass
+        info["stop"].set()
+
+
+# ---- 界面进程 ----
+
+class _PendingCall:
+    def __init__(self, progress: Callable[[int, int], None] = None):
+        self.done = threading.Event()
+        self.progress = progress
+        self.last_activity = time.monotonic()  # 最近一次收到进度的时间，超时从这里算起
+        self.ok = False
+        self.value = None
+
+
+class EngineHost(QObject):
+    """界面进程中的引擎代理：启动引擎进程、收发命令与事件、轮询输出缓冲区"""
+    
+    eventReceived = pyqtSignal(tuple)
+    
+    def __init__(self):
+        super().__init__()
+        context = multiprocessing.get_context("spawn")
+        command_reader, self._commands = context.Pipe(duplex=False)
+        self._events, event_writer = context.Pipe(duplex=False)
+        self._process = context.Process(target=engine_main, args=(command_reader, event_writer),
+                                        name="sshbox-engine", daemon=True)
+        self._process.start()
+        command_reader.close()
+        event_writer.close()
+        
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, _PendingCall] = {}
+        self._clients: Dict[int, "EngineSSHClient"] = {}
+        self._workers: Dict[int, "EngineCommandWorker"] = {}
+        self.alive = True
+        
+        self.eventReceived.connect(self._dispatch)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self._poll_rings)
+        self._reader = threading.Thread(target=self._read_events, name="engine-events", daemon=True)
+        self._reader.start()
+    
+    def next_id(self) -> int:
+        return next(self._ids)
+    
+    def send(self, *message):
+        if not self.alive:
+            raise EngineError("引擎进程已退出")
+        with self._send_lock:
+            try:
+                self._commands.send(message)
+            except (OSError, BrokenPipeError) as e:
+                raise EngineError(f"引擎进程已退出: {e}")
+    
+    def request(self, op: str, *args, progress: Callable[[int, int], None] = None,
+                timeout: float = CALL_TIMEOUT):
+        """发送请求并等待结果（可在任意线程调用），失败时抛出EngineError
+        
+        timeout 从最近一次进度事件算起：传输只要还在推进就不会超时。
+        """
+        request_id = self.next_id()
+        pending = _PendingCall(progress)
+        self._pending[request_id] = pending
+        try:
+            self.send(op, request_id, *args)
+            while not pending.done.wait(max(0.0, pending.last_activity + timeout - time.monotonic())):
+                if time.monotonic() - pending.last_activity >= timeout:
+                    self._cancel(request_id)
+                    raise EngineError("引擎请求超时")
+        finally:
+            self._pending.pop(request_id, None)
+        if not pending.ok:
+            raise EngineError(pending.value)
+        return pending.value
+    
+    def _cancel(self, request_id: int):
+        """通知引擎中止传输（引擎在下一次进度回调时结束）"""
+        try:
+            self.send("cancel", request_id)
+        except EngineError:
+            pass
+    
+    def _read_events(self):
+        """事件线程：请求结果直接唤醒等待的线程，其余事件交给界面线程处理"""
+        while True:
+            try:
+                event = self._events.recv()
+            except (EOFError, OSError):
+                break
+            kind = event[0]
+            if kind == "result":
+                pending = self._pending.get(event[1])
+                if pending is not None:
+                    pending.ok, pending.value = event[2], event[3]
+                    pending.done.set()
+            elif kind == "progress":
+                pending = self._pending.get(event[1])
+                if pending is not None:
+                    pending.last_activity = time.monotonic()
+                    if pending.progress is not None:
+                        try:
+                            pending.progress(event[2], event[3])
+                        except Exception:
+                            # 回调抛出异常表示中止传输（如任务已取消），与直接使用paramiko时一致；
+                            # 不能让异常结束事件线程
+                            pending.progress = None
+                            self._cancel(event[1])
+            else:
+                self.eventReceived.emit(event)
+        # 引擎进程退出：让所有等待中的请求失败
+        self.alive = False
+        for pending in list(self._pending.values()):
+            pending.ok, pending.value = False, "引擎进程已退出"
+            pending.done.set()
+        self.eventReceived.emit(("engine_exit",))
+    
+    def _dispatch(self, event: tuple):
+        kind = event[0]
+        if kind == "error":
+            client = self._clients.get(event[1])
+            if client is not None:
+                client.error_occurred.emit(event[2])
+        elif kind == "stderr":
+            worker = self._workers.get(event[1])
+            if worker is not None:
+                worker.error_ready.emit(event[2])
+        elif kind == "exit":
+            worker = self._workers.get(event[1])
+            if worker is not None:
+                worker.exited = True
+                self._poll_rings()
+        elif kind == "engine_exit":
+            for worker in list(self._workers.values()):
+                worker.exited = True
+            self._poll_rings()
+            for client in list(self._clients.values()):
+                client.on_engine_exit()
+    
+    def register_client(self, client: "EngineSSHClient"):
+        self._clients[client.client_id] = client
+    
+    def unregister_client(self, client: "EngineSSHClient"):
+        self._clients.pop(client.client_id, None)
+    
+    def register_worker(self, worker: "EngineCommandWorker"):
+        self._workers[worker.command_id] = worker
+        if not self._poll_timer.isActive():
+            self._poll_timer.start()
+    
+    def _poll_rings(self):
+        """批量读取各命令的输出"""
+        for command_id, worker in list(self._workers.items()):
+            if worker.poll():
+                del self._workers[command_id]
+        if not self._workers:
+            self._poll_timer.stop()
+    
+    def shutdown(self, timeout: float = 2.0):
+        """通知引擎断开所有连接并退出"""
+        if self.alive:
+            try:
+                self.send("shutdown")
+            except EngineError:
+                pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self.alive = False
+
+
+_host: Optional[EngineHost] = None
+
+
+def engine_host() -> EngineHost:
+    """引擎代理（第一次使用时启动引擎进程），引擎进程意外退出后会重新启动"""
+    global _host
+    if _host is None or not _host.alive:
+        _host = EngineHost()
+    return _host
+
+
+def shutdown_engine():
+    """关闭引擎进程（未启动时什么也不做）"""
+    global _host
+    if _host is not None:
+        _host.shutdown()
+        _host = None
+
+
+class EngineSSHClient(QObject):
+    """经由引擎进程的SSH客户端，接口与 SSHClient 一致"""
+    
+    connected = pyqtSignal()
+    disconnected = pyqtSignal()
+    output_received = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+    
+    def __init__(self, server: ServerConfig, parent=None):
+        super().__init__(parent)
+        self.server = server
+        self.host = engine_host()
+        self.client_id = self.host.next_id()
+        self.hostname = ""
+        self.current_path = "~"
+        self._connected = False
+        self.host.register_client(self)
+    
+    def connect(self) -> bool:
+        """连接到服务器（阻塞，在连接线程中调用）"""
+        from connection import resolve_jump_hosts
+        from vault import vault
+        
+        def revealed(server: ServerConfig) -> dict:
+            # 引擎进程不持有凭据库的密钥，在这里解密后随请求发送（仅经由本机管道）
+            data = server.to_dict()
+            data["password"] = vault.reveal(server.password)
+            return data
+        
+        try:
+            hops = resolve_jump_hosts(self.server) if self.server.proxy_jump else []
+            hostname = self.host.request("connect", self.client_id, revealed(self.server),
+                                         [revealed(hop) for hop in hops])
+        except Exception as e:
+            self.error_occurred.emit(f"连接失败：{str(e)}")
+            return False
+        if hostname is None:
+            return False  # 错误信息已由引擎通过 error 事件发送
+        self.hostname = hostname
+        self._connected = True
+        self.connected.emit()
+        return True
+    
+    def disconnect(self):
+        if self._connected:
+            self._connected = False
+            try:
+                self.host.send("disconnect", self.client_id)
+            except EngineError:
+                pass
+        self.host.unregister_client(self)
+        self.disconnected.emit()
+    
+    def on_engine_exit(self):
+        if self._connected:
+            self.error_occurred.emit("引擎进程已退出，连接已断开")
+            self.disconnect()
+    
+    def is_connected(self) -> bool:
+        return self._connected
+    
+    def _call(self, method: str, *args, default=None):
+        if not self._connected:
+            return default
+        try:
+            return self.host.request("call", self.client_id, method, args)
+        except EngineError as e:
+            self.error_occurred.emit(str(e))
+            return default
+    
+    def execute_command(self, command: str) -> Tuple[str, str]:
+        if not self._connected:
+            return "", "未连接到服务器"
+        return self._call("execute_command", command, default=("", "引擎请求失败"))
+    
+    def command_worker(self, command: str) -> "EngineCommandWorker":
+        return EngineCommandWorker(self, command)
+    
+    def start_forward(self, text: str) -> bool:
+        return self._call("start_forward", text, default=False)
+    
+    def stop_forward(self, key: str):
+        self._call("stop_forward", key)
+    
+    def forward_stats(self) -> List[dict]:
+        return self._call("forward_stats", default=[])
+    
+    def list_dir(self, path: str) -> List[Tuple[str, bool, int]]:
+        return [tuple(item) for item in self._call("list_dir", path, default=[])]
+    
+    def _transfer(self, is_upload: bool, local_path: str, remote_path: str, progress_callback) -> bool:
+        if not self._connected:
+            return False
+        try:
+            return self.host.request("transfer", self.client_id, is_upload, local_path, remote_path,
+                                     progress=progress_callback)
+        except EngineError as e:
+            self.error_occurred.emit(str(e))
+            return False
+    
+    def download_file(self, remote_path: str, local_path: str,
+                      progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        return self._transfer(False, local_path, remote_path, progress_callback)
+    
+    def upload_file(self, local_path: str, remote_path: str,
+                    progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        return self._transfer(True, local_path, remote_path, progress_callback)
+    
+    def mkdir(self, path: str) -> bool:
+        return self._call("mkdir", path, default=False)
+    
+    def remove_file(self, path: str) -> bool:
+        return self._call("remove_file", path, default=False)
+    
+    def rmdir(self, path: str) -> bool:
+        return self._call("rmdir", path, default=False)
+    
+    def rename(self, old_path: str, new_path: str) -> bool:
+        return self._call("rename", old_path, new_path, default=False)
+
+    def telemetry_snapshot(self) -> Optional[dict]:
+        return self._call("telemetry_snapshot")
+
+
+class EngineCommandWorker(QObject):
+    """经由引擎进程执行交互式命令，信号与 SSHWorker 一致"""
+    
+    output_ready = pyqtSignal(str)
+    error_ready = pyqtSignal(str)
+    finished_signal = pyqtSignal()
+    input_requested = pyqtSignal()
+    echo_rtt = pyqtSignal(float)
+    
+    def __init__(self, client: EngineSSHClient, command: str, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.command = command
+        self.command_id = client.host.next_id()
+        self.exited = False
+        self._ring: Optional[ShmRing] = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._echo_sent_at: Optional[float] = None
+        self._sink = None  # 标签页休眠时输出直接写入的缓存（terminal.OutputRing）
+    
+    def set_output_sink(self, sink):
+        """标签页休眠时设置输出缓存：之后读到的原始字节直接写入缓存，不解码、不发信号；
+        传入None恢复逐块发信号"""
+        if sink is not None:
+            # 解码器里可能还留着半个多字节字符，先交给缓存，与后续字节接上
+            pending, _ = self._decoder.getstate()
+            self._decoder.reset()
+            sink.append(pending)
+        self._sink = sink
+    
+    def start(self):
+        self._ring = ShmRing.create()
+        self.client.host.register_worker(self)
+        try:
+            self.client.host.send("exec", self.command_id, self.client.client_id, self.command, self._ring.name)
+        except EngineError as e:
+            self.error_ready.emit(f"{e}\n")
+            self.exited = True
+    
+    def send_input(self, text: str):
+        try:
+            self.client.host.send("input", self.command_id, text)
+        except EngineError:
+            return
+        if self._echo_sent_at is None:
+            self._echo_sent_at = time.perf_counter()
+    
+    def stop(self):
+        try:
+            self.client.host.send("stop", self.command_id)
+        except EngineError:
+            pass
+    
+    def poll(self) -> bool:
+        """读取新的输出，返回命令是否已结束"""
+        data = self._ring.read()
+        if data and self._sink is not None:
+            self._sink.append(data)
+        elif data:
+            text = self._decoder.decode(data)
+            if text:
+                if self._echo_sent_at is not None:
+                    self.echo_rtt.emit((time.perf_counter() - self._echo_sent_at) * 1000)
+                    self._echo_sent_at = None
+                self.output_ready.emit(text)
+                from ssh import looks_like_input_prompt
+                if looks_like_input_prompt(text):
+                    self.input_requested.emit()
+        if not self.exited or self._ring.available():
+            return False
+        tail = self._decoder.decode(b"", final=True)
+        if tail:
+            self.output_ready.emit(tail)
+        self._ring.close()
+        self.finished_signal.emit()
+        return True
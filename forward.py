@@ -0,0 +1,506 @@
+"""端口转发：本地(-L)、远程(-R)、动态SOCKS5(-D)
+
+所有转发连接由每个SSH连接一个的选择器线程统一中继，不为每个socket单独开线程；
+握手、打开channel等会阻塞的步骤放到线程池中完成后再交给选择器。每个建立中的连接
+都会在 open_channel 上阻塞一个线程（最长 CONNECT_TIMEOUT），因此线程数按同时接入的
+连接数设置，与监听队列长度一致，避免突发连接排在少数几个慢连接后面。
+"""
+import re
+import queue
+import socket
+import struct
+import selectors
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from telemetry import global_request_slot
+
+BUFFER_SIZE = 64 * 1024  # 中继缓冲区大小
+CONNECT_TIMEOUT = 10  # 打开channel/连接目标的超时（秒）
+ACCEPT_BACKLOG = 128  # 监听队列长度，也是同时建立中的连接数上限
+
+_TOKEN_RE = re.compile(r'\[[^\]]*\]|[^:]+')
+
+
+@dataclass
+class ForwardSpec:
+    """端口转发描述"""
+    kind: str  # 'L' 本地, 'R' 远程, 'D' 动态(SOCKS5)
+    bind_host: str = "127.0.0.1"
+    bind_port: int = 0
+    dest_host: str = ""
+    dest_port: int = 0
+    
+    def __str__(self) -> str:
+        bind = f"{self.bind_host}:{self.bind_port}"
+        if self.kind == 'D':
+            return f"-D {bind}"
+        return f"-{self.kind} {bind}:{self.dest_host}:{self.dest_port}"
+
+
+def parse_forward(text: str) -> ForwardSpec:
+    """解析OpenSSH风格的转发描述，如 "-L 8080:db:5432"、"-R 9000:localhost:3000"、"-D 1080\""""
+    raw = text.strip()
+    match = re.match(r'^-?([LRD])\s*(.+)$', raw, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"无效的端口转发: {text}")
+    kind = match.group(1).upper()
+    parts = [p.strip('[]') for p in _TOKEN_RE.findall(match.group(2).strip())]
+    
+    try:
+        if kind == 'D':
+            if len(parts) == 1:
+                return ForwardSpec('D', "127.0.0.1", int(parts[0]))
+            if len(parts) == 2:
+                return ForwardSpec('D', parts[0], int(parts[1]))
+        else:
+            default_bind = "127.0.0.1" if kind == 'L' else "localhost"
+            if len(parts) == 3:
+                return ForwardSpec(kind, default_bind, int(parts[0]), parts[1], int(parts[2]))
+            if len(parts) == 4:
+                return ForwardSpec(kind, parts[0], int(parts[1]), parts[2], int(parts[3]))
+    except ValueError:
+        pass
+    raise ValueError(f"无效的端口转发: {text}")
+
+
+class TunnelStats:
+    """单条转发的流量与连接统计"""
+    
+    def __init__(self):
+        self.bytes_in = 0  # 远程 -> 本地
+        self.bytes_out = 0  # 本地 -> 远程
+        self.active = 0
+        self.total = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self._last_sample = (time.monotonic(), 0, 0)
+    
+    def to_dict(self) -> dict:
+        """导出统计，速率按两次调用之间的增量计算"""
+        now = time.monotonic()
+        last_time, last_in, last_out = self._last_sample
+        elapsed = max(now - last_time, 1e-6)
+        self._last_sample = (now, self.bytes_in, self.bytes_out)
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "rate_in": (self.bytes_in - last_in) / elapsed,
+            "rate_out": (self.bytes_out - last_out) / elapsed,
+            "active": self.active,
+            "total": self.total,
+            "failed": self.failed,
+        }
+
+
+class _Tunnel:
+    def __init__(self, spec: ForwardSpec):
+        self.spec = spec
+        self.stats = TunnelStats()
+        self.listener: Optional[socket.socket] = None
+        self.remote_port = 0  # -R 实际绑定的远程端口
+
+
+class _Pipe:
+    """一对 本地socket <-> SSH channel 的中继状态"""
+    
+    def __init__(self, sock: socket.socket, chan, tunnel: _Tunnel):
+        self.sock = sock
+        self.chan = chan
+        self.tunnel = tunnel
+        self.to_sock = b""  # 待写入socket的数据（来自channel）
+        self.to_chan = b""  # 待写入channel的数据（来自socket，channel窗口已满）
+        self.sock_events = 0
+        self.chan_registered = False
+
+
+class ForwardManager:
+    """管理一个SSH连接上的所有端口转发"""
+    
+    def __init__(self, transport):
+        self.transport = transport
+        self._tunnels: Dict[str, _Tunnel] = {}
+        self._remote_ports: Dict[int, _Tunnel] = {}
+        self._pipes: Dict[socket.socket, _Pipe] = {}  # 本地socket -> 中继
+        self._backlogged: Dict[socket.socket, _Pipe] = {}  # 有数据等待channel窗口的中继
+        self._lock = threading.Lock()
+        self._ready: "queue.Queue" = queue.Queue()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, ("wake", None))
+        self._executor = ThreadPoolExecutor(max_workers=ACCEPT_BACKLOG, thread_name_prefix="forward-setup")
+        self._buffer = bytearray(BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="forward-relay", daemon=True)
+        self._thread.start()
+    
+    # ---- 对外接口 ----
+    
+    def start_forward(self, spec: ForwardSpec) -> ForwardSpec:
+        """启动一条转发，失败时抛出异常
+        
+        端口为0时每次都绑定一个新端口，键（含实际端口）在绑定之后才能确定，不参与去重。
+        """
+        if spec.bind_port:
+            existing = self._tunnels.get(str(spec))
+            if existing is not None:
+                return existing.spec
+        tunnel = _Tunnel(spec)
+        
+        if spec.kind in ('L', 'D'):
+            listener = socket.create_server((spec.bind_host, spec.bind_port), backlog=ACCEPT_BACKLOG)
+            listener.setblocking(False)
+            tunnel.listener = listener
+            tunnel.spec.bind_port = listener.getsockname()[1]
+            self._ready.put(("listen", tunnel))
+            self._wake()
+        elif spec.kind == 'R':
+            with global_request_slot(self.transport):
+                port = self.transport.request_port_forward(
+                    spec.bind_host, spec.bind_port, handler=self._on_remote_channel
+                )
+            tunnel.remote_port = port
+            tunnel.spec.bind_port = port
+            with self._lock:
+                self._remote_ports[port] = tunnel
+        else:
+            raise ValueError(f"未知的转发类型: {spec.kind}")
+        
+        with self._lock:
+            self._tunnels[str(spec)] = tunnel
+        return tunnel.spec
+    
+    def stop_forward(self, key: str):
+        """停止一条转发，并关闭其上的所有连接"""
+        with self._lock:
+            tunnel = self._tunnels.pop(key, None)
+        if not tunnel:
+            return
+        if tunnel.spec.kind == 'R':
+            with self._lock:
+                self._remote_ports.pop(tunnel.remote_port, None)
+            try:
+                with global_request_slot(self.transport):
+                    self.transport.cancel_port_forward(tunnel.spec.bind_host, tunnel.remote_port)
+            except Exception:
+                pass
+        self._ready.put(("stop", tunnel))
+        self._wake()
+    
+    def stop_all(self):
+        """停止全部转发并结束中继线程"""
+        for key in list(self._tunnels.keys()):
+            self.stop_forward(key)
+        self._running = False
+        self._wake()
+        self._thread.join(timeout=2)
+        self._executor.shutdown(wait=False)
+    
+    def stats(self) -> List[dict]:
+        """每条转发的统计信息"""
+        with self._lock:
+            tunnels = list(self._tunnels.items())
+        result = []
+        for key, tunnel in tunnels:
+            info = tunnel.stats.to_dict()
+            info["spec"] = key
+            result.append(info)
+        return result
+    
+    # ---- 建立连接（线程池中执行） ----
+    
+    def _on_remote_channel(self, chan, origin, server):
+        """transport线程回调：远程端口上有新连接"""
+        with self._lock:
+            tunnel = self._remote_ports.get(server[1])
+        if not tunnel:
+            chan.close()
+            return
+        self._executor.submit(self._setup_remote, tunnel, chan)
+    
+    def _setup_remote(self, tunnel: _Tunnel, chan):
+        try:
+            sock = socket.create_connection(
+                (tunnel.spec.dest_host, tunnel.spec.dest_port), timeout=CONNECT_TIMEOUT
+            )
+        except OSError:
+            tunnel.stats.failed += 1
+            chan.close()
+            return
+        self._hand_off(sock, chan, tunnel)
+    
+    def _setup_local(self, tunnel: _Tunnel, sock: socket.socket):
+        try:
+            chan = self.transport.open_channel(
+                "direct-tcpip", (tunnel.spec.dest_host, tunnel.spec.dest_port),
+                sock.getpeername()[:2], timeout=CONNECT_TIMEOUT
+            )
+        except Exception:
+            tunnel.stats.failed += 1
+            sock.close()
+            return
+        self._hand_off(sock, chan, tunnel)
+    
+    def _setup_socks(self, tunnel: _Tunnel, sock: socket.socket):
+        """完成SOCKS5握手（仅支持无认证的CONNECT）后打开channel"""
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            version, nmethods = struct.unpack("!BB", self._recv_exact(sock, 2))
+            methods = self._recv_exact(sock, nmethods)
+            if version != 5 or 0 not in methods:
+                sock.sendall(b"\x05\xff")
+                raise ConnectionError("不支持的SOCKS版本或认证方式")
+            sock.sendall(b"\x05\x00")
+            
+            version, cmd, _, atyp = struct.unpack("!BBBB", self._recv_exact(sock, 4))
+            if atyp == 1:
+                host = socket.inet_ntoa(self._recv_exact(sock, 4))
+            elif atyp == 3:
+                length = self._recv_exact(sock, 1)[0]
+                host = self._recv_exact(sock, length).decode("idna")
+            elif atyp == 4:
+                host = socket.inet_ntop(socket.AF_INET6, self._recv_exact(sock, 16))
+            else:
+                raise ConnectionError("不支持的地址类型")
+            port = struct.unpack("!H", self._recv_exact(sock, 2))[0]
+            if cmd != 1:
+                sock.sendall(b"\x05\x07\x00\x01\x00\x00\x00\x00\x00\x00")
+                raise ConnectionError("仅支持CONNECT命令")
+            
+            try:
+                chan = self.transport.open_channel(
+                    "direct-tcpip", (host, port), sock.getpeername()[:2], timeout=CONNECT_TIMEOUT
+                )
+            except Exception:
+                sock.sendall(b"\x05\x05\x00\x01\x00\x00\x00\x00\x00\x00")
+                raise
+            sock.sendall(b"\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00")
+        except Exception:
+            tunnel.stats.failed += 1
+            sock.close()
+            return
+        self._hand_off(sock, chan, tunnel)
+    
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("连接已关闭")
+            data += chunk
+        return data
+    
+    def _hand_off(self, sock: socket.socket, chan, tunnel: _Tunnel):
+        """把建立好的连接交给选择器线程"""
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        chan.settimeout(0.0)
+        self._ready.put(("pipe", _Pipe(sock, chan, tunnel)))
+        self._wake()
+    
+    # ---- 选择器线程 ----
+    
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\x00")
+        except OSError:
+            pass
+    
+    def _loop(self):
+        while self._running:
+            # channel窗口满时无法等待可写事件，只能短周期轮询
+            timeout = 0.05 if self._backlogged else None
+            for key, events in self._selector.select(timeout):
+                kind, obj = key.data
+                if kind == "wake":
+                    self._drain_wake()
+                elif kind == "accept":
+                    self._accept(obj)
+                elif kind == "sock":
+                    self._on_sock_event(obj, events)
+                elif kind == "chan":
+                    self._on_chan_readable(obj)
+            for pipe in list(self._backlogged.values()):
+                self._flush_to_chan(pipe)
+        for pipe in list(self._pipes.values()):
+            self._close_pipe(pipe)
+        for key in list(self._selector.get_map().values()):
+            if key.data[0] == "accept":
+                key.fileobj.close()
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+    
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while True:
+            try:
+                action, obj = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if action == "listen":
+                self._selector.register(obj.listener, selectors.EVENT_READ, ("accept", obj))
+            elif action == "pipe":
+                obj.tunnel.stats.active += 1
+                obj.tunnel.stats.total += 1
+                self._pipes[obj.sock] = obj
+                self._update_interest(obj)
+            elif action == "stop":
+                if obj.listener:
+                    try:
+                        self._selector.unregister(obj.listener)
+                    except (KeyError, ValueError):
+                        pass
+                    obj.listener.close()
+                for pipe in [p for p in self._pipes.values() if p.tunnel is obj]:
+                    self._close_pipe(pipe)
+    
+    def _accept(self, tunnel: _Tunnel):
+        while True:
+            try:
+                sock, _ = tunnel.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            sock.setblocking(True)
+            if tunnel.spec.kind == 'D':
+                self._executor.submit(self._setup_socks, tunnel, sock)
+            else:
+                self._executor.submit(self._setup_local, tunnel, sock)
+    
+    def _update_interest(self, pipe: _Pipe):
+        """根据待发送数据调整关注的事件，实现背压"""
+        events = selectors.EVENT_WRITE if pipe.to_sock else 0
+        if not pipe.to_chan:
+            events |= selectors.EVENT_READ
+        if events != pipe.sock_events:
+            if pipe.sock_events and events:
+                self._selector.modify(pipe.sock, events, ("sock", pipe))
+            elif events:
+                self._selector.register(pipe.sock, events, ("sock", pipe))
+            else:
+                self._selector.unregister(pipe.sock)
+            pipe.sock_events = events
+        
+        want_chan = not pipe.to_sock
+        if want_chan != pipe.chan_registered:
+            if want_chan:
+                self._selector.register(pipe.chan, selectors.EVENT_READ, ("chan", pipe))
+            else:
+                self._selector.unregister(pipe.chan)
+            pipe.chan_registered = want_chan
+    
+    def _on_sock_event(self, pipe: _Pipe, events: int):
+        if events & selectors.EVENT_WRITE and pipe.to_sock:
+            try:
+                sent = pipe.sock.send(pipe.to_sock)
+                pipe.to_sock = pipe.to_sock[sent:]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._close_pipe(pipe)
+                return
+        if events & selectors.EVENT_READ and not pipe.to_chan:
+            try:
+                n = pipe.sock.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                n = -1
+            except OSError:
+                n = 0
+            if n == 0:
+                self._close_pipe(pipe)
+                return
+            if n > 0:
+                pipe.tunnel.stats.bytes_out += n
+                data = self._view[:n]
+                sent = self._send_chan(pipe, data)
+                if sent < 0:
+                    self._close_pipe(pipe)
+                    return
+                if sent < n:
+                    pipe.to_chan = bytes(data[sent:])
+                    self._backlogged[pipe.sock] = pipe
+        self._update_interest(pipe)
+    
+    def _on_chan_readable(self, pipe: _Pipe):
+        try:
+            data = pipe.chan.recv(BUFFER_SIZE)
+        except socket.timeout:
+            return
+        except Exception:
+            data = b""
+        if not data:
+            self._close_pipe(pipe)
+            return
+        pipe.tunnel.stats.bytes_in += len(data)
+        try:
+            sent = pipe.sock.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._close_pipe(pipe)
+            return
+        if sent < len(data):
+            pipe.to_sock = data[sent:]
+            self._update_interest(pipe)
+    
+    @staticmethod
+    def _send_chan(pipe: _Pipe, data) -> int:
+        """非阻塞写channel（直到窗口用尽），返回已写字节数，连接已断开返回-1"""
+        total = 0
+        while total < len(data):
+            if pipe.chan.closed:
+                return -1
+            if not pipe.chan.send_ready():
+                break
+            try:
+                sent = pipe.chan.send(data[total:])
+            except socket.timeout:
+                break
+            except Exception:
+                return -1
+            if sent == 0:
+                return -1
+            total += sent
+        return total
+    
+    def _flush_to_chan(self, pipe: _Pipe):
+        sent = self._send_chan(pipe, pipe.to_chan)
+        if sent < 0:
+            self._close_pipe(pipe)
+            return
+        pipe.to_chan = pipe.to_chan[sent:]
+        if not pipe.to_chan:
+            del self._backlogged[pipe.sock]
+            self._update_interest(pipe)
+    
+    def _close_pipe(self, pipe: _Pipe):
+        if self._pipes.pop(pipe.sock, None) is None:
+            return
+        self._backlogged.pop(pipe.sock, None)
+        pipe.tunnel.stats.active -= 1
+        for fileobj, registered in ((pipe.sock, pipe.sock_events), (pipe.chan, pipe.chan_registered)):
+            if registered:
+                try:
+                    self._selector.unregister(fileobj)
+                except (KeyError, ValueError):
+                    pass
+        try:
+            pipe.sock.close()
+        except OSError:
+            pass
+        try:
+            pipe.chan.close()
+        except Exception:
+            pass
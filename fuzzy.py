@@ -0,0 +1,196 @@
+"""模糊匹配索引
+
+为每条记录预先计算小写文本与字符位图，查询时先用位图快速排除不可能匹配的记录，
+再做子串/子序列打分。输入逐字增加时只在上一次的结果中继续筛选。
+"""
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_BOUNDARY = " \x00-_./@:"
+
+
+def _char_mask(text: str) -> int:
+    mask = 0
+    for ch in set(text):
+        mask |= 1 << (ord(ch) & 63)
+    return mask
+
+
+def parse_query(query: str) -> Tuple[List[str], List[str]]:
+    """拆分查询，返回 (模糊匹配词, 标签)；以 # 开头的词按标签前缀过滤"""
+    terms, tags = [], []
+    for token in query.lower().split():
+        if token.startswith('#'):
+            if len(token) > 1:
+                tags.append(token[1:])
+        else:
+            terms.append(token)
+    return terms, tags
+
+
+def _substring_score(text: str, pos: int) -> int:
+    score = 200 - min(pos, 100)
+    if pos == 0 or text[pos - 1] in _BOUNDARY:
+        score += 100
+    return score
+
+
+def _subsequence_score(text: str, term: str) -> Optional[int]:
+    pos = first = prev = -1
+    gaps = 0
+    for ch in term:
+        pos = text.find(ch, pos + 1)
+        if pos < 0:
+            return None
+        if first < 0:
+            first = pos
+        elif pos != prev + 1:
+            gaps += 1
+        prev = pos
+    return max(1, 100 - gaps * 10 - (prev - first + 1 - len(term)))
+
+
+def score_term(text: str, term: str) -> Optional[int]:
+    """单个词的匹配分数，不匹配返回None
+    
+    连续子串优先（出现在词首加分），否则按子序列匹配，间隔越多分数越低。
+    """
+    pos = text.find(term)
+    if pos >= 0:
+        return _substring_score(text, pos)
+    return _subsequence_score(text, term)
+
+
+class _Entry:
+    __slots__ = ("text", "mask", "tags")
+    
+    def __init__(self, text: str, tags: Sequence[str]):
+        self.text = text
+        self.mask = _char_mask(text)
+        self.tags = tuple(t.lower() for t in tags)
+
+
+class FuzzyIndex:
+    """按键值保存的模糊匹配索引（线程安全）"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._version = 0
+        # 上一次查询的缓存：(索引版本, 查询, 匹配到的记录)
+        self._last: Tuple[int, str, List[Tuple[str, _Entry]]] = (-1, "", [])
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def set(self, key: str, fields: Sequence[str], tags: Sequence[str] = ()):
+        """添加或更新一条记录，fields为参与匹配的文本"""
+        entry = _Entry("\x00".join(f.lower() for f in fields if f), tags)
+        with self._lock:
+            self._entries[key] = entry
+            self._version += 1
+    
+    def remove(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._version += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+    
+    def rebuild(self, items: Iterable[Tuple[str, Sequence[str], Sequence[str]]]):
+        """用 (key, fields, tags) 序列整体重建索引"""
+        entries = {key: _Entry("\x00".join(f.lower() for f in fields if f), tags)
+                   for key, fields, tags in items}
+        with self._lock:
+            self._entries = entries
+            self._version += 1
+    
+    def score(self, key: str, query: str) -> Optional[int]:
+        """单条记录对查询的分数，不匹配或不存在时返回None"""
+        terms, tags = parse_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return self._score_entry(entry, terms, tags, self._query_mask(terms))
+    
+    def search(self, query: str) -> Dict[str, int]:
+        """返回 {键: 分数}，按记录加入索引的顺序排列；空查询匹配全部记录（分数为0）"""
+        terms, tags = parse_query(query)
+        with self._lock:
+            if not terms and not tags:
+                return dict.fromkeys(self._entries, 0)
+            version, last_query, last_matches = self._last
+            if version == self._version and last_query and query.startswith(last_query):
+                # 查询只是在上一次基础上追加了字符，结果必然是上次结果的子集
+                candidates = last_matches
+            else:
+                candidates = list(self._entries.items())
+            version = self._version
+        
+        # 热路径，逐条内联打分以减少函数调用
+        query_mask = self._query_mask(terms)
+        results = {}
+        matches = []
+        for key, entry in candidates:
+            if query_mask & ~entry.mask:
+                continue
+            if tags and not all(any(t.startswith(tag) for t in entry.tags) for tag in tags):
+                continue
+            text = entry.text
+            total = 0
+            for term in terms:
+                pos = text.find(term)
+                if pos >= 0:
+                    total += _substring_score(text, pos)
+                    continue
+                score = _subsequence_score(text, term)
+                if score is None:
+                    break
+                total += score
+            else:
+                results[key] = total
+                matches.append((key, entry))
+        
+        with self._lock:
+            if version == self._version:
+                self._last = (version, query, matches)
+        return results
+    
+    def iter_matches(self, query: str, keys: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """按给定顺序逐条匹配，产出 (键, 分数)
+        
+        调用方可以在任意位置暂停，用于分时间片匹配；不存在的键会被跳过。
+        """
+        terms, tags = parse_query(query)
+        query_mask = self._query_mask(terms)
+        entries = self._entries
+        for key in keys:
+            entry = entries.get(key)
+            if entry is None:
+                continue
+            score = self._score_entry(entry, terms, tags, query_mask)
+            if score is not None:
+                yield key, score
+    
+    @staticmethod
+    def _query_mask(terms: List[str]) -> int:
+        return _char_mask("".join(terms))
+    
+    @staticmethod
+    def _score_entry(entry: _Entry, terms: List[str], tags: List[str], query_mask: int) -> Optional[int]:
+        if query_mask & ~entry.mask:
+            return None
+        for tag in tags:
+            if not any(t.startswith(tag) for t in entry.tags):
+                return None
+        total = 0
+        for term in terms:
+            score = score_term(entry.text, term)
+            if score is None:
+                return None
+            total += score
+        return total
@@ -0,0 +1,148 @@
+"""服务器使用记录（连接次数、最近使用时间与frecency得分）
+
+每次连接（包括恢复会话时的每个标签页）都会更新记录，写盘由后台线程合并延迟完成，
+不在界面线程上做文件IO。
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+HISTORY_FILE = "history.json"
+FRECENCY_HALF_LIFE = 3 * 24 * 3600  # frecency得分的半衰期（秒）
+SAVE_DELAY = 1.0  # 最后一次修改后多久写盘（秒）
+
+
+class _HistoryWriter:
+    """单一的写盘线程，修改停止 delay 秒后只写最新的一份内容"""
+    
+    def __init__(self, path: str, delay: float = SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # 保证后取到的内容后写入
+        self._pending: Optional[str] = None
+        self._due = 0.0
+        self._thread: Optional[threading.Thread] = None
+    
+    def submit(self, text: str):
+        with self._cond:
+            self._pending = text
+            self._due = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+    
+    def flush(self):
+        """立即写入尚未保存的内容（退出前调用）"""
+        with self._write_lock:
+            with self._cond:
+                text, self._pending = self._pending, None
+            if text is not None:
+                self._write(text)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None or time.monotonic() < self._due:
+                    self._cond.wait(None if self._pending is None else self._due - time.monotonic())
+            with self._write_lock:
+                with self._cond:
+                    text, self._pending = self._pending, None
+                if text is not None:
+                    self._write(text)
+    
+    def _write(self, text: str):
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"保存使用记录失败: {e}")
+
+
+class UsageHistory:
+    """记录每台服务器的连接次数与最近连接时间，保存在 history.json"""
+    
+    def __init__(self):
+        self.path = os.path.join(os.path.dirname(__file__), HISTORY_FILE)
+        self._lock = threading.Lock()
+        self._records: Dict[str, dict] = {}
+        self._writer = _HistoryWriter(self.path)
+        self.load()
+    
+    def load(self):
+        """从文件加载使用记录"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._records = json.load(f)
+            except Exception as e:
+                print(f"加载使用记录失败: {e}")
+                self._records = {}
+    
+    def save(self):
+        """保存使用记录（交给写盘线程，稍后写入）"""
+        with self._lock:
+            data = json.dumps(self._records, ensure_ascii=False)
+        self._writer.submit(data)
+    
+    def flush(self):
+        """立即写入尚未保存的记录（退出前调用）"""
+        self._writer.flush()
+    
+    def record_connect(self, server_id: str):
+        """记录一次连接"""
+        now = time.time()
+        with self._lock:
+            record = self._records.setdefault(server_id, {"count": 0, "last": 0})
+            # 得分按时间指数衰减后加1，只需保存最近一次的得分与时间
+            record["score"] = self._decayed_score(record, now) + 1.0
+            record["count"] += 1
+            record["last"] = now
+        self.save()
+    
+    def forget(self, server_id: str):
+        """删除服务器的使用记录"""
+        with self._lock:
+            self._records.pop(server_id, None)
+        self.save()
+    
+    def get(self, server_id: str) -> dict:
+        with self._lock:
+            return dict(self._records.get(server_id, {"count": 0, "last": 0}))
+    
+    @staticmethod
+    def _decayed_score(record: dict, now: float) -> float:
+        last = record.get("last", 0)
+        if not last:
+            return 0.0
+        # 旧版记录没有score，用连接次数近似
+        score = record.get("score", float(record.get("count", 0)))
+        return score * 0.5 ** (max(0.0, now - last) / FRECENCY_HALF_LIFE)
+    
+    def frecency(self, server_id: str) -> float:
+        """综合使用频率与最近使用时间的得分"""
+        with self._lock:
+            record = self._records.get(server_id)
+            return self._decayed_score(record, time.time()) if record else 0.0
+    
+    def frecency_all(self) -> Dict[str, float]:
+        """所有服务器当前的frecency得分"""
+        now = time.time()
+        with self._lock:
+            return {server_id: self._decayed_score(record, now) for server_id, record in self._records.items()}
+    
+    def most_used(self, limit: int) -> List[str]:
+        """连接次数最多的服务器ID（次数相同按最近使用排序）"""
+        with self._lock:
+            items = list(self._records.items())
+        items.sort(key=lambda kv: (kv[1].get("count", 0), kv[1].get("last", 0)), reverse=True)
+        return [server_id for server_id, _ in items[:limit]]
+
+
+# 创建全局使用记录实例
+usage_history = UsageHistory()
@@ -0,0 +1,474 @@
+"""批量导入服务器：OpenSSH配置、CSV、Ansible清单（INI/YAML）以及本程序导出的JSON
+
+解析器逐条产出 ServerConfig，build_plan 按 (主机, 端口, 用户名) 与现有服务器去重，
+生成新增/更新/未变化的预览结果，确认后由 apply_plan 在一个事务中写入。
+"""
+import csv
+import fnmatch
+import getpass
+import glob
+import json
+import os
+import re
+import shlex
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import ServerConfig, config_manager
+from vault import vault
+
+Endpoint = Tuple[str, int, str]
+
+FORMATS = {
+    "ssh_config": "OpenSSH 配置",
+    "csv": "CSV",
+    "ansible_ini": "Ansible 清单 (INI)",
+    "ansible_yaml": "Ansible 清单 (YAML)",
+    "json": "JSON",
+}
+
+
+def _split_args(text: str) -> List[str]:
+    """按空白拆分参数，只有含引号时才用较慢的shlex"""
+    if '"' not in text and "'" not in text:
+        return text.split()
+    try:
+        return shlex.split(text)
+    except ValueError:
+        return text.split()
+
+
+def _default_user() -> str:
+    try:
+        return getpass.getuser()
+    except Exception:
+        return ""
+
+
+def detect_format(path: str) -> str:
+    """根据文件名判断格式"""
+    name = os.path.basename(path).lower()
+    ext = os.path.splitext(name)[1]
+    if ext == ".csv":
+        return "csv"
+    if ext in (".yml", ".yaml"):
+        return "ansible_yaml"
+    if ext == ".json":
+        return "json"
+    if ext in (".ini", ".cfg") or name in ("hosts", "inventory"):
+        return "ansible_ini"
+    return "ssh_config"
+
+
+def parse_file(path: str, fmt: str = None) -> Iterator[ServerConfig]:
+    """按格式逐条解析文件中的服务器"""
+    fmt = fmt or detect_format(path)
+    if fmt == "ssh_config":
+        return parse_ssh_config(path)
+    if fmt == "csv":
+        return parse_csv(path)
+    if fmt == "ansible_ini":
+        return parse_ansible_ini(path)
+    if fmt == "ansible_yaml":
+        return parse_ansible_yaml(path)
+    if fmt == "json":
+        return parse_json(path)
+    raise ValueError(f"不支持的格式: {fmt}")
+
+
+# ---- OpenSSH ~/.ssh/config ----
+
+_SSH_KEYS = {"hostname", "port", "user", "identityfile", "proxyjump"}
+
+
+def _ssh_config_lines(path: str, depth: int = 0) -> Iterator[Tuple[str, List[str]]]:
+    """逐行产出 (关键字, 参数)，展开 Include"""
+    with open(os.path.expanduser(path), 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            # 支持 "Key Value" 与 "Key=Value" 两种写法
+            match = re.match(r'^(\S+?)\s*(?:=\s*|\s+)(.*)$', line)
+            if not match:
+                continue
+            key, value = match.group(1).lower(), match.group(2)
+            args = _split_args(value)
+            if key == "include" and depth < 8:
+                for pattern in args:
+                    pattern = os.path.expanduser(pattern)
+                    if not os.path.isabs(pattern):
+                        pattern = os.path.join(os.path.expanduser("~/.ssh"), pattern)
+                    for included in sorted(glob.glob(pattern)):
+                        yield from _ssh_config_lines(included, depth + 1)
+                continue
+            yield key, args
+
+
+def parse_ssh_config(path: str = "~/.ssh/config") -> Iterator[ServerConfig]:
+    """解析OpenSSH配置中的 Host 块
+    
+    带通配符的 Host（如 *、*.example.com）不作为服务器导入，其选项按OpenSSH
+    "先出现者优先"的规则补全到匹配的主机上。
+    """
+    blocks: List[Tuple[List[str], Dict[str, str]]] = []
+    current: Optional[Dict[str, str]] = None
+    for key, args in _ssh_config_lines(path):
+        if key == "host":
+            current = {}
+            blocks.append((args, current))
+        elif key == "match":
+            current = None  # Match 块条件复杂，忽略
+        elif current is not None and key in _SSH_KEYS and args and key not in current:
+            current[key] = " ".join(args) if key == "proxyjump" else args[0]
+    
+    # 字面主机名 -> 出现在哪些块中；带通配符的块单独保存，数量通常很少
+    literal_blocks: Dict[str, List[int]] = {}
+    wildcard_blocks: List[int] = []
+    for i, (patterns, _) in enumerate(blocks):
+        if any(c in p for p in patterns for c in "*?!"):
+            wildcard_blocks.append(i)
+        for pattern in patterns:
+            if not any(c in pattern for c in "*?!"):
+                literal_blocks.setdefault(pattern, []).append(i)
+    
+    default_user = _default_user()
+    for alias, indices in literal_blocks.items():
+        matched = [i for i in sorted(set(indices).union(wildcard_blocks))
+                   if _ssh_host_matches(alias, blocks[i][0])]
+        merged: Dict[str, str] = {}
+        for i in matched:
+            for k, v in blocks[i][1].items():
+                merged.setdefault(k, v)
+        try:
+            port = int(merged.get("port", 22))
+        except ValueError:
+            port = 22
+        identity = merged.get("identityfile", "")
+        proxy_jump = merged.get("proxyjump", "")
+        yield ServerConfig(
+            name=alias,
+            host=merged.get("hostname", alias).replace("%h", alias),
+            port=port,
+            username=merged.get("user", default_user),
+            key_file=os.path.expanduser(identity) if identity else "",
+            use_key=bool(identity),
+            proxy_jump="" if proxy_jump.lower() == "none" else proxy_jump,
+        )
+
+
+def _pattern_matches(alias: str, pattern: str) -> bool:
+    # 字面主机名直接比较，避免为每个主机名编译一次正则
+    if "*" in pattern or "?" in pattern:
+        return fnmatch.fnmatchcase(alias, pattern)
+    return alias == pattern
+
+
+def _ssh_host_matches(alias: str, patterns: List[str]) -> bool:
+    matched = False
+    for pattern in patterns:
+        if pattern.startswith("!"):
+            if _pattern_matches(alias, pattern[1:]):
+                return False
+        elif _pattern_matches(alias, pattern):
+            matched = True
+    return matched
+
+
+# ---- CSV ----
+
+_CSV_COLUMNS = {
+    "name": "name", "名称": "name",
+    "host": "host", "hostname": "host", "address": "host", "ip": "host", "主机": "host",
+    "port": "port", "端口": "port",
+    "user": "username", "username": "username", "用户名": "username",
+    "password": "password", "密码": "password",
+    "description": "description", "描述": "description",
+    "key_file": "key_file", "identityfile": "key_file", "identity_file": "key_file", "密钥": "key_file",
+    "proxy_jump": "proxy_jump", "proxyjump": "proxy_jump", "跳板机": "proxy_jump",
+    "group": "group", "分组": "group",
+    "tags": "tags", "标签": "tags",
+}
+
+
+def parse_csv(path: str) -> Iterator[ServerConfig]:
+    """解析带表头的CSV，至少需要 host 列；标签用 ; 或 | 分隔"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if not header:
+            return
+        columns = [_CSV_COLUMNS.get(h.strip().lower()) for h in header]
+        if "host" not in columns:
+            raise ValueError("CSV缺少 host 列")
+        for row in reader:
+            values = {}
+            for column, value in zip(columns, row):
+                if column and value.strip():
+                    values[column] = value.strip()
+            if not values.get("host"):
+                continue
+            try:
+                port = int(values.get("port", 22))
+            except ValueError:
+                port = 22
+            key_file = values.get("key_file", "")
+            yield ServerConfig(
+                name=values.get("name", values["host"]),
+                host=values["host"],
+                port=port,
+                username=values.get("username", ""),
+                password=values.get("password", ""),
+                description=values.get("description", ""),
+                key_file=key_file,
+                use_key=bool(key_file),
+                proxy_jump=values.get("proxy_jump", ""),
+                group=values.get("group", ""),
+                tags=[t.strip() for t in re.split(r'[;|]', values.get("tags", "")) if t.strip()],
+            )
+
+
+# ---- Ansible ----
+
+def _expand_host_pattern(pattern: str) -> List[str]:
+    """展开 web[01:20].example.com、db-[a:c] 这样的主机范围"""
+    match = re.search(r'\[([0-9a-zA-Z]+):([0-9a-zA-Z]+)(?::(\d+))?\]', pattern)
+    if not match:
+        return [pattern]
+    start, end, step = match.group(1), match.group(2), int(match.group(3) or 1)
+    prefix, suffix = pattern[:match.start()], pattern[match.end():]
+    if start.isdigit() and end.isdigit():
+        width = len(start) if start.startswith("0") else 0
+        values = [str(i).zfill(width) for i in range(int(start), int(end) + 1, step)]
+    else:
+        values = [chr(i) for i in range(ord(start), ord(end) + 1, step)]
+    return [h for v in values for h in _expand_host_pattern(prefix + v + suffix)]
+
+
+def _ansible_server(alias: str, host_vars: dict, group: str, tags: List[str], default_user: str) -> ServerConfig:
+    def var(*names, default=""):
+        for name in names:
+            if host_vars.get(name) not in (None, ""):
+                return str(host_vars[name])
+        return default
+    
+    try:
+        port = int(var("ansible_port", "ansible_ssh_port", default="22"))
+    except ValueError:
+        port = 22
+    key_file = var("ansible_ssh_private_key_file", "ansible_private_key_file")
+    proxy_jump = ""
+    common_args = var("ansible_ssh_common_args")
+    jump_match = re.search(r'(?:-J\s*|ProxyJump=)(\S+)', common_args)
+    if jump_match:
+        proxy_jump = jump_match.group(1).strip("'\"")
+    return ServerConfig(
+        name=alias,
+        host=var("ansible_host", "ansible_ssh_host", default=alias),
+        port=port,
+        username=var("ansible_user", "ansible_ssh_user", "remote_user", default=default_user),
+        password=var("ansible_password", "ansible_ssh_pass"),
+        key_file=os.path.expanduser(key_file) if key_file else "",
+        use_key=bool(key_file),
+        proxy_jump=proxy_jump,
+        group="" if group in ("all", "ungrouped") else group,
+        tags=[t for t in tags if t not in ("all", "ungrouped")],
+    )
+
+
+def _parse_ini_vars(tokens: List[str]) -> dict:
+    result = {}
+    for token in tokens:
+        if "=" in token:
+            key, value = token.split("=", 1)
+            result[key] = value
+    return result
+
+
+def parse_ansible_ini(path: str) -> Iterator[ServerConfig]:
+    """解析INI格式的Ansible清单
+    
+    主机所属的第一个组作为分组，所有组（含父组）作为标签；组变量按
+    父组 -> 子组 -> 主机变量的顺序覆盖。组变量可能写在文件末尾，
+    因此这里只缓存主机名与行内变量，读完后再逐条产出。
+    """
+    hosts: Dict[str, dict] = {}  # 主机 -> 行内变量
+    host_groups: Dict[str, List[str]] = {}
+    group_vars: Dict[str, dict] = {}
+    children: Dict[str, List[str]] = {}
+    section, kind = "ungrouped", "hosts"
+    
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                name = line[1:-1].strip()
+                section, _, kind = name.partition(":")
+                kind = kind or "hosts"
+                continue
+            tokens = _split_args(line.split(" #", 1)[0] if "#" in line else line)
+            if not tokens:
+                continue
+            if kind == "hosts":
+                for host in _expand_host_pattern(tokens[0]):
+                    hosts.setdefault(host, {}).update(_parse_ini_vars(tokens[1:]))
+                    host_groups.setdefault(host, [])
+                    if section not in host_groups[host]:
+                        host_groups[host].append(section)
+            elif kind == "vars":
+                group_vars.setdefault(section, {}).update(_parse_ini_vars(tokens))
+            elif kind == "children":
+                children.setdefault(section, []).append(tokens[0])
+    
+    parents: Dict[str, List[str]] = {}
+    for parent, kids in children.items():
+        for kid in kids:
+            parents.setdefault(kid, []).append(parent)
+    
+    def ancestry(group: str, seen=None) -> List[str]:
+        # 父组在前，便于子组变量覆盖父组
+        seen = seen if seen is not None else set()
+        if group in seen:
+            return []
+        seen.add(group)
+        result = []
+        for parent in parents.get(group, []):
+            result.extend(g for g in ancestry(parent, seen) if g not in result)
+        return result + [group]
+    
+    default_user = _default_user()
+    base_vars = group_vars.get("all", {})
+    for host, inline_vars in hosts.items():
+        groups = []
+        for group in host_groups[host]:
+            groups.extend(g for g in ancestry(group) if g not in groups)
+        merged = dict(base_vars)
+        for group in groups:
+            merged.update(group_vars.get(group, {}))
+        merged.update(inline_vars)
+        primary = host_groups[host][0] if host_groups[host] else ""
+        yield _ansible_server(host, merged, primary, groups, default_user)
+
+
+def parse_ansible_yaml(path: str) -> Iterator[ServerConfig]:
+    """解析YAML格式的Ansible清单（需要 PyYAML）"""
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("导入YAML清单需要安装 PyYAML: pip install pyyaml")
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        # 有libyaml时使用C实现的解析器，大清单快一个数量级
+        data = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    if not isinstance(data, dict):
+        raise ValueError("无效的Ansible YAML清单")
+    
+    default_user = _default_user()
+    seen = set()
+    
+    def walk(name: str, node: dict, inherited_vars: dict, lineage: List[str]) -> Iterator[ServerConfig]:
+        node = node or {}
+        group_vars = dict(inherited_vars)
+        group_vars.update(node.get("vars") or {})
+        lineage = lineage + [name]
+        for pattern, host_vars in (node.get("hosts") or {}).items():
+            for host in _expand_host_pattern(str(pattern)):
+                if host in seen:
+                    continue
+                seen.add(host)
+                merged = dict(group_vars)
+                merged.update(host_vars or {})
+                yield _ansible_server(host, merged, name, lineage, default_user)
+        for child, child_node in (node.get("children") or {}).items():
+            yield from walk(str(child), child_node, group_vars, lineage)
+    
+    for name, node in data.items():
+        yield from walk(str(name), node, {}, [])
+
+
+# ---- JSON（本程序导出的格式） ----
+
+def parse_json(path: str) -> Iterator[ServerConfig]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError("JSON文件应为服务器列表")
+    for item in data:
+        yield ServerConfig.from_dict(item)
+
+
+# ---- 去重与预览 ----
+
+@dataclass
+class ImportPlan:
+    """导入预览：新增、更新（旧, 新）与未变化的数量"""
+    added: List[ServerConfig] = field(default_factory=list)
+    updated: List[Tuple[ServerConfig, ServerConfig]] = field(default_factory=list)
+    unchanged: int = 0
+    duplicates: int = 0  # 导入文件内部重复的条目
+    
+    @property
+    def total(self) -> int:
+        return len(self.added) + len(self.updated) + self.unchanged + self.duplicates
+    
+    def changes(self) -> List[ServerConfig]:
+        return self.added + [new for _, new in self.updated]
+
+
+def _merge(existing: ServerConfig, incoming: ServerConfig) -> ServerConfig:
+    """用导入的非空字段更新已有服务器，保留ID、密码等导入文件中没有的信息"""
+    updates = {}
+    for name in ("name", "description", "key_file", "proxy_jump", "group"):
+        value = getattr(incoming, name)
+        if value and value != getattr(existing, name):
+            updates[name] = value
+    if incoming.password and not vault.same_secret(existing.password, incoming.password):
+        updates["password"] = incoming.password
+    if incoming.key_file and not existing.use_key:
+        updates["use_key"] = True
+    if incoming.tags:
+        tags = list(dict.fromkeys(existing.tags + incoming.tags))
+        if tags != existing.tags:
+            updates["tags"] = tags
+    return replace(existing, **updates) if updates else existing
+
+
+def build_plan(records: Iterable[ServerConfig], existing: Dict[Endpoint, ServerConfig] = None) -> ImportPlan:
+    """按 (主机, 端口, 用户名) 去重，生成导入预览（不修改数据）"""
+    if existing is None:
+        existing = config_manager.endpoint_index()
+    existing_ids = {s.id for s in existing.values()}
+    plan = ImportPlan()
+    seen = set()  # 本次导入中已出现的端点，重复的以第一条为准
+    for record in records:
+        key = (record.host, record.port, record.username)
+        if key in seen:
+            plan.duplicates += 1
+            continue
+        seen.add(key)
+        current = existing.get(key)
+        if current is None:
+            if record.id in existing_ids:
+                # 本程序导出的JSON中端点已改变的服务器，作为新服务器导入
+                record = replace(record, id=ServerConfig().id)
+            plan.added.append(record)
+            continue
+        merged = _merge(current, record)
+        if merged is current:
+            plan.unchanged += 1
+        else:
+            plan.updated.append((current, merged))
+    return plan
+
+
+def apply_plan(plan: ImportPlan) -> int:
+    """在一个事务中写入预览中的全部变化，返回写入数量"""
+    return config_manager.upsert_servers(plan.changes())
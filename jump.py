@@ -0,0 +1,136 @@
+"""跳板机（ProxyJump）链式连接
+
+每条跳板链（按顺序的各跳 host/port/username）只建立一次认证好的传输层，
+同一跳板后的所有目标通过 direct-tcpip channel 复用它，引用计数归零后才关闭。
+多跳时前缀链同样共享，例如 A->B->C 与 A->B->D 共用 A 与 A->B 两段。
+"""
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import paramiko
+
+from config import ServerConfig
+
+MAX_HOPS = 8
+
+ChainKey = Tuple[Tuple[str, int, str], ...]
+
+
+def parse_jump_spec(text: str) -> Tuple[str, str, int]:
+    """解析 [user@]host[:port]，返回 (username, host, port)，username可能为空"""
+    match = re.match(r'^(?:([^@]+)@)?(\[[^\]]+\]|[^:]+)(?::(\d+))?$', text.strip())
+    if not match:
+        raise ValueError(f"无效的跳板机: {text}")
+    username, host, port = match.groups()
+    return username or "", host.strip('[]'), int(port) if port else 22
+
+
+def chain_key(hops: List[ServerConfig]) -> ChainKey:
+    return tuple((h.host, h.port, h.username) for h in hops)
+
+
+class _ChainEntry:
+    def __init__(self):
+        self.lock = threading.Lock()  # 串行化同一条链的建立过程
+        self.client: Optional[paramiko.SSHClient] = None
+        self.parent: Optional[ChainKey] = None  # 上一段链（多跳时）
+        self.refs = 0
+    
+    def is_active(self) -> bool:
+        if self.client is None:
+            return False
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+class JumpHostPool:
+    """共享的跳板机传输层池"""
+    
+    def __init__(self, connector: Callable[[ServerConfig, Optional[paramiko.Channel]], paramiko.SSHClient]):
+        # connector(server, sock) 负责认证并返回已连接的 paramiko.SSHClient
+        self._connector = connector
+        self._lock = threading.Lock()
+        self._entries: Dict[ChainKey, _ChainEntry] = {}
+    
+    def open_channel(self, hops: List[ServerConfig], host: str, port: int) -> Tuple[paramiko.Channel, ChainKey]:
+        """经由跳板链打开到 host:port 的 direct-tcpip channel，调用方用完后需 release(key)"""
+        if not hops or len(hops) > MAX_HOPS:
+            raise ValueError(f"跳板机数量应为 1-{MAX_HOPS} 个")
+        key = chain_key(hops)
+        entry = self._acquire(hops)
+        try:
+            try:
+                channel = entry.client.get_transport().open_channel(
+                    "direct-tcpip", (host, port), ("127.0.0.1", 0), timeout=10
+                )
+            except (paramiko.SSHException, EOFError, OSError):
+                # 共享传输层可能刚好断开，重建一次再试；传输层仍然正常时
+                # 是跳板机拒绝了这个目标（或目标不可达），重试也没有用
+                if entry.is_active():
+                    raise
+                with entry.lock:
+                    if not entry.is_active():
+                        self._connect_entry(entry, hops)
+                channel = entry.client.get_transport().open_channel(
+                    "direct-tcpip", (host, port), ("127.0.0.1", 0), timeout=10
+                )
+        except Exception:
+            self.release(key)
+            raise
+        return channel, key
+    
+    def release(self, key: ChainKey):
+        """释放对一条跳板链的引用，最后一个引用释放时关闭传输层"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            del self._entries[key]
+        if entry.client:
+            entry.client.close()
+        if entry.parent:
+            self.release(entry.parent)
+    
+    def active_chains(self) -> Dict[ChainKey, int]:
+        """当前共享中的跳板链及其引用数"""
+        with self._lock:
+            return {k: e.refs for k, e in self._entries.items()}
+    
+    def _acquire(self, hops: List[ServerConfig]) -> _ChainEntry:
+        key = chain_key(hops)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _ChainEntry()
+                self._entries[key] = entry
+            entry.refs += 1
+        try:
+            with entry.lock:
+                if not entry.is_active():
+                    self._connect_entry(entry, hops)
+        except Exception:
+            self.release(key)
+            raise
+        return entry
+    
+    def _connect_entry(self, entry: _ChainEntry, hops: List[ServerConfig]):
+        """建立（或重建）链上最后一跳的认证传输层"""
+        hop = hops[-1]
+        if entry.client:
+            entry.client.close()
+            entry.client = None
+        sock = None
+        if len(hops) > 1:
+            # 经由上一段链打开到本跳的channel（前缀链共享，必要时自动重建）
+            old_parent = entry.parent
+            sock, entry.parent = self.open_channel(hops[:-1], hop.host, hop.port)
+            if old_parent:
+                self.release(old_parent)
+        try:
+            entry.client = self._connector(hop, sock)
+        except Exception as e:
+            raise paramiko.SSHException(f"跳板机 {hop.host}:{hop.port} 连接失败: {e}") from e
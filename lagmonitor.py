@@ -0,0 +1,165 @@
+"""界面卡顿检测（可在设置中开启）
+
+界面线程上的阻塞调用（同步的SFTP请求、大量删除、背景处理等）很容易写进去却很难察觉。
+开启后用一个心跳定时器测量事件循环的延迟；心跳超过阈值没有到来时，
+由旁路线程抓取界面线程当前的Python调用栈，卡顿结束后按调用位置（本项目代码中
+最内层的一帧）汇总次数与耗时，卡顿的原因可以直接定位到具体的函数和行。
+"""
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from telemetry import Histogram
+
+HEARTBEAT_INTERVAL = 50  # 心跳间隔（毫秒）
+STALL_THRESHOLD = 0.2  # 心跳迟到超过这么久视为卡顿（秒）
+SAMPLE_INTERVAL = 0.1  # 卡顿期间抓取调用栈的间隔（秒）
+MAX_STACK_DEPTH = 40
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _site_of(stack: traceback.StackSummary) -> str:
+    """调用位置：本项目代码中最内层的一帧（都不在项目中时取最内层的一帧）"""
+    for frame in reversed(stack):
+        if os.path.abspath(frame.filename).startswith(PROJECT_DIR + os.sep):
+            return f"{os.path.relpath(frame.filename, PROJECT_DIR)}:{frame.lineno} {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} {frame.name}"
+
+
+class StallSite:
+    """同一调用位置的卡顿汇总"""
+    
+    def __init__(self, site: str, innermost: str, stack: List[str]):
+        self.site = site
+        self.innermost = innermost  # 实际阻塞的位置（可能在第三方库中）
+        self.stack = stack
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen = 0.0
+    
+    def to_dict(self) -> dict:
+        return {
+            "site": self.site,
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "max_ms": self.max_ms,
+            "innermost": self.innermost,
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+class LagMonitor(QObject):
+    """事件循环延迟监测与卡顿调用栈采集"""
+    
+    stallDetected = pyqtSignal(float, str)  # 卡顿时长（毫秒）, 调用位置
+    
+    def __init__(self, threshold: float = STALL_THRESHOLD, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.lag = Histogram()
+        self.sites: Dict[str, StallSite] = {}
+        self.stall_count = 0
+        self._timer: Optional[QTimer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = 0.0
+        self._samples: List[traceback.StackSummary] = []  # 本次卡顿期间抓取的调用栈
+        self._main_thread_id = threading.main_thread().ident
+    
+    @property
+    def running(self) -> bool:
+        return self._timer is not None and self._timer.isActive()
+    
+    def start(self):
+        """在界面线程中调用"""
+        if self.running:
+            return
+        if self._timer is None:
+            self._timer = QTimer(self)
+            self._timer.setInterval(HEARTBEAT_INTERVAL)
+            self._timer.timeout.connect(self._beat)
+        self._last_beat = time.monotonic()
+        self._timer.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, name="lag-monitor", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+    
+    def _beat(self):
+        now = time.monotonic()
+        elapsed = now - self._last_beat
+        self._last_beat = now
+        self.lag.record(max(0.0, elapsed * 1000 - HEARTBEAT_INTERVAL))
+        with self._lock:
+            samples, self._samples = self._samples, []
+        if samples:
+            self._record_stall(elapsed * 1000, samples)
+    
+    def _monitor(self):
+        """旁路线程：心跳迟到超过阈值时抓取界面线程的调用栈"""
+        while not self._stop.wait(SAMPLE_INTERVAL / 2):
+            if time.monotonic() - self._last_beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._main_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=MAX_STACK_DEPTH)
+            del frame
+            with self._lock:
+                self._samples.append(stack)
+            self._stop.wait(SAMPLE_INTERVAL / 2)
+    
+    def _record_stall(self, duration_ms: float, samples: List[traceback.StackSummary]):
+        """卡顿结束：归到采样中出现最多的调用位置"""
+        sites = [_site_of(stack) for stack in samples]
+        site = Counter(sites).most_common(1)[0][0]
+        stack = samples[sites.index(site)]
+        entry = self.sites.get(site)
+        if entry is None:
+            innermost = f"{stack[-1].filename}:{stack[-1].lineno} {stack[-1].name}"
+            entry = self.sites[site] = StallSite(site, innermost, traceback.format_list(stack))
+        entry.count += 1
+        entry.total_ms += duration_ms
+        entry.max_ms = max(entry.max_ms, duration_ms)
+        entry.last_seen = time.time()
+        self.stall_count += 1
+        print(f"界面卡顿 {duration_ms:.0f} ms：{site}")
+        self.stallDetected.emit(duration_ms, site)
+    
+    def report(self) -> dict:
+        """事件循环延迟分布与按调用位置汇总的卡顿（按总耗时排序）"""
+        sites = sorted(self.sites.values(), key=lambda s: s.total_ms, reverse=True)
+        return {
+            "heartbeat_ms": HEARTBEAT_INTERVAL,
+            "threshold_ms": self.threshold * 1000,
+            "lag": self.lag.to_dict(),
+            "stalls": self.stall_count,
+            "sites": [site.to_dict() for site in sites],
+        }
+    
+    def reset(self):
+        self.lag = Histogram()
+        self.sites.clear()
+        self.stall_count = 0
+
+
+# 全局卡顿检测（由设置开启）
+lag_monitor = LagMonitor()
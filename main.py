@@ -1,23 +1,35 @@
-"""SSH终端管理器 - 主程序"""
+"""SSH终端管理器 - 主程序
+
+启动时只导入显示窗口所需的模块：paramiko 与终端/SFTP模块在第一次连接时导入，
+设置页第一次打开时才创建，服务器列表、背景和上次的标签页在窗口首次绘制之后再加载。
+"""
 import sys
 import os
 import time
+import multiprocessing
 from PyQt5.QtCore import Qt, QMargins, QPoint, QTimer
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, 
-                            QHBoxLayout, QStackedWidget, QSplitter, QGraphicsBlurEffect, QLabel,
-                            QGraphicsScene, QGraphicsPixmapItem)
-from PyQt5.QtGui import QFontDatabase, QFont, QPalette, QBrush, QPixmap, QPainter, QColor, QPen, QPainterPath, QCursor, QImage
+                            QHBoxLayout, QStackedWidget, QSplitter, QLabel, QShortcut, QFileDialog)
+from PyQt5.QtGui import QFontDatabase, QFont, QPalette, QBrush, QPixmap, QPainter, QColor, QPen, QPainterPath, QCursor, QImage, QKeySequence
 from qfluentwidgets import (NavigationInterface, NavigationItemPosition, 
                            setThemeColor, InfoBar, InfoBarPosition)
 from qfluentwidgets import FluentIcon as FIF
 
-from config import ServerConfig
+from config import ServerConfig, config_manager
+from history import usage_history
+from palette import CommandPalette
+from appsettings import app_settings, BACKGROUND, BLUR, WARM_POOL, RESTORE_TABS, SCROLLBACK_KB, LAG_MONITOR
+from background import BackgroundRenderer
 from servers import ServerListWidget
-from terminal import SSHTerminalInterface
-from tabs import TerminalTabWidget
-from sftp import SFTPFileInterface
-from settings import SettingInterface
 from title import CustomTitleBar
+from vault import vault
+from session import session_store
+
+
+def loaded_warm_pool():
+    """已创建的预连接池；connection模块尚未导入时返回None（此时也不可能有预连接）"""
+    connection = sys.modules.get('connection')
+    return connection.warm_pool if connection is not None else None
 
 
 class MainWindow(QMainWindow):
@@ -35,16 +47,19 @@ class MainWindow(QMainWindow):
         # 启用鼠标跟踪，以便在没有按下鼠标按钮时也能接收鼠标移动事件
         self.setMouseTracking(True)
         
-        self.terminal_manager = None
+        self.terminal_manager = None  # 第一次连接时创建
+        self.setting_interface = None  # 第一次打开设置页时创建
+        self._startup_pending = True  # 首次绘制后再加载服务器列表、背景等
         self._last_warning_time = 0
-        self._resize_timer = None
-        self._pending_bg_update = False
         
         # 创建背景标签
         self.background_label = QLabel(self)
         self.background_label.setGeometry(0, 0, 0, 0)
+        self.background_label.setAlignment(Qt.AlignCenter)
         self.background_label.lower()
         self.background_label.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.background_renderer = BackgroundRenderer(self, max_size=QApplication.primaryScreen().virtualSize())
+        self.background_renderer.frameReady.connect(self.on_background_frame)
         
         self.central_widget = QWidget()
         self.central_widget.setMouseTracking(True)
@@ -81,27 +96,106 @@ class MainWindow(QMainWindow):
         self.server_interface = ServerListWidget()
         self.server_interface.setMouseTracking(True)
         self.server_interface.connectRequested.connect(self.connect_to_server)
+        self.server_interface.serverHovered.connect(self.on_server_hovered)
         self.stack_widget.addWidget(self.server_interface)
         
-        self.terminal_manager = TerminalTabWidget()
-        self.terminal_manager.setMouseTracking(True)
-        self.terminal_manager.disconnected.connect(self.on_all_terminals_closed)
-        self.stack_widget.addWidget(self.terminal_manager)
+        self.main_layout.addWidget(self.content_widget)
         
-        self.setting_interface = SettingInterface(self)
-        self.setting_interface.setMouseTracking(True)
-        self.setting_interface.backgroundChanged.connect(self.on_background_changed)
-        self.stack_widget.addWidget(self.setting_interface)
+        # Ctrl+K 命令面板
+        self.palette = CommandPalette(self)
+        self.palette.tabs_provider = self.open_tabs
+        self.palette.serverChosen.connect(self.connect_to_server)
+        self.palette.tabChosen.connect(self.on_palette_tab_chosen)
+        self.palette.snippetChosen.connect(self.on_palette_snippet_chosen)
+        self.palette_shortcut = QShortcut(QKeySequence("Ctrl+K"), self, self.palette.popup)
+        self.palette_shortcut.setContext(Qt.ApplicationShortcut)
         
-        self.main_layout.addWidget(self.content_widget)
+        # Ctrl+Shift+P 开始/停止采样性能分析（隐藏功能）
+        self.profiler_shortcut = QShortcut(QKeySequence("Ctrl+Shift+P"), self, self.toggle_profiler)
+        self.profiler_shortcut.setContext(Qt.ApplicationShortcut)
         
         self.init_navigation()
         
         self.stack_widget.setCurrentWidget(self.server_interface)
         
-        self.load_background()
+        # 背景、预连接等设置变化（设置页或外部修改 app_config.json）时自动生效
+        app_settings.changed.connect(self.on_setting_changed)
+        app_settings.watch()
         
+        # 定期丢弃闲置的已解密密码与私钥
+        self._vault_purge_timer = QTimer(self)
+        self._vault_purge_timer.timeout.connect(vault.purge_expired)
+        self._vault_purge_timer.start(60 * 1000)
+        
+    def finish_startup(self):
+        """窗口首次绘制之后再做的启动工作"""
+        self.server_interface.load_server_list()
+        self.load_background()
+        self.restore_session()
+        self.on_warm_pool_toggled(app_settings.get(WARM_POOL))
+        self.on_lag_monitor_toggled(app_settings.get(LAG_MONITOR))
+    
+    def on_lag_monitor_toggled(self, enabled: bool):
+        """开启或关闭卡顿检测（关闭且从未开启过时不导入模块）"""
+        if enabled or 'lagmonitor' in sys.modules:
+            from lagmonitor import lag_monitor
+            if enabled:
+                lag_monitor.start()
+            else:
+                lag_monitor.stop()
+    
+    def toggle_profiler(self):
+        """开始采样，再按一次停止并保存结果（.json 为 speedscope 格式，其余为折叠栈格式）"""
+        from profiler import profiler
+        if not profiler.running:
+            profiler.start()
+            InfoBar.info("性能分析", "正在采样所有线程，再按 Ctrl+Shift+P 停止并保存", parent=self,
+                        position=InfoBarPosition.TOP, duration=3000)
+            return
+        profiler.stop()
+        name = time.strftime("profile-%Y%m%d-%H%M%S")
+        path, _ = QFileDialog.getSaveFileName(
+            self, f"保存性能分析结果（{profiler.sample_count} 次采样）", f"{name}.speedscope.json",
+            "speedscope (*.speedscope.json);;折叠栈 (*.collapsed *.txt)")
+        if not path:
+            return
+        try:
+            profiler.save(path)
+        except OSError as e:
+            InfoBar.error("错误", f"保存失败: {e}", parent=self, position=InfoBarPosition.TOP)
+            return
+        InfoBar.success("性能分析", f"已保存到 {path}", parent=self, position=InfoBarPosition.TOP)
+    
+    def ensure_terminal_manager(self):
+        """第一次需要时创建标签页管理器（同时导入paramiko与终端、SFTP模块）"""
+        if self.terminal_manager is None:
+            from tabs import TerminalTabWidget
+            self.terminal_manager = TerminalTabWidget()
+            self.terminal_manager.setMouseTracking(True)
+            self.terminal_manager.disconnected.connect(self.on_all_terminals_closed)
+            self.terminal_manager.connect_guard = self.prepare_connect
+            self.stack_widget.addWidget(self.terminal_manager)
+        return self.terminal_manager
+    
+    def ensure_setting_interface(self):
+        """第一次打开设置页时创建"""
+        if self.setting_interface is None:
+            from settings import SettingInterface
+            self.setting_interface = SettingInterface(self)
+            self.setting_interface.setMouseTracking(True)
+            self.setting_interface.serversImported.connect(self.server_interface.load_server_list)
+            self.stack_widget.addWidget(self.setting_interface)
+        return self.setting_interface
+    
+    def open_tabs(self):
+        """已打开的标签页，供命令面板使用"""
+        return self.terminal_manager.open_tabs() if self.terminal_manager else []
+    
     def paintEvent(self, event):
+        if self._startup_pending:
+            self._startup_pending = False
+            QTimer.singleShot(0, self.finish_startup)
+        
         # 创建圆角窗口
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -161,17 +255,15 @@ class MainWindow(QMainWindow):
                                position=InfoBarPosition.TOP)
                 self.navigation_interface.setCurrentItem('servers')
         elif interface_name == 'settings':
-            self.stack_widget.setCurrentWidget(self.setting_interface)
+            self.stack_widget.setCurrentWidget(self.ensure_setting_interface())
     
     def connect_to_server(self, server: ServerConfig):
         """连接到服务器 - 添加新的终端标签页"""
-        if not self.terminal_manager:
-            InfoBar.error("错误", "终端管理器未初始化", parent=self,
-                         position=InfoBarPosition.TOP)
+        if not self.prepare_connect(server):
             return
         
         # 添加新的终端标签页（异步连接）
-        tab_id = self.terminal_manager.add_terminal(server)
+        tab_id = self.ensure_terminal_manager().add_terminal(server)
         
         if tab_id is not None:
             # 切换到终端界面
@@ -181,58 +273,151 @@ class MainWindow(QMainWindow):
             InfoBar.info("提示", f"正在连接到 {server.name}...", parent=self,
                         position=InfoBarPosition.TOP)
     
+    def prepare_connect(self, server: ServerConfig) -> bool:
+        """连接前的准备：需要时解锁凭据库并记录使用，返回是否继续连接"""
+        from connection import resolve_jump_hosts
+        
+        # 凭据库未解锁时先解锁（整个会话只需一次）
+        hops = resolve_jump_hosts(server) if server.proxy_jump else []
+        if vault.needs_unlock(server.password, *(hop.password for hop in hops)):
+            from settings import prompt_vault_unlock
+            if not prompt_vault_unlock(self):
+                return False
+            if self.setting_interface is not None:
+                self.setting_interface.update_vault_card()
+        
+        usage_history.record_connect(server.id)
+        return True
+    
+    def restore_session(self):
+        """恢复上次打开的标签页，只有切换到的标签页才会连接"""
+        if not app_settings.get(RESTORE_TABS):
+            return
+        tabs, current = session_store.load()
+        current_id = None
+        for i, tab in enumerate(tabs):
+            server = config_manager.get_server(tab.server_id)
+            if server is None:
+                continue  # 服务器已被删除
+            session_id = self.ensure_terminal_manager().add_terminal(server, tab.name, lazy=True,
+                                                            sftp_path=tab.sftp_path, scrollback=tab.scrollback)
+            if current_id is None or i <= current:
+                current_id = session_id
+        if current_id is not None:
+            self.terminal_manager.activate_tab(current_id)
+            self.stack_widget.setCurrentWidget(self.terminal_manager)
+            self.navigation_interface.setCurrentItem('terminal')
+    
+    def save_session(self):
+        """保存打开的标签页，下次启动时恢复"""
+        if not app_settings.get(RESTORE_TABS):
+            session_store.clear()
+            return
+        if self._startup_pending:
+            return  # 还没来得及恢复上次的标签页，保留原来保存的会话
+        if self.terminal_manager is None:
+            session_store.save([])
+            return
+        tabs = self.terminal_manager.session_state(app_settings.get(SCROLLBACK_KB) * 1024)
+        session_store.save(tabs, self.terminal_manager.tab_widget.currentIndex())
+    
+    def on_palette_tab_chosen(self, session_id: str):
+        """命令面板中选择了已打开的标签页"""
+        self.terminal_manager.activate_tab(session_id)
+        self.stack_widget.setCurrentWidget(self.terminal_manager)
+        self.navigation_interface.setCurrentItem('terminal')
+    
+    def on_palette_snippet_chosen(self, command: str):
+        """命令面板中选择了常用命令，发送到当前终端"""
+        terminal = self.terminal_manager.current_terminal() if self.terminal_manager else None
+        if terminal is None:
+            InfoBar.warning("提示", "请先连接到服务器", parent=self,
+                           position=InfoBarPosition.TOP)
+            return
+        self.stack_widget.setCurrentWidget(self.terminal_manager)
+        self.navigation_interface.setCurrentItem('terminal')
+        terminal.execute_command(command)
+    
+    def on_server_hovered(self, server: ServerConfig):
+        """悬停服务器时预连接（开启预连接时才导入connection模块）"""
+        if app_settings.get(WARM_POOL):
+            from connection import warm_pool
+            warm_pool.warm(server)
+    
+    def on_warm_pool_toggled(self, enabled: bool):
+        """开启/关闭预连接，开启时立即预连接常用和最常使用的服务器"""
+        if not enabled:
+            warm_pool = loaded_warm_pool()
+            if warm_pool is not None:
+                warm_pool.enabled = False
+                for server_id in warm_pool.warm_ids():
+                    warm_pool.discard(server_id)
+            return
+        
+        from connection import warm_pool
+        warm_pool.enabled = True
+        
+        candidates = [s for s in config_manager.get_all_servers() if s.pinned]
+        for server_id in usage_history.most_used(3):
+            server = config_manager.get_server(server_id)
+            if server and server not in candidates:
+                candidates.append(server)
+        for server in candidates:
+            warm_pool.warm(server)
+    
+    def closeEvent(self, event):
+        """关闭窗口时保存标签页、释放预连接与引擎进程、取消排队中的后台任务、停止后台渲染并保存设置"""
+        self.save_session()
+        warm_pool = loaded_warm_pool()
+        if warm_pool is not None:
+            warm_pool.close_all()
+        engine = sys.modules.get('engine')
+        if engine is not None:
+            engine.shutdown_engine()
+        tasks = sys.modules.get('tasks')
+        if tasks is not None:
+            tasks.shutdown_pools()
+        self.on_lag_monitor_toggled(False)
+        profiler = sys.modules.get('profiler')
+        if profiler is not None:
+            profiler.profiler.stop()
+        self.background_renderer.stop()
+        app_settings.flush()
+        usage_history.flush()
+        super().closeEvent(event)
+    
     def on_all_terminals_closed(self):
         """所有终端关闭时回到服务器列表"""
         self.stack_widget.setCurrentWidget(self.server_interface)
         self.navigation_interface.setCurrentItem('servers')
             
-    def on_background_changed(self, path: str):
-        """处理背景更改"""
-        self.set_background(path)
+    def on_setting_changed(self, key: str):
+        """设置变化时更新背景、预连接或卡顿检测"""
+        if key in (BACKGROUND.key, BLUR.key):
+            self.set_background(app_settings.get(BACKGROUND))
+        elif key == WARM_POOL.key:
+            self.on_warm_pool_toggled(app_settings.get(WARM_POOL))
+        elif key == LAG_MONITOR.key:
+            self.on_lag_monitor_toggled(app_settings.get(LAG_MONITOR))
     
     def set_background(self, image_path: str):
-        """设置背景图片"""
+        """设置背景图片（后台渲染，完成前保持显示上一帧）"""
+        self.background_label.setGeometry(0, 0, self.width(), self.height())
         if image_path and os.path.exists(image_path):
-            # 加载图片
-            pixmap = QPixmap(image_path)
-            # 缩放图片以适应窗口
-            scaled_pixmap = pixmap.scaled(self.size(), Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            
-            # 获取模糊程度
-            blur_value = self.setting_interface.get_blur_value()
-            
-            # 如果需要模糊，应用模糊效果
-            if blur_value > 0:
-                # 创建场景和项目
-                scene = QGraphicsScene()
-                item = QGraphicsPixmapItem(scaled_pixmap)
-                scene.addItem(item)
-                
-                # 创建模糊效果
-                blur = QGraphicsBlurEffect()
-                blur.setBlurRadius(blur_value * 0.5)  # 将0-100映射到0-50
-                item.setGraphicsEffect(blur)
-                
-                # 渲染场景到图片
-                result = QImage(scaled_pixmap.size(), QImage.Format_ARGB32)
-                result.fill(Qt.transparent)
-                painter = QPainter(result)
-                scene.render(painter)
-                painter.end()
-                
-                # 转换回QPixmap
-                scaled_pixmap = QPixmap.fromImage(result)
-            
-            # 设置到背景标签
-            self.background_label.setPixmap(scaled_pixmap)
-            self.background_label.setGeometry(0, 0, self.width(), self.height())
+            self.background_renderer.request(image_path, self.width(), self.height(),
+                                             app_settings.get(BLUR))
         else:
             # 清除背景
+            self.background_renderer.cancel()
             self.background_label.clear()
     
+    def on_background_frame(self, image: QImage):
+        """后台渲染完成，显示新的背景"""
+        self.background_label.setPixmap(QPixmap.fromImage(image))
+    
     def load_background(self):
         """加载背景图片配置"""
-        bg_path = self.setting_interface.load_background_config()
+        bg_path = app_settings.get(BACKGROUND)
         if bg_path:
             self.set_background(bg_path)
     
@@ -257,20 +442,9 @@ class MainWindow(QMainWindow):
                     parent=self
                 )
         
-        # 使用定时器延迟更新背景，避免频繁重绘导致掉帧
-        if self._resize_timer:
-            self._resize_timer.stop()
-        
-        self._resize_timer = QTimer(self)
-        self._resize_timer.setSingleShot(True)
-        self._resize_timer.timeout.connect(self._update_background)
-        self._resize_timer.start(100)  # 100ms后更新背景
-    
-    def _update_background(self):
-        """延迟更新背景"""
-        bg_path = self.setting_interface.load_background_config()
-        if bg_path:
-            self.set_background(bg_path)
+        # 背景在后台线程渲染，尺寸档位相同时直接复用缓存；首次绘制之前不加载
+        if not self._startup_pending:
+            self.set_background(app_settings.get(BACKGROUND))
     
     def mousePressEvent(self, event):
         """鼠标按下事件 - 用于窗口拖拽和大小调整"""
@@ -414,6 +588,8 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == '__main__':
+    # 打包后的程序启动引擎进程时需要（独立进程引擎）
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     
     # 加载自定义字体
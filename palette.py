@@ -0,0 +1,292 @@
+"""命令面板（Ctrl+K）：快速切换服务器、已打开的标签页与常用命令
+
+候选项按frecency排序后建立模糊索引；每次输入在一个时间片内匹配尽可能多的候选项，
+未完成的部分交给下一轮事件循环继续，界面不会因为大量服务器而卡顿。
+"""
+import heapq
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer
+from PyQt5.QtWidgets import QVBoxLayout, QListWidgetItem, QFrame
+from qfluentwidgets import SearchLineEdit, ListWidget, FluentIcon as FIF
+
+from appsettings import app_settings, SNIPPETS
+from config import config_manager
+from fuzzy import FuzzyIndex
+from history import usage_history
+
+MAX_RESULTS = 50
+CHUNK_SIZE = 256  # 每匹配这么多候选项检查一次时间
+FRAME_BUDGET = 0.008  # 每个时间片的匹配预算（秒），留出余量给绘制
+TAB_BONUS = 50  # 已打开的标签页优先
+FRECENCY_WEIGHT = 40
+
+# 快捷命令 (命令, 说明)，同时显示在终端下方的快捷命令栏
+QUICK_COMMANDS = [
+    ("ls -la", "列出文件"),
+    ("pwd", "当前目录"),
+    ("top", "进程监控"),
+    ("df -h", "磁盘使用"),
+    ("free -h", "内存使用"),
+]
+
+KIND_SERVER = "server"
+KIND_TAB = "tab"
+KIND_SNIPPET = "snippet"
+
+
+@dataclass
+class PaletteEntry:
+    key: str
+    kind: str
+    title: str
+    subtitle: str
+    payload: object  # 服务器配置 / 会话ID / 命令文本
+    boost: float = 0.0
+
+
+def load_snippets() -> List[Tuple[str, str]]:
+    """常用命令：内置快捷命令 + 设置中保存的 snippets"""
+    snippets = list(QUICK_COMMANDS)
+    for item in app_settings.get(SNIPPETS):
+        if isinstance(item, dict) and item.get('command'):
+            snippets.append((item['command'], item.get('name', '')))
+    return snippets
+
+
+class IncrementalMatcher:
+    """分时间片的模糊匹配
+    
+    候选项按优先级排好序，每个时间片从上次停下的位置继续，
+    只保留得分最高的前 limit 个结果。查询只是追加字符时，
+    在上一次完成的匹配结果中继续筛选。
+    """
+    
+    def __init__(self, index: FuzzyIndex, entries: Dict[str, PaletteEntry], order: List[str],
+                 limit: int = MAX_RESULTS):
+        self.index = index
+        self.entries = entries
+        self.order = order
+        self.limit = limit
+        self.query = ""
+        self.done = True
+        self._candidates: List[str] = []
+        self._pos = 0
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._matched: List[str] = []
+        self._last_complete: Optional[Tuple[str, List[str]]] = None  # (查询, 全部匹配的键)
+    
+    def start(self, query: str):
+        query = query.strip()
+        candidates = self.order
+        if self._last_complete and self._last_complete[0] and query.startswith(self._last_complete[0]):
+            candidates = self._last_complete[1]
+        self.query = query
+        self._heap = []
+        self._seq = 0
+        self._matched = []
+        self._candidates = candidates if query else []
+        self._pos = 0
+        self.done = not query
+    
+    def step(self, budget: float = FRAME_BUDGET) -> bool:
+        """在预算时间内继续匹配，返回是否已完成"""
+        if self.done:
+            return True
+        deadline = time.perf_counter() + budget
+        heap, entries, limit = self._heap, self.entries, self.limit
+        candidates = self._candidates
+        while self._pos < len(candidates):
+            chunk = candidates[self._pos:self._pos + CHUNK_SIZE]
+            self._pos += len(chunk)
+            for key, score in self.index.iter_matches(self.query, chunk):
+                self._matched.append(key)
+                rank = score + entries[key].boost
+                self._seq += 1
+                item = (rank, -self._seq, key)  # 分数相同时先出现的（优先级高的）在前
+                if len(heap) < limit:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+            if self._pos < len(candidates) and time.perf_counter() >= deadline:
+                return False
+        self.done = True
+        self._last_complete = (self.query, self._matched)
+        return True
+    
+    def results(self) -> List[PaletteEntry]:
+        """当前得分最高的结果；空查询时按优先级顺序列出"""
+        if not self.query:
+            return [self.entries[key] for key in self.order[:self.limit]]
+        return [self.entries[key] for _, _, key in sorted(self._heap, reverse=True)]
+
+
+class CommandPalette(QFrame):
+    """命令面板弹窗"""
+    
+    serverChosen = pyqtSignal(object)
+    tabChosen = pyqtSignal(str)
+    snippetChosen = pyqtSignal(str)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("commandPalette")
+        self.setStyleSheet("""
+            #commandPalette {
+                background-color: rgba(255, 255, 255, 0.97);
+                border: 1px solid #d0d0d0;
+                border-radius: 10px;
+            }
+        """)
+        self.tabs_provider = None  # 返回 [(会话ID, 名称, 服务器配置)] 的回调
+        self._index = FuzzyIndex()
+        self._server_revision = -1
+        self._server_entries: Dict[str, PaletteEntry] = {}
+        self._other_keys: List[str] = []
+        self.matcher: Optional[IncrementalMatcher] = None
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+        
+        self.search_edit = SearchLineEdit(self)
+        self.search_edit.setPlaceholderText("搜索服务器、标签页或命令…")
+        self.search_edit.textChanged.connect(self.on_text_changed)
+        self.search_edit.installEventFilter(self)
+        layout.addWidget(self.search_edit)
+        
+        self.result_list = ListWidget(self)
+        self.result_list.setUniformItemSizes(True)
+        self.result_list.itemActivated.connect(self.activate_item)
+        self.result_list.itemClicked.connect(self.activate_item)
+        layout.addWidget(self.result_list)
+        
+        # 未匹配完的部分在后续事件循环中继续
+        self._step_timer = QTimer(self)
+        self._step_timer.setInterval(0)
+        self._step_timer.timeout.connect(self.continue_matching)
+        
+        self.hide()
+    
+    def popup(self):
+        """显示面板并刷新候选项"""
+        self.refresh_candidates()
+        parent = self.parentWidget()
+        if parent is not None:
+            width = min(640, parent.width() - 40)
+            self.setGeometry((parent.width() - width) // 2, 60, width, min(440, parent.height() - 80))
+        self.show()
+        self.raise_()
+        self.search_edit.clear()
+        self.on_text_changed("")
+        self.search_edit.setFocus()
+    
+    def refresh_candidates(self):
+        """重建候选项；服务器只重新索引变化过的条目"""
+        if self._server_revision != config_manager.revision:
+            old_entries = self._server_entries
+            self._server_entries = {}
+            for server in config_manager.get_all_servers():
+                key = f"s:{server.id}"
+                old = old_entries.get(key)
+                if old is not None and old.payload is server:
+                    self._server_entries[key] = old
+                    continue
+                address = f"{server.username}@{server.host}:{server.port}" if server.username \
+                    else f"{server.host}:{server.port}"
+                self._server_entries[key] = PaletteEntry(key, KIND_SERVER, server.name, address, server)
+                self._index.set(key, (server.name, server.host, server.description), server.tags)
+            for key in old_entries:
+                if key not in self._server_entries:
+                    self._index.remove(key)
+            self._server_revision = config_manager.revision
+        
+        # 标签页和常用命令数量很少，每次重建
+        for key in self._other_keys:
+            self._index.remove(key)
+        self._other_keys = []
+        entries: Dict[str, PaletteEntry] = dict(self._server_entries)
+        tab_keys, snippet_keys = [], []
+        for session_id, name, server in (self.tabs_provider() if self.tabs_provider else []):
+            key = f"t:{session_id}"
+            entries[key] = PaletteEntry(key, KIND_TAB, name, f"标签页 · {server.host}", session_id, TAB_BONUS)
+            self._index.set(key, (name, server.name, server.host))
+            tab_keys.append(key)
+        for i, (command, description) in enumerate(load_snippets()):
+            key = f"c:{i}"
+            entries[key] = PaletteEntry(key, KIND_SNIPPET, command, description or "命令", command)
+            self._index.set(key, (command, description))
+            snippet_keys.append(key)
+        self._other_keys = tab_keys + snippet_keys
+        
+        # frecency 高的服务器排在前面，首个时间片就能覆盖最可能的结果
+        frecency = usage_history.frecency_all()
+        for entry in self._server_entries.values():
+            entry.boost = FRECENCY_WEIGHT * math.log2(1 + frecency.get(entry.payload.id, 0.0))
+        server_keys = sorted(self._server_entries, key=lambda k: self._server_entries[k].boost, reverse=True)
+        self.matcher = IncrementalMatcher(self._index, entries, tab_keys + server_keys + snippet_keys)
+    
+    def on_text_changed(self, text: str):
+        if self.matcher is None:
+            return
+        self.matcher.start(text)
+        self.continue_matching()
+    
+    def continue_matching(self):
+        done = self.matcher.step()
+        self.show_results(self.matcher.results())
+        if done:
+            self._step_timer.stop()
+        elif not self._step_timer.isActive():
+            self._step_timer.start()
+    
+    def show_results(self, results: List[PaletteEntry]):
+        current = self.result_list.currentRow()
+        self.result_list.setUpdatesEnabled(False)
+        self.result_list.clear()
+        icons = {KIND_SERVER: FIF.CONNECT, KIND_TAB: FIF.COMMAND_PROMPT, KIND_SNIPPET: FIF.CODE}
+        for entry in results:
+            item = QListWidgetItem(icons[entry.kind].icon(), f"{entry.title}    {entry.subtitle}")
+            item.setData(Qt.UserRole, entry)
+            self.result_list.addItem(item)
+        if results:
+            self.result_list.setCurrentRow(min(max(current, 0), len(results) - 1) if self.matcher.done else 0)
+        self.result_list.setUpdatesEnabled(True)
+    
+    def activate_item(self, item: QListWidgetItem):
+        entry = item.data(Qt.UserRole)
+        self.hide()
+        if entry.kind == KIND_SERVER:
+            self.serverChosen.emit(entry.payload)
+        elif entry.kind == KIND_TAB:
+            self.tabChosen.emit(entry.payload)
+        else:
+            self.snippetChosen.emit(entry.payload)
+    
+    def eventFilter(self, obj, event):
+        # 搜索框中用上下键选择结果，回车执行，Esc关闭
+        if obj is self.search_edit and event.type() == event.KeyPress:
+            key = event.key()
+            if key in (Qt.Key_Down, Qt.Key_Up):
+                row = self.result_list.currentRow() + (1 if key == Qt.Key_Down else -1)
+                if 0 <= row < self.result_list.count():
+                    self.result_list.setCurrentRow(row)
+                return True
+            if key in (Qt.Key_Return, Qt.Key_Enter):
+                if self.matcher and not self.matcher.done:
+                    # 先把剩余候选项匹配完，保证回车选中的是最佳结果
+                    while not self.matcher.step(1.0):
+                        pass
+                    self.show_results(self.matcher.results())
+                item = self.result_list.currentItem()
+                if item is not None:
+                    self.activate_item(item)
+                return True
+            if key == Qt.Key_Escape:
+                self.hide()
+                return True
+        return super().eventFilter(obj, event)
@@ -0,0 +1,82 @@
+"""预测性本地回显（类似mosh），用于高延迟链路"""
+import re
+from typing import Optional, Tuple
+
+# 进入/退出备用屏幕（vim、top、less等全屏程序）
+ALT_SCREEN_RE = re.compile(r'\x1b\[\?(?:1049|1047|47)([hl])')
+# 密码/口令输入提示（此时远程不回显，不能预测）
+PASSWORD_PROMPT_RE = re.compile(r'(password|passphrase|密码|口令)[^\n]*[:：]\s*$', re.IGNORECASE)
+
+
+class PredictiveEcho:
+    """预测回显状态机
+    
+    可打印按键先在本地以特殊样式显示（pending），服务器回显到达后逐字比对：
+    一致则确认，不一致则整体回滚，以服务器输出为准。
+    RTT较低、处于密码提示或全屏程序时自动关闭。
+    """
+    
+    def __init__(self, rtt_threshold_ms: float = 60.0):
+        self.rtt_threshold_ms = rtt_threshold_ms
+        self.srtt: Optional[float] = None  # 平滑RTT（毫秒）
+        self.pending = ""  # 已本地显示、尚未被服务器确认的字符
+        self.password_prompt = False
+        self.fullscreen = False
+        self._tail = ""  # 最近的输出尾部，用于检测提示符
+    
+    @property
+    def active(self) -> bool:
+        """当前是否启用预测"""
+        if self.srtt is None or self.srtt < self.rtt_threshold_ms:
+            return False
+        return not self.password_prompt and not self.fullscreen
+    
+    def update_rtt(self, rtt_ms: float):
+        """更新RTT采样（按TCP SRTT方式指数平滑）"""
+        if self.srtt is None:
+            self.srtt = rtt_ms
+        else:
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt_ms
+    
+    def observe_output(self, raw: str):
+        """观察服务器原始输出，更新全屏/密码提示状态"""
+        for match in ALT_SCREEN_RE.finditer(raw):
+            self.fullscreen = match.group(1) == 'h'
+        self._tail = (self._tail + raw)[-256:]
+        last_line = self._tail.rsplit('\n', 1)[-1]
+        self.password_prompt = bool(PASSWORD_PROMPT_RE.search(last_line))
+    
+    def predict(self, text: str) -> bool:
+        """记录一次按键预测，返回是否应在本地显示"""
+        if not self.active:
+            return False
+        self.pending += text
+        return True
+    
+    def reset(self) -> int:
+        """放弃全部预测，返回被丢弃的字符数"""
+        count = len(self.pending)
+        self.pending = ""
+        return count
+    
+    def reconcile(self, text: str) -> Tuple[int, str, bool]:
+        """用服务器输出核对预测
+        
+        返回 (确认的字符数, 剩余需要正常显示的输出, 是否需要回滚)
+        """
+        if not self.pending:
+            return 0, text, False
+        
+        matched = 0
+        limit = min(len(self.pending), len(text))
+        while matched < limit and self.pending[matched] == text[matched]:
+            matched += 1
+        
+        if matched == len(text) or matched == len(self.pending):
+            # 服务器回显与预测一致（可能只回显了一部分）
+            self.pending = self.pending[matched:]
+            return matched, text[matched:], False
+        
+        # 回显与预测不一致，回滚全部预测
+        self.pending = ""
+        return 0, text, True
@@ -0,0 +1,139 @@
+"""采样性能分析（隐藏功能，主窗口中按 Ctrl+Shift+P 开始/停止）
+
+旁路线程按固定间隔读取所有线程（界面线程与各工作线程）当前的Python调用栈并计数，
+不需要插桩，开销只和采样频率有关。停止后可以导出为：
+- 折叠栈格式（每行 "线程;函数;函数... 次数"），可用 flamegraph.pl 等工具生成火焰图
+- speedscope 格式（*.speedscope.json），直接拖进 https://www.speedscope.app 查看，每个线程一个视图
+
+采样的是挂钟时间：在 select、锁等待中空闲的线程同样会被计入，按线程分开查看即可区分。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+SAMPLE_INTERVAL = 0.01  # 采样间隔（秒）
+MAX_STACK_DEPTH = 128
+
+Frame = Tuple[str, str, int]  # (函数名, 文件, 定义所在行)
+
+
+class SamplingProfiler:
+    """对所有线程的调用栈做定时采样"""
+    
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()  # (线程名, 栈（从外到内）) -> 次数
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+    
+    def start(self):
+        if self.running:
+            return
+        self.samples.clear()
+        self.sample_count = 0
+        self.started_at, self.stopped_at = time.time(), None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self._thread = None
+        self.stopped_at = time.time()
+    
+    def _run(self):
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        next_refresh = 0.0
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            if now >= next_refresh:
+                # 线程名每秒刷新一次，避免每次采样都遍历
+                names = {t.ident: t.name for t in threading.enumerate()}
+                next_refresh = now + 1.0
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[(names.get(ident, f"thread-{ident}"), tuple(stack))] += 1
+            frame = None
+            self.sample_count += 1
+    
+    @staticmethod
+    def frame_label(frame: Frame) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})"
+    
+    def to_collapsed(self) -> str:
+        """折叠栈格式"""
+        lines = []
+        for (thread, stack), count in sorted(self.samples.items(), key=lambda item: -item[1]):
+            frames = ";".join(self.frame_label(frame).replace(";", ":") for frame in stack)
+            lines.append(f"{thread};{frames} {count}" if frames else f"{thread} {count}")
+        return "\n".join(lines) + "\n"
+    
+    def to_speedscope(self) -> dict:
+        """speedscope 文件格式，每个线程一个 sampled profile，权重为采样间隔（秒）"""
+        frames, frame_index = [], {}
+        threads: Dict[str, Tuple[list, list]] = {}
+        for (thread, stack), count in self.samples.items():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    name, filename, line = frame
+                    frames.append({"name": name, "file": filename, "line": line})
+                indexes.append(index)
+            samples, weights = threads.setdefault(thread, ([], []))
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        profiles = []
+        for thread, (samples, weights) in sorted(threads.items(), key=lambda item: -sum(item[1][1])):
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": f"sshbox {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at or time.time()))}",
+            "exporter": "sshbox profiler",
+        }
+    
+    def save(self, path: str):
+        """按扩展名保存：.json 为 speedscope 格式，其余为折叠栈格式"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith(".json"):
+                json.dump(self.to_speedscope(), f, ensure_ascii=False)
+            else:
+                f.write(self.to_collapsed())
+
+
+# 全局采样器
+profiler = SamplingProfiler()
@@ -0,0 +1,204 @@
+"""服务器配置对话框（添加/编辑服务器）"""
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit, QPushButton, QDialogButtonBox, QMessageBox, QLabel
+from PyQt5.QtCore import Qt
+from qfluentwidgets import CardWidget, SubtitleLabel, LineEdit, PushButton, PrimaryPushButton, ComboBox, CheckBox, Theme, setTheme
+
+from config import ServerConfig
+from forward import parse_forward
+from vault import is_sealed
+
+
+class ServerConfigDialog(QDialog):
+    def __init__(self, parent=None, server: ServerConfig = None):
+        super().__init__(parent)
+        self.setWindowTitle("服务器配置" if server is None else "编辑服务器")
+        self.setFixedSize(450, 620)
+        
+        self.server = server or ServerConfig()
+        
+        # 主布局
+        main_layout = QVBoxLayout()
+        main_layout.setContentsMargins(20, 20, 20, 20)
+        main_layout.setSpacing(15)
+        
+        # 标题
+        title = SubtitleLabel("服务器配置", self)
+        title.setStyleSheet("font-size: 18px; font-weight: bold;")
+        main_layout.addWidget(title)
+        
+        # 卡片容器
+        card = CardWidget(self)
+        card_layout = QVBoxLayout(card)
+        card_layout.setContentsMargins(20, 20, 20, 20)
+        card_layout.setSpacing(15)
+        
+        # 表单布局
+        form_layout = QFormLayout()
+        form_layout.setSpacing(10)
+        form_layout.setFieldGrowthPolicy(QFormLayout.ExpandingFieldsGrow)
+        
+        # 名称输入
+        self.name_edit = LineEdit(card)
+        self.name_edit.setText(self.server.name)
+        self.name_edit.setPlaceholderText("输入服务器名称")
+        form_layout.addRow("名称:", self.name_edit)
+        
+        # 主机输入
+        self.host_edit = LineEdit(card)
+        self.host_edit.setText(self.server.host)
+        self.host_edit.setPlaceholderText("例如: 192.168.1.1")
+        form_layout.addRow("主机:", self.host_edit)
+        
+        # 端口输入
+        self.port_edit = LineEdit(card)
+        self.port_edit.setText(str(self.server.port))
+        self.port_edit.setPlaceholderText("默认: 22")
+        form_layout.addRow("端口:", self.port_edit)
+        
+        # 用户名输入
+        self.username_edit = LineEdit(card)
+        self.username_edit.setText(self.server.username)
+        self.username_edit.setPlaceholderText("输入用户名")
+        form_layout.addRow("用户名:", self.username_edit)
+        
+        # 密码输入
+        self.password_edit = LineEdit(card)
+        self.password_edit.setEchoMode(QLineEdit.Password)
+        if is_sealed(self.server.password):
+            # 已加密保存的密码不回显，留空表示不修改
+            self.password_edit.setPlaceholderText("已加密保存，留空则不修改")
+        else:
+            self.password_edit.setText(self.server.password)
+            self.password_edit.setPlaceholderText("输入密码（密钥认证时为私钥口令）")
+        form_layout.addRow("密码:", self.password_edit)
+        
+        # 认证方式选择
+        auth_layout = QHBoxLayout()
+        self.auth_combo = ComboBox(card)
+        self.auth_combo.addItems(["密码认证", "密钥认证"])
+        self.auth_combo.setCurrentIndex(0 if not self.server.use_key else 1)
+        auth_layout.addWidget(self.auth_combo)
+        
+        self.key_file_btn = PushButton("选择密钥文件", card)
+        self.key_file_btn.setVisible(self.server.use_key)
+        auth_layout.addWidget(self.key_file_btn)
+        
+        form_layout.addRow("认证方式:", auth_layout)
+        
+        # 描述输入
+        self.description_edit = LineEdit(card)
+        self.description_edit.setText(self.server.description)
+        self.description_edit.setPlaceholderText("服务器描述信息")
+        form_layout.addRow("描述:", self.description_edit)
+        
+        # 分组输入
+        self.group_edit = LineEdit(card)
+        self.group_edit.setText(self.server.group)
+        self.group_edit.setPlaceholderText("例如: 生产环境")
+        form_layout.addRow("分组:", self.group_edit)
+        
+        # 标签输入
+        self.tags_edit = LineEdit(card)
+        self.tags_edit.setText(", ".join(self.server.tags))
+        self.tags_edit.setPlaceholderText("多个标签用逗号分隔")
+        form_layout.addRow("标签:", self.tags_edit)
+        
+        # 端口转发输入
+        self.forwards_edit = LineEdit(card)
+        self.forwards_edit.setText("; ".join(self.server.forwards))
+        self.forwards_edit.setPlaceholderText("例如: -L 5433:db:5432; -D 1080")
+        form_layout.addRow("端口转发:", self.forwards_edit)
+        
+        # 跳板机输入
+        self.proxy_jump_edit = LineEdit(card)
+        self.proxy_jump_edit.setText(self.server.proxy_jump)
+        self.proxy_jump_edit.setPlaceholderText("服务器名称或 user@host:port，多个用逗号分隔")
+        form_layout.addRow("跳板机:", self.proxy_jump_edit)
+        
+        # 常用服务器
+        self.pinned_check = CheckBox("常用（开启预连接时启动即连接）", card)
+        self.pinned_check.setChecked(self.server.pinned)
+        form_layout.addRow("", self.pinned_check)
+        
+        card_layout.addLayout(form_layout)
+        main_layout.addWidget(card)
+        
+        # 按钮布局
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        
+        self.cancel_btn = PushButton("取消", card)
+        button_layout.addWidget(self.cancel_btn)
+        
+        self.ok_btn = PrimaryPushButton("确定", card)
+        button_layout.addWidget(self.ok_btn)
+        
+        card_layout.addLayout(button_layout)
+        
+        self.setLayout(main_layout)
+        
+        # 连接信号
+        self.cancel_btn.clicked.connect(self.reject)
+        self.ok_btn.clicked.connect(self.accept)
+        self.auth_combo.currentTextChanged.connect(self.on_auth_changed)
+        
+    def on_auth_changed(self, text):
+        # 根据认证方式显示/隐藏密钥文件按钮
+        is_key_auth = text == "密钥认证"
+        self.key_file_btn.setVisible(is_key_auth)
+        if is_key_auth:
+            self.key_file_btn.clicked.connect(self.select_key_file)
+    
+    def select_key_file(self):
+        from PyQt5.QtWidgets import QFileDialog
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择密钥文件", "", "密钥文件 (*.pem *.key *.ppk);;所有文件 (*)")
+        if file_path:
+            self.key_file_btn.setText(file_path.split("/")[-1])
+    
+    def get_config(self):
+        # Validate inputs
+        if not self.name_edit.text().strip():
+            QMessageBox.warning(self, "警告", "请输入服务器名称")
+            return None
+        if not self.host_edit.text().strip():
+            QMessageBox.warning(self, "警告", "请输入主机地址")
+            return None
+        if not self.username_edit.text().strip():
+            QMessageBox.warning(self, "警告", "请输入用户名")
+            return None
+        
+        try:
+            port = int(self.port_edit.text().strip())
+            if not (1 <= port <= 65535):
+                raise ValueError("Port out of range")
+        except ValueError:
+            QMessageBox.warning(self, "警告", "请输入有效的端口号(1-65535)")
+            return None
+        
+        forwards = [f.strip() for f in self.forwards_edit.text().split(";") if f.strip()]
+        for forward in forwards:
+            try:
+                parse_forward(forward)
+            except ValueError as e:
+                QMessageBox.warning(self, "警告", str(e))
+                return None
+        
+        # Create and return server config
+        config = ServerConfig(
+            id=self.server.id,  # Keep the same ID when editing
+            name=self.name_edit.text().strip(),
+            host=self.host_edit.text().strip(),
+            port=port,
+            username=self.username_edit.text().strip(),
+            password=self.password_edit.text().strip() or (
+                self.server.password if is_sealed(self.server.password) else ""),
+            description=self.description_edit.text().strip(),
+            use_key=self.auth_combo.currentText() == "密钥认证",
+            key_file=self.key_file_btn.text() if self.key_file_btn.isVisible() else "",
+            forwards=forwards,
+            proxy_jump=self.proxy_jump_edit.text().strip(),
+            pinned=self.pinned_check.isChecked(),
+            tags=[t.strip() for t in self.tags_edit.text().replace("，", ",").split(",") if t.strip()],
+            group=self.group_edit.text().strip()
+        )
+        return config
\ No newline at end of file
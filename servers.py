@@ -1,35 +1,366 @@
-from PyQt5.QtCore import pyqtSignal, Qt
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                            QTableWidgetItem, QHeaderView, QAbstractItemView, 
-                            QMenu, QAction, QMessageBox, QListWidget, QListWidgetItem)
-from qfluentwidgets import (CardWidget, PushButton, FluentIcon as FIF, 
-                           SubtitleLabel, PrimaryPushButton, ListWidget, ToolButton)
+from typing import Dict, List, Optional, Tuple, Union
 
-from config import ServerConfig, load_servers, save_servers
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QCursor, QFont
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QHeaderView,
+                            QAbstractItemView, QMenu, QAction, QMessageBox)
+from qfluentwidgets import (PushButton, FluentIcon as FIF, SubtitleLabel, PrimaryPushButton,
+                           TableView, SearchLineEdit, ComboBox, InfoBar, InfoBarPosition)
 
+from config import ServerConfig, config_manager
+from fuzzy import FuzzyIndex
 
-class ServerListWidgetItem(QListWidgetItem):
-    def __init__(self, server: ServerConfig):
-        super().__init__()
-        self.server = server
-        self.setText(f"{server.name}")
-        self.setToolTip(f"{server.host}:{server.port} - {server.description}")
-        
-        # 设置显示文本
-        self.setText(f"{server.name}\n{server.host}:{server.port}")
-        
-        # 存储服务器配置数据
-        self.setData(0x0100, server)
+SERVER_ROLE = 0x0100  # Qt.UserRole，存放ServerConfig
+UNGROUPED = "未分组"
+
+
+class _GroupNode:
+    """分组（或标签）节点，servers为当前可见的服务器"""
+    
+    __slots__ = ("name", "servers")
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.servers: List[ServerConfig] = []
+    
+    def row_of(self, server_id: str) -> int:
+        for row, server in enumerate(self.servers):
+            if server.id == server_id:
+                return row
+        return -1
+
+
+class ServerListModel(QAbstractTableModel):
+    """按分组/标签组织的服务器列表模型
+    
+    分组标题与服务器展开为一张平铺的表，视图只请求可见行的数据；
+    筛选时基于预先建立的模糊索引重建，单台服务器的增删改只插入、删除或刷新对应的行。
+    """
+    
+    COLUMNS = ["名称", "地址", "标签", "描述"]
+    GROUP_BY_GROUP = "group"
+    GROUP_BY_TAG = "tag"
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._servers: Dict[str, ServerConfig] = {}  # 按配置顺序保存
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._index = FuzzyIndex()
+        self._groups: List[_GroupNode] = []
+        self._rows: List[Union[_GroupNode, ServerConfig]] = []  # 平铺后的可见行
+        self._placement: Dict[str, Tuple[str, ...]] = {}  # 服务器ID -> 所在分组
+        self._scores: Dict[str, int] = {}
+        self._collapsed = set()  # 折叠的分组
+        self._query = ""
+        self.group_by = self.GROUP_BY_GROUP
+    
+    # ---- 数据维护 ----
+    
+    def set_servers(self, servers: List[ServerConfig]):
+        """整体替换服务器列表"""
+        self._servers = {s.id: s for s in servers}
+        self._order = {s.id: i for i, s in enumerate(servers)}
+        self._next_order = len(servers)
+        self._index.rebuild((s.id, self._index_fields(s), s.tags) for s in servers)
+        self._rebuild()
+    
+    def set_query(self, query: str):
+        """设置模糊筛选条件（# 开头的词按标签筛选）"""
+        query = query.strip()
+        if query == self._query:
+            return
+        self._query = query
+        self._rebuild()
+    
+    def set_group_by(self, mode: str):
+        if mode == self.group_by:
+            return
+        self.group_by = mode
+        self._collapsed.clear()
+        self._rebuild()
+    
+    def toggle_group(self, row: int):
+        """展开/折叠分组标题所在的行（筛选时始终展开）"""
+        node = self._rows[row] if 0 <= row < len(self._rows) else None
+        if not isinstance(node, _GroupNode) or self._query or not node.servers:
+            return
+        count = len(node.servers)
+        if node.name in self._collapsed:
+            self.beginInsertRows(QModelIndex(), row + 1, row + count)
+            self._collapsed.discard(node.name)
+            self._rows[row + 1:row + 1] = node.servers
+            self.endInsertRows()
+        else:
+            self.beginRemoveRows(QModelIndex(), row + 1, row + count)
+            self._collapsed.add(node.name)
+            del self._rows[row + 1:row + 1 + count]
+            self.endRemoveRows()
+        self._emit_row_changed(row)
+    
+    def upsert_server(self, server: ServerConfig):
+        """添加或更新一台服务器，只改动受影响的行"""
+        if server.id not in self._order:
+            self._order[server.id] = self._next_order
+            self._next_order += 1
+        self._servers[server.id] = server
+        self._index.set(server.id, self._index_fields(server), server.tags)
+        
+        score = self._index.score(server.id, self._query)
+        new_keys = self._group_keys(server) if score is not None else ()
+        if score is not None:
+            self._scores[server.id] = score
+        else:
+            self._scores.pop(server.id, None)
+        old_keys = self._placement.get(server.id, ())
+        
+        for name in old_keys:
+            node = self._node(name)
+            row = node.row_of(server.id)
+            if name in new_keys and row >= 0:
+                node.servers[row] = server
+                if self._is_open(node):
+                    flat_row = self._group_row(node) + 1 + row
+                    self._rows[flat_row] = server
+                    self._emit_row_changed(flat_row)
+            else:
+                self._remove_row(node, row)
+        for name in new_keys:
+            if name not in old_keys:
+                self._insert_row(name, server)
+        
+        if new_keys:
+            self._placement[server.id] = new_keys
+        else:
+            self._placement.pop(server.id, None)
+    
+    def remove_server(self, server_id: str):
+        """移除一台服务器"""
+        for name in self._placement.pop(server_id, ()):
+            node = self._node(name)
+            self._remove_row(node, node.row_of(server_id))
+        self._servers.pop(server_id, None)
+        self._order.pop(server_id, None)
+        self._scores.pop(server_id, None)
+        self._index.remove(server_id)
+    
+    def server_at(self, index: QModelIndex) -> Optional[ServerConfig]:
+        if not index.isValid():
+            return None
+        item = self._rows[index.row()]
+        return item if isinstance(item, ServerConfig) else None
+    
+    def is_group_row(self, row: int) -> bool:
+        return 0 <= row < len(self._rows) and isinstance(self._rows[row], _GroupNode)
+    
+    def first_server_index(self) -> QModelIndex:
+        """第一个可见服务器的索引（用于筛选后直接回车连接）"""
+        for row, item in enumerate(self._rows):
+            if isinstance(item, ServerConfig):
+                return self.index(row, 0)
+        return QModelIndex()
+    
+    def visible_count(self) -> int:
+        return len(self._placement)
+    
+    @staticmethod
+    def _index_fields(server: ServerConfig):
+        return server.name, server.host, server.description
+    
+    def _group_keys(self, server: ServerConfig) -> Tuple[str, ...]:
+        if self.group_by == self.GROUP_BY_TAG:
+            return tuple(dict.fromkeys(server.tags)) or ("",)
+        return (server.group,)
+    
+    @staticmethod
+    def _group_sort_key(name: str):
+        # 未分组放在最后
+        return (name == "", name.lower())
+    
+    def _is_open(self, node: _GroupNode) -> bool:
+        return bool(self._query) or node.name not in self._collapsed
+    
+    def _node(self, name: str) -> Optional[_GroupNode]:
+        for node in self._groups:
+            if node.name == name:
+                return node
+        return None
+    
+    def _group_row(self, node: _GroupNode) -> int:
+        """分组标题在平铺列表中的行号"""
+        row = 0
+        for other in self._groups:
+            if other is node:
+                return row
+            row += 1 + (len(other.servers) if self._is_open(other) else 0)
+        return -1
+    
+    def _emit_row_changed(self, row: int):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+    
+    def _rebuild(self):
+        self.beginResetModel()
+        self._scores = self._index.search(self._query)
+        ranked = self._scores
+        if self._query:
+            # 稳定排序：分数相同的保持配置顺序
+            ranked = sorted(self._scores, key=self._scores.__getitem__, reverse=True)
+        servers = self._servers
+        nodes: Dict[str, _GroupNode] = {}
+        placement = {}
+        for server_id in ranked:
+            server = servers[server_id]
+            keys = self._group_keys(server)
+            placement[server_id] = keys
+            for name in keys:
+                node = nodes.get(name)
+                if node is None:
+                    node = nodes[name] = _GroupNode(name)
+                node.servers.append(server)
+        self._groups = sorted(nodes.values(), key=lambda n: self._group_sort_key(n.name))
+        self._rows = []
+        for node in self._groups:
+            self._rows.append(node)
+            if self._is_open(node):
+                self._rows.extend(node.servers)
+        self._placement = placement
+        self.endResetModel()
+    
+    def _insert_row(self, name: str, server: ServerConfig):
+        node = self._node(name)
+        if node is None:
+            sort_key = self._group_sort_key(name)
+            position = len(self._groups)
+            for i, other in enumerate(self._groups):
+                if self._group_sort_key(other.name) > sort_key:
+                    position = i
+                    break
+            flat_row = self._group_row(self._groups[position]) if position < len(self._groups) else len(self._rows)
+            node = _GroupNode(name)
+            self.beginInsertRows(QModelIndex(), flat_row, flat_row)
+            self._groups.insert(position, node)
+            self._rows.insert(flat_row, node)
+            self.endInsertRows()
+        
+        # 保持与重建时相同的顺序：有筛选时按分数，否则按配置顺序
+        if self._query:
+            key = lambda s: (-self._scores.get(s.id, 0), self._order[s.id])
+        else:
+            key = lambda s: self._order[s.id]
+        new_key = key(server)
+        row = len(node.servers)
+        for i, other in enumerate(node.servers):
+            if key(other) > new_key:
+                row = i
+                break
+        group_row = self._group_row(node)
+        if self._is_open(node):
+            self.beginInsertRows(QModelIndex(), group_row + 1 + row, group_row + 1 + row)
+            node.servers.insert(row, server)
+            self._rows.insert(group_row + 1 + row, server)
+            self.endInsertRows()
+        else:
+            node.servers.insert(row, server)
+        self._emit_row_changed(group_row)
+    
+    def _remove_row(self, node: _GroupNode, row: int):
+        if node is None or row < 0:
+            return
+        group_row = self._group_row(node)
+        if self._is_open(node):
+            self.beginRemoveRows(QModelIndex(), group_row + 1 + row, group_row + 1 + row)
+            del node.servers[row]
+            del self._rows[group_row + 1 + row]
+            self.endRemoveRows()
+        else:
+            del node.servers[row]
+        if node.servers:
+            self._emit_row_changed(group_row)
+            return
+        self.beginRemoveRows(QModelIndex(), group_row, group_row)
+        self._groups.remove(node)
+        del self._rows[group_row]
+        self.endRemoveRows()
+    
+    # ---- QAbstractTableModel ----
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+    
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if isinstance(self._rows[index.row()], _GroupNode):
+            return Qt.ItemIsEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._rows[index.row()]
+        column = index.column()
+        
+        if isinstance(item, _GroupNode):
+            # 分组标题行
+            if role == Qt.DisplayRole and column == 0:
+                arrow = "▾" if self._is_open(item) else "▸"
+                prefix = "#" if self.group_by == self.GROUP_BY_TAG and item.name else ""
+                return f"{arrow} {prefix}{item.name or UNGROUPED} ({len(item.servers)})"
+            if role == Qt.FontRole:
+                font = QFont()
+                font.setBold(True)
+                return font
+            return None
+        
+        if role == SERVER_ROLE:
+            return item
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return item.name
+            if column == 1:
+                address = f"{item.host}:{item.port}"
+                return f"{item.username}@{address}" if item.username else address
+            if column == 2:
+                return " ".join(f"#{tag}" for tag in item.tags)
+            if column == 3:
+                return item.description
+        if role == Qt.ToolTipRole:
+            return f"{item.host}:{item.port} - {item.description}"
+        return None
+
+
+class ServerTableView(TableView):
+    """在列表上直接输入时把字符转给搜索框，回车发出returnPressed"""
+    
+    typed = pyqtSignal(str)
+    returnPressed = pyqtSignal()
+    
+    def keyboardSearch(self, text):
+        self.typed.emit(text)
+    
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            self.returnPressed.emit()
+            return
+        super().keyPressEvent(event)
 
 
 class ServerListWidget(QWidget):
     connectRequested = pyqtSignal(ServerConfig)
+    serverHovered = pyqtSignal(ServerConfig)  # 鼠标在服务器上停留，可用于预连接
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.servers = load_servers()
         self.setup_ui()
-        self.load_server_list()
+        # 服务器列表由调用方在合适的时机（主窗口首次绘制之后）调用 load_server_list 填充
     
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -67,113 +398,201 @@ class ServerListWidget(QWidget):
         button_layout.addStretch()
         layout.addLayout(button_layout)
         
-        # 服务器列表 - 采用类似左侧边栏的样式
-        self.server_list = ListWidget(self)
+        # 搜索与分组方式
+        search_layout = QHBoxLayout()
+        
+        self.search_edit = SearchLineEdit(self)
+        self.search_edit.setPlaceholderText("搜索名称、主机或描述，#标签 按标签筛选")
+        self.search_edit.textChanged.connect(lambda _: self._filter_timer.start())
+        self.search_edit.returnPressed.connect(self.connect_to_selected)
+        search_layout.addWidget(self.search_edit, 1)
+        
+        self.group_by_combo = ComboBox(self)
+        self.group_by_combo.addItems(["按分组", "按标签"])
+        self.group_by_combo.currentIndexChanged.connect(self.on_group_by_changed)
+        search_layout.addWidget(self.group_by_combo)
+        
+        layout.addLayout(search_layout)
+        
+        # 输入时稍作合并再筛选
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(80)
+        self._filter_timer.timeout.connect(self.apply_filter)
+        
+        # 服务器列表 - 模型/视图结构，只渲染可见行
+        self.model = ServerListModel(self)
+        self.server_list = ServerTableView(self)
+        self.server_list.setModel(self.model)
+        self.server_list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.server_list.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.server_list.setShowGrid(False)
+        self.server_list.setWordWrap(False)
+        self.server_list.verticalHeader().hide()
+        # 固定行高，滚动与布局只与可见行有关
+        self.server_list.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.server_list.verticalHeader().setDefaultSectionSize(36)
+        self.server_list.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.server_list.horizontalHeader().setStretchLastSection(True)
+        self.server_list.setColumnWidth(0, 200)
+        self.server_list.setColumnWidth(1, 220)
+        self.server_list.setColumnWidth(2, 160)
         self.server_list.setStyleSheet("""
-            QListWidget {
+            QTableView {
                 background-color: rgba(255, 255, 255, 0.8);
                 color: black;
                 border: 1px solid #e0e0e0;
                 border-radius: 8px;
                 padding: 5px;
             }
-            QListWidget::item {
-                padding: 12px;
-                border-bottom: 1px solid #f0f0f0;
+            QTableView::item {
+                padding: 8px;
                 color: black;
             }
-            QListWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #0078d4;
                 color: white;
-                border-radius: 6px;
             }
-            QListWidget::item:selected:!active {
+            QTableView::item:selected:!active {
                 background-color: #0078d4;
                 color: white;
             }
-            QListWidget::item:hover {
+            QTableView::item:hover {
                 background-color: #e6f3ff;
                 color: black;
-                border-radius: 6px;
-            }
-            QListWidget::item:last {
-                border-bottom: none;
             }
         """)
-        self.server_list.itemDoubleClicked.connect(self.connect_to_selected)
-        self.server_list.itemSelectionChanged.connect(self.on_item_selection_changed)
+        self.server_list.clicked.connect(self.on_item_clicked)
+        self.server_list.doubleClicked.connect(self.on_item_double_clicked)
+        self.server_list.returnPressed.connect(self.connect_to_selected)
+        self.server_list.typed.connect(self.on_typed)
+        self.server_list.selectionModel().selectionChanged.connect(self.on_item_selection_changed)
+        self.server_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.server_list.customContextMenuRequested.connect(self.show_context_menu)
+        
+        # 悬停一段时间后发出serverHovered
+        self.server_list.setMouseTracking(True)
+        self.server_list.entered.connect(self.on_item_entered)
+        self._hovered_id = None
+        self._hover_timer = QTimer(self)
+        self._hover_timer.setSingleShot(True)
+        self._hover_timer.setInterval(300)
+        self._hover_timer.timeout.connect(self.on_hover_timeout)
         
         layout.addWidget(self.server_list)
+        self.on_item_selection_changed()
     
     def load_server_list(self):
-        self.server_list.clear()
-        
-        for server in self.servers:
-            item = ServerListWidgetItem(server)
-            self.server_list.addItem(item)
+        """从配置重新加载全部服务器"""
+        self.model.set_servers(config_manager.get_all_servers())
+    
+    def apply_filter(self):
+        self.model.set_query(self.search_edit.text())
+        if self.search_edit.text().strip():
+            # 选中最匹配的服务器，回车即可连接
+            first = self.model.first_server_index()
+            if first.isValid():
+                self.server_list.setCurrentIndex(first)
+    
+    def on_typed(self, text):
+        self.search_edit.setFocus()
+        self.search_edit.insert(text)
+    
+    def on_group_by_changed(self, index):
+        self.model.set_group_by(ServerListModel.GROUP_BY_TAG if index == 1 else ServerListModel.GROUP_BY_GROUP)
+    
+    def current_server(self) -> Optional[ServerConfig]:
+        if not self.server_list.selectionModel().hasSelection():
+            return None
+        return self.model.server_at(self.server_list.currentIndex())
+    
+    def on_item_clicked(self, index):
+        # 点击分组标题展开/折叠
+        if self.model.is_group_row(index.row()):
+            self.model.toggle_group(index.row())
+    
+    def on_item_double_clicked(self, index):
+        if self.model.server_at(index) is not None:
+            self.connect_to_selected()
+    
+    def on_item_entered(self, index):
+        server = self.model.server_at(index)
+        self._hovered_id = server.id if server else None
+        if server:
+            self._hover_timer.start()
+    
+    def on_hover_timeout(self):
+        index = self.server_list.indexAt(self.server_list.viewport().mapFromGlobal(QCursor.pos()))
+        server = self.model.server_at(index)
+        if server is not None and server.id == self._hovered_id:
+            self.serverHovered.emit(server)
     
-    def on_item_selection_changed(self):
+    def on_item_selection_changed(self, *args):
         # 当选择项目改变时更新按钮状态
-        current_item = self.server_list.currentItem()
-        has_selection = current_item is not None
+        has_selection = self.current_server() is not None
         self.edit_server_btn.setEnabled(has_selection)
         self.delete_server_btn.setEnabled(has_selection)
         self.connect_btn.setEnabled(has_selection)
     
     def add_server(self):
-        from config import ServerConfigDialog
+        from serverdialog import ServerConfigDialog
         dialog = ServerConfigDialog(self)
         if dialog.exec_() == dialog.Accepted:
             config = dialog.get_config()
             if config:
-                self.servers.append(config)
-                save_servers(self.servers)
-                self.load_server_list()
+                try:
+                    config_manager.add_server(config)
+                except Exception as e:
+                    InfoBar.error("错误", f"保存服务器失败: {e}", parent=self.window(),
+                                  position=InfoBarPosition.TOP)
+                    return
+                self.model.upsert_server(config)
     
     def edit_server(self):
-        current_item = self.server_list.currentItem()
-        if current_item:
-            server = current_item.data(0x0100)  # 获取服务器配置数据
-            from config import ServerConfigDialog
+        server = self.current_server()
+        if server:
+            from serverdialog import ServerConfigDialog
             dialog = ServerConfigDialog(self, server)
             if dialog.exec_() == dialog.Accepted:
                 updated_config = dialog.get_config()
                 if updated_config:
-                    # 找到服务器在列表中的索引并更新
-                    for i, s in enumerate(self.servers):
-                        if s.id == updated_config.id:
-                            self.servers[i] = updated_config
-                            break
-                    save_servers(self.servers)
-                    self.load_server_list()
+                    # 只更新这一台服务器对应的记录和行
+                    try:
+                        config_manager.update_server(updated_config)
+                    except Exception as e:
+                        InfoBar.error("错误", f"保存服务器失败: {e}", parent=self.window(),
+                                      position=InfoBarPosition.TOP)
+                        return
+                    self.model.upsert_server(updated_config)
         else:
             QMessageBox.warning(self, "警告", "请先选择一个服务器")
     
     def delete_server(self):
-        current_item = self.server_list.currentItem()
-        if current_item:
-            server = current_item.data(0x0100)  # 获取服务器配置数据
+        server = self.current_server()
+        if server:
             reply = QMessageBox.question(
                 self, "确认删除",
                 f"确定要删除服务器 '{server.name}' 吗？",
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply == QMessageBox.Yes:
-                self.servers = [s for s in self.servers if s.id != server.id]
-                save_servers(self.servers)
-                self.load_server_list()
+                config_manager.delete_server(server.id)
+                self.model.remove_server(server.id)
         else:
             QMessageBox.warning(self, "警告", "请先选择一个服务器")
     
     def connect_to_selected(self):
-        current_item = self.server_list.currentItem()
-        if current_item:
-            server = current_item.data(0x0100)  # 获取服务器配置数据
+        server = self.current_server()
+        if server:
             self.connectRequested.emit(server)
         else:
             QMessageBox.warning(self, "警告", "请先选择一个服务器")
     
     def show_context_menu(self, position):
+        index = self.server_list.indexAt(position)
+        if self.model.server_at(index) is None:
+            return
+        self.server_list.setCurrentIndex(index)
         menu = QMenu(self)
         
         connect_action = QAction("连接", self)
@@ -188,4 +607,4 @@ class ServerListWidget(QWidget):
         delete_action.triggered.connect(self.delete_server)
         menu.addAction(delete_action)
         
-        menu.exec_(self.server_list.viewport().mapToGlobal(position))
\ No newline at end of file
+        menu.exec_(self.server_list.viewport().mapToGlobal(position))
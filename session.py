@@ -0,0 +1,87 @@
+"""标签页会话的保存与恢复
+
+退出时把打开的标签页（服务器、标签名、SFTP目录以及可选的终端内容）保存到 session.json，
+终端内容用zlib压缩后以base64保存。下次启动时恢复为占位标签页，切换到该标签页时才连接，
+不会在启动时同时发起几十个连接。
+"""
+import base64
+import json
+import os
+import zlib
+from dataclasses import dataclass
+from typing import List, Tuple
+
+SESSION_FILE = "session.json"
+
+
+@dataclass
+class TabState:
+    server_id: str
+    name: str
+    sftp_path: str = "/"
+    scrollback: str = ""  # 终端内容（纯文本）
+
+
+def trim_scrollback(text: str, limit: int) -> str:
+    """只保留末尾不超过limit字节（UTF-8）的内容，从完整的一行开始"""
+    if limit <= 0 or not text:
+        return ""
+    data = text.encode('utf-8')
+    if len(data) <= limit:
+        return text
+    text = data[-limit:].decode('utf-8', errors='ignore')
+    newline = text.find('\n')
+    return text[newline + 1:] if newline >= 0 else text
+
+
+class SessionStore:
+    """读写 session.json"""
+    
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(os.path.dirname(__file__), SESSION_FILE)
+    
+    def load(self) -> Tuple[List[TabState], int]:
+        """上次保存的标签页与当前标签页的位置"""
+        try:
+            if not os.path.exists(self.path):
+                return [], 0
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            tabs = []
+            for item in data.get("tabs", []):
+                scrollback = item.get("scrollback", "")
+                if scrollback:
+                    scrollback = zlib.decompress(base64.b64decode(scrollback)).decode('utf-8', errors='replace')
+                tabs.append(TabState(item["server_id"], item.get("name", ""),
+                                     item.get("sftp_path", "/"), scrollback))
+            return tabs, int(data.get("current", 0))
+        except Exception as e:
+            print(f"加载会话失败: {e}")
+            return [], 0
+    
+    def save(self, tabs: List[TabState], current: int = 0):
+        items = []
+        for tab in tabs:
+            item = {"server_id": tab.server_id, "name": tab.name, "sftp_path": tab.sftp_path}
+            if tab.scrollback:
+                item["scrollback"] = base64.b64encode(zlib.compress(tab.scrollback.encode('utf-8'))).decode('ascii')
+            items.append(item)
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": 1, "current": current, "tabs": items}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"保存会话失败: {e}")
+    
+    def clear(self):
+        """删除保存的会话（关闭恢复功能时不在磁盘上保留终端内容）"""
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except OSError as e:
+            print(f"删除会话失败: {e}")
+
+
+# 全局会话存储
+session_store = SessionStore()
@@ -1,26 +1,153 @@
-from PyQt5.QtCore import pyqtSignal, Qt
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QFrame, QFileDialog, QScrollArea
+from PyQt5.QtCore import pyqtSignal, Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QHBoxLayout, QFrame, QFileDialog, QScrollArea,
+                            QDialog, QHeaderView, QAbstractItemView, QInputDialog, QLineEdit, QMessageBox)
 from PyQt5.QtGui import QPixmap
 from qfluentwidgets import (SettingCardGroup, SettingCard,
                            ComboBox, PushButton,
                            InfoBar, InfoBarPosition, CardWidget, SubtitleLabel, 
-                           BodyLabel, Slider, setTheme, Theme, FluentIcon as FIF)
+                           BodyLabel, Slider, SwitchButton, setTheme, Theme, FluentIcon as FIF,
+                           PrimaryPushButton, TableView)
 
 import os
 import json
 
-from config import load_servers, save_servers
+from appsettings import app_settings, BACKGROUND, BLUR, WARM_POOL, RESTORE_TABS, ENGINE, LAG_MONITOR
+from config import config_manager
+from vault import vault, VaultError
+import importers
+from tasks import Task
+
+class ImportWorker(Task):
+    """后台解析导入文件并生成预览"""
+    plan_ready = pyqtSignal(object)
+    error_occurred = pyqtSignal(str)
+    
+    def __init__(self, path: str, fmt: str = None):
+        super().__init__()
+        self.path = path
+        self.fmt = fmt
+    
+    def run(self):
+        try:
+            plan = importers.build_plan(importers.parse_file(self.path, self.fmt))
+            self.plan_ready.emit(plan)
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+
+class ImportDiffModel(QAbstractTableModel):
+    """导入预览表格：每行一条新增或更新"""
+    
+    COLUMNS = ["操作", "名称", "地址", "变化"]
+    
+    def __init__(self, plan, parent=None):
+        super().__init__(parent)
+        self._rows = [("新增", None, s) for s in plan.added] + [("更新", old, new) for old, new in plan.updated]
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        action, old, new = self._rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return action
+        if column == 1:
+            return new.name
+        if column == 2:
+            return f"{new.username}@{new.host}:{new.port}" if new.username else f"{new.host}:{new.port}"
+        if old is None:
+            return new.description
+        changes = []
+        for name, label in (("name", "名称"), ("key_file", "密钥"), ("proxy_jump", "跳板机"),
+                            ("group", "分组"), ("description", "描述")):
+            if getattr(old, name) != getattr(new, name):
+                changes.append(f"{label}: {getattr(old, name) or '空'} → {getattr(new, name)}")
+        if old.password != new.password:
+            changes.append("密码")
+        if old.tags != new.tags:
+            changes.append(f"标签: {', '.join(new.tags)}")
+        return "; ".join(changes)
+
+
+class ImportPreviewDialog(QDialog):
+    """导入前的预览（不修改数据），确认后再写入"""
+    
+    def __init__(self, plan, source: str, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("导入预览")
+        self.resize(760, 520)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(15)
+        
+        title = SubtitleLabel("导入预览", self)
+        title.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(title)
+        
+        summary = (f"{source}：共 {plan.total} 条，新增 {len(plan.added)}，更新 {len(plan.updated)}，"
+                   f"未变化 {plan.unchanged}，重复 {plan.duplicates}")
+        layout.addWidget(BodyLabel(summary, self))
+        
+        self.table = TableView(self)
+        self.table.setModel(ImportDiffModel(plan, self))
+        self.table.verticalHeader().hide()
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(32)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setWordWrap(False)
+        self.table.setColumnWidth(0, 60)
+        self.table.setColumnWidth(1, 160)
+        self.table.setColumnWidth(2, 220)
+        layout.addWidget(self.table)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        
+        self.cancel_btn = PushButton("取消", self)
+        self.cancel_btn.clicked.connect(self.reject)
+        button_layout.addWidget(self.cancel_btn)
+        
+        self.ok_btn = PrimaryPushButton("导入", self)
+        self.ok_btn.setEnabled(bool(plan.added or plan.updated))
+        self.ok_btn.clicked.connect(self.accept)
+        button_layout.addWidget(self.ok_btn)
+        
+        layout.addLayout(button_layout)
+
+
+def prompt_vault_unlock(parent) -> bool:
+    """弹出主密码输入框解锁凭据库，返回是否已解锁"""
+    while not vault.is_unlocked():
+        password, ok = QInputDialog.getText(parent, "解锁凭据库", "主密码:", QLineEdit.Password)
+        if not ok:
+            return False
+        try:
+            vault.unlock(password)
+        except VaultError as e:
+            QMessageBox.warning(parent, "警告", str(e))
+    # 锁定期间新保存的密码还是明文，解锁后补加密
+    config_manager.seal_passwords()
+    return True
 
-# 配置文件路径
-CONFIG_FILE = "app_config.json"
 
 class SettingInterface(QWidget):
-    backgroundChanged = pyqtSignal(str)
+    serversImported = pyqtSignal()
     
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        self.config_path = os.path.join(os.path.dirname(__file__), CONFIG_FILE)
-        self.current_bg_path = ""
         self.scroll_area = None
         self.setAttribute(Qt.WA_TranslucentBackground, False)
         self.setup_ui()
@@ -89,6 +216,53 @@ class SettingInterface(QWidget):
         
         personalization_group.addSettingCard(self.blur_card)
         
+        # 连接设置组
+        connection_group = SettingCardGroup('连接', self)
+        scroll_layout.addWidget(connection_group)
+        
+        # 预连接
+        self.warm_pool_card = SettingCard(FIF.SPEED_HIGH, '预连接', '启动时为常用服务器提前建立连接，悬停服务器时也会预连接', self)
+        self.warm_pool_switch = SwitchButton(self)
+        self.warm_pool_switch.setOnText('开')
+        self.warm_pool_switch.setOffText('关')
+        self.warm_pool_switch.checkedChanged.connect(self.on_warm_pool_changed)
+        self.warm_pool_card.hBoxLayout.addWidget(self.warm_pool_switch)
+        self.warm_pool_card.hBoxLayout.addSpacing(16)
+        
+        connection_group.addSettingCard(self.warm_pool_card)
+        
+        # 恢复标签页
+        self.restore_tabs_card = SettingCard(FIF.HISTORY, '恢复标签页', '启动时恢复上次打开的标签页和终端内容，切换到标签页时才连接', self)
+        self.restore_tabs_switch = SwitchButton(self)
+        self.restore_tabs_switch.setOnText('开')
+        self.restore_tabs_switch.setOffText('关')
+        self.restore_tabs_switch.checkedChanged.connect(self.on_restore_tabs_changed)
+        self.restore_tabs_card.hBoxLayout.addWidget(self.restore_tabs_switch)
+        self.restore_tabs_card.hBoxLayout.addSpacing(16)
+        
+        connection_group.addSettingCard(self.restore_tabs_card)
+        
+        # 独立进程引擎
+        self.engine_card = SettingCard(FIF.DEVELOPER_TOOLS, '独立进程引擎', '在单独的进程中处理SSH连接与加解密，大量输出时界面更流畅（对新打开的标签页生效）', self)
+        self.engine_switch = SwitchButton(self)
+        self.engine_switch.setOnText('开')
+        self.engine_switch.setOffText('关')
+        self.engine_switch.checkedChanged.connect(self.on_engine_changed)
+        self.engine_card.hBoxLayout.addWidget(self.engine_switch)
+        self.engine_card.hBoxLayout.addSpacing(16)
+        
+        connection_group.addSettingCard(self.engine_card)
+        
+        # 凭据加密
+        self.vault_card = SettingCard(FIF.FINGERPRINT, '加密保存密码', '用主密码加密保存服务器密码，每次启动只需解锁一次', self)
+        self.vault_button = PushButton('', self)
+        self.vault_button.clicked.connect(self.on_vault_clicked)
+        self.vault_card.hBoxLayout.addWidget(self.vault_button)
+        self.vault_card.hBoxLayout.addSpacing(16)
+        self.update_vault_card()
+        
+        connection_group.addSettingCard(self.vault_card)
+        
         # 数据管理组
         data_group = SettingCardGroup('数据管理', self)
         #data_group.setStyleSheet("SettingCardGroup { background-color: rgba(255, 255, 255, 0.9); border-radius: 8px; }")
@@ -105,15 +279,42 @@ class SettingInterface(QWidget):
         data_group.addSettingCard(export_card)
         
         # 导入服务器列表
-        import_card = SettingCard(FIF.FOLDER_ADD, '导入服务器列表', '从JSON文件导入服务器配置', self)
+        import_card = SettingCard(FIF.FOLDER_ADD, '导入服务器列表',
+                                  '支持JSON、CSV、Ansible清单(INI/YAML)与OpenSSH配置，按主机+端口+用户名去重', self)
+        import_card.hBoxLayout.addSpacing(10)
+        
+        import_ssh_button = PushButton('~/.ssh/config', self)
+        import_ssh_button.clicked.connect(self.import_ssh_config)
+        import_card.hBoxLayout.addWidget(import_ssh_button)
+        
         import_card.hBoxLayout.addSpacing(10)
         
         import_button = PushButton('导入', self)
         import_button.clicked.connect(self.import_servers)
         import_card.hBoxLayout.addWidget(import_button)
+        import_card.hBoxLayout.addSpacing(16)
         
         data_group.addSettingCard(import_card)
         
+        # 诊断组
+        diagnostics_group = SettingCardGroup('诊断', self)
+        scroll_layout.addWidget(diagnostics_group)
+        
+        # 卡顿检测
+        self.lag_monitor_card = SettingCard(FIF.SPEED_OFF, '卡顿检测', '界面卡顿时记录当时的调用位置，可导出按位置汇总的报告', self)
+        self.lag_report_button = PushButton('导出报告', self)
+        self.lag_report_button.clicked.connect(self.on_export_lag_report)
+        self.lag_monitor_card.hBoxLayout.addWidget(self.lag_report_button)
+        self.lag_monitor_card.hBoxLayout.addSpacing(10)
+        self.lag_monitor_switch = SwitchButton(self)
+        self.lag_monitor_switch.setOnText('开')
+        self.lag_monitor_switch.setOffText('关')
+        self.lag_monitor_switch.checkedChanged.connect(self.on_lag_monitor_changed)
+        self.lag_monitor_card.hBoxLayout.addWidget(self.lag_monitor_switch)
+        self.lag_monitor_card.hBoxLayout.addSpacing(16)
+        
+        diagnostics_group.addSettingCard(self.lag_monitor_card)
+        
         # 关于组
         about_group = SettingCardGroup('关于', self)
         #about_group.setStyleSheet("SettingCardGroup { background-color: rgba(255, 255, 255, 0.9); border-radius: 8px; }")
@@ -140,45 +341,97 @@ class SettingInterface(QWidget):
         
         # 加载配置
         self.load_config()
+        app_settings.changed.connect(self.on_setting_changed)
         
     def on_blur_changed(self, value: int):
         self.blur_value_label.setText(f'{value}%')
-        self.backgroundChanged.emit(self.get_background_path())
-        self.save_config()
-        
-    def get_blur_value(self) -> int:
-        return self.blur_slider.value()
+        app_settings.set(BLUR, value)
         
-    def get_background_path(self) -> str:
-        return self.current_bg_path
+    def on_warm_pool_changed(self, checked: bool):
+        app_settings.set(WARM_POOL, checked)
+    
+    def on_restore_tabs_changed(self, checked: bool):
+        app_settings.set(RESTORE_TABS, checked)
+    
+    def on_engine_changed(self, checked: bool):
+        app_settings.set(ENGINE, checked)
+    
+    def on_lag_monitor_changed(self, checked: bool):
+        app_settings.set(LAG_MONITOR, checked)
+    
+    def on_export_lag_report(self):
+        from lagmonitor import lag_monitor
+        if not lag_monitor.stall_count and not lag_monitor.lag.count:
+            InfoBar.warning("提示", "还没有记录，请先开启卡顿检测", parent=self.window(),
+                           position=InfoBarPosition.TOP)
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出卡顿报告", "lag_report.json", "JSON 文件 (*.json)")
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(lag_monitor.report(), f, ensure_ascii=False, indent=2)
+            InfoBar.success("成功", f"已导出 {lag_monitor.stall_count} 次卡顿记录", parent=self.window(),
+                           position=InfoBarPosition.TOP)
+        except OSError as e:
+            InfoBar.error("错误", f"导出失败: {e}", parent=self.window(),
+                         position=InfoBarPosition.TOP)
+    
+    def on_setting_changed(self, key: str):
+        """设置变化（界面操作或外部编辑配置文件）时同步控件，主窗口自己监听需要的设置"""
+        self.load_config()
+    
+    def update_vault_card(self):
+        if not vault.is_initialized():
+            self.vault_button.setText('设置主密码')
+        elif vault.is_unlocked():
+            self.vault_button.setText('锁定')
+        else:
+            self.vault_button.setText('解锁')
+    
+    def on_vault_clicked(self):
+        if not vault.is_initialized():
+            password, ok = QInputDialog.getText(self, "设置主密码", "主密码:", QLineEdit.Password)
+            if not ok or not password:
+                return
+            confirm, ok = QInputDialog.getText(self, "设置主密码", "再次输入主密码:", QLineEdit.Password)
+            if not ok:
+                return
+            if confirm != password:
+                QMessageBox.warning(self, "警告", "两次输入的主密码不一致")
+                return
+            try:
+                vault.setup(password)
+                count = config_manager.seal_passwords()
+            except Exception as e:
+                InfoBar.error("错误", f"设置主密码失败: {e}", parent=self.window(),
+                              position=InfoBarPosition.TOP)
+                return
+            InfoBar.success("成功", f"已加密 {count} 个服务器的密码", parent=self.window(),
+                            position=InfoBarPosition.TOP)
+        elif vault.is_unlocked():
+            vault.lock()
+        else:
+            prompt_vault_unlock(self)
+        self.update_vault_card()
         
     def select_background(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "选择背景图片", "", "图片文件 (*.png *.jpg *.jpeg *.bmp)"
         )
         if file_path:
-            self.current_bg_path = file_path
-            # 只显示文件名，避免路径过长导致遮挡
-            file_name = os.path.basename(file_path)
-            if len(file_name) > 30:
-                file_name = file_name[:27] + "..."
-            self.bg_card.contentLabel.setText(file_name)
-            self.backgroundChanged.emit(file_path)
-            self.save_config()
+            app_settings.set(BACKGROUND, file_path)
             InfoBar.success("成功", "背景图片已设置", parent=self.window(),
                            position=InfoBarPosition.TOP)
     
     def reset_background(self):
-        self.current_bg_path = ""
-        self.bg_card.contentLabel.setText("未设置")
-        self.backgroundChanged.emit("")
-        self.save_config()
+        app_settings.set(BACKGROUND, "")
         InfoBar.success("成功", "背景图片已清除", parent=self.window(),
                        position=InfoBarPosition.TOP)
     
     def export_servers(self):
         """导出服务器列表"""
-        servers = load_servers()
+        servers = config_manager.get_all_servers()
         if not servers:
             InfoBar.warning("提示", "没有可导出的服务器", parent=self.window(),
                            position=InfoBarPosition.TOP)
@@ -201,80 +454,79 @@ class SettingInterface(QWidget):
     def import_servers(self):
         """导入服务器列表"""
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "导入服务器列表", "", "JSON文件 (*.json)"
+            self, "导入服务器列表", "",
+            "所有支持的格式 (*.json *.csv *.ini *.cfg *.yml *.yaml hosts config);;"
+            "JSON文件 (*.json);;CSV文件 (*.csv);;Ansible清单 (*.ini *.cfg *.yml *.yaml hosts);;"
+            "OpenSSH配置 (config *.conf);;所有文件 (*)"
         )
         if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+            self.start_import(file_path)
                 
-                from config import ServerConfig
-                new_servers = [ServerConfig.from_dict(item) for item in data]
-                
-                # 加载现有服务器
-                existing_servers = load_servers()
-                
-                # 合并服务器（避免重复）
-                existing_ids = {s.id for s in existing_servers}
-                for server in new_servers:
-                    if server.id not in existing_ids:
-                        existing_servers.append(server)
+    def import_ssh_config(self):
+        """从 ~/.ssh/config 导入"""
+        path = os.path.expanduser("~/.ssh/config")
+        if not os.path.exists(path):
+            InfoBar.warning("提示", "未找到 ~/.ssh/config", parent=self.window(),
+                           position=InfoBarPosition.TOP)
+            return
+        self.start_import(path, "ssh_config")
                 
-                # 保存
-                save_servers(existing_servers)
+    def start_import(self, path: str, fmt: str = None):
+        fmt = fmt or importers.detect_format(path)
+        self.import_worker = ImportWorker(path, fmt)
+        self.import_worker.plan_ready.connect(
+            lambda plan: self.on_import_plan_ready(plan, f"{importers.FORMATS[fmt]} {os.path.basename(path)}")
+        )
+        self.import_worker.error_occurred.connect(
+            lambda error: InfoBar.error("错误", f"导入失败: {error}", parent=self.window(),
+                                        position=InfoBarPosition.TOP)
+        )
+        self.import_worker.start()
                 
-                InfoBar.success("成功", f"已导入 {len(new_servers)} 个服务器", parent=self.window(),
-                               position=InfoBarPosition.TOP)
-            except Exception as e:
-                InfoBar.error("错误", f"导入失败: {str(e)}", parent=self.window(),
-                             position=InfoBarPosition.TOP)
+    def on_import_plan_ready(self, plan, source: str):
+        dialog = ImportPreviewDialog(plan, source, self.window())
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            importers.apply_plan(plan)
+            self.serversImported.emit()
+            InfoBar.success("成功", f"已导入 {len(plan.added)} 个服务器，更新 {len(plan.updated)} 个",
+                           parent=self.window(), position=InfoBarPosition.TOP)
+        except Exception as e:
+            InfoBar.error("错误", f"导入失败: {str(e)}", parent=self.window(),
+                         position=InfoBarPosition.TOP)
     
     def load_config(self):
-        """加载配置"""
-        try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+        """按内存中的设置刷新控件（不触发控件自身的信号）"""
+        bg_path = app_settings.get(BACKGROUND)
+        if bg_path:
+            # 只显示文件名，避免路径过长导致遮挡
+            file_name = os.path.basename(bg_path)
+            if len(file_name) > 30:
+                file_name = file_name[:27] + "..."
+            self.bg_card.contentLabel.setText(file_name)
+        else:
+            self.bg_card.contentLabel.setText("未设置")
                     
-                    # 加载背景
-                    bg_path = config.get('background', '')
-                    if bg_path:
-                        self.current_bg_path = bg_path
-                        self.bg_card.contentLabel.setText(bg_path)
-                    else:
-                        self.current_bg_path = ""
-                        self.bg_card.contentLabel.setText("未设置")
+        blur = app_settings.get(BLUR)
+        self.blur_slider.blockSignals(True)
+        self.blur_slider.setValue(blur)
+        self.blur_slider.blockSignals(False)
+        self.blur_value_label.setText(f'{blur}%')
                     
-                    # 加载模糊程度
-                    blur = config.get('blur', 0)
-                    self.blur_slider.setValue(blur)
-                    self.blur_value_label.setText(f'{blur}%')
-        except Exception as e:
-            print(f"加载配置失败: {e}")
-    
-    def save_config(self):
-        """保存配置"""
-        try:
-            config = {}
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-            
-            config['background'] = self.current_bg_path
-            config['blur'] = self.blur_slider.value()
-            
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存配置失败: {e}")
-    
-    def load_background_config(self) -> str:
-        """加载背景配置"""
-        try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    return config.get('background', '')
-        except Exception as e:
-            print(f"加载背景配置失败: {e}")
-        return ""
+        self.warm_pool_switch.blockSignals(True)
+        self.warm_pool_switch.setChecked(app_settings.get(WARM_POOL))
+        self.warm_pool_switch.blockSignals(False)
+                    
+        self.restore_tabs_switch.blockSignals(True)
+        self.restore_tabs_switch.setChecked(app_settings.get(RESTORE_TABS))
+        self.restore_tabs_switch.blockSignals(False)
+                    
+        self.engine_switch.blockSignals(True)
+        self.engine_switch.setChecked(app_settings.get(ENGINE))
+        self.engine_switch.blockSignals(False)
+                    
+        self.lag_monitor_switch.blockSignals(True)
+        self.lag_monitor_switch.setChecked(app_settings.get(LAG_MONITOR))
+        self.lag_monitor_switch.blockSignals(False)
+                    
\ No newline at end of file
@@ -229,6 +229,9 @@ class SFTPFileInterface(QWidget):
         self.current_path = "/"
         self.transfer_worker = None
         self.is_collapsed = False  # 是否已折叠
+        self.hibernating = False  # 所在标签页不可见时休眠
+        self._refresh_pending = False  # 休眠期间被推迟的目录刷新
+        self._pending_progress = None  # 休眠期间最新的传输进度
         self.setup_ui()
         
     def setup_ui(self):
@@ -481,9 +484,26 @@ class SFTPFileInterface(QWidget):
             self.file_tree.addTopLevelItem(item)
     
     def refresh(self):
-        """刷新当前目录"""
+        """刷新当前目录；休眠时推迟到重新显示"""
+        if self.hibernating:
+            self._refresh_pending = True
+            return
         self.load_directory()
     
+    def set_hibernating(self, hibernating: bool):
+        """标签页隐藏时暂停目录刷新和进度条更新，重新显示时补上"""
+        if hibernating == self.hibernating:
+            return
+        self.hibernating = hibernating
+        if hibernating:
+            return
+        if self._pending_progress is not None:
+            self.on_transfer_progress(*self._pending_progress)
+            self._pending_progress = None
+        if self._refresh_pending:
+            self._refresh_pending = False
+            self.load_directory()
+    
     def go_home(self):
         """返回主目录"""
         # 直接跳转到 /root 目录
@@ -555,16 +575,12 @@ class SFTPFileInterface(QWidget):
         parent_dir = os.path.dirname(old_path)
         new_path = os.path.join(parent_dir, new_name).replace("\\", "/")
         
-        try:
-            # 使用SFTP重命名
-            sftp = self.ssh_client.get_sftp()
-            if sftp:
-                sftp.rename(old_path, new_path)
-                InfoBar.success("成功", f"已重命名为: {new_name}", parent=self.window(),
-                               position=InfoBarPosition.TOP)
-                self.refresh()
-        except Exception as e:
-            InfoBar.error("错误", f"重命名失败: {str(e)}", parent=self.window(),
+        if self.ssh_client.rename(old_path, new_path):
+            InfoBar.success("成功", f"已重命名为: {new_name}", parent=self.window(),
+                           position=InfoBarPosition.TOP)
+            self.refresh()
+        else:
+            InfoBar.error("错误", "重命名失败", parent=self.window(),
                          position=InfoBarPosition.TOP)
     
     def on_delete_requested(self, paths: list):
@@ -649,12 +665,21 @@ class SFTPFileInterface(QWidget):
         self.transfer_worker.finished_signal.connect(self.on_download_finished)
         self.transfer_worker.start()
     
+    def cancel_transfer(self):
+        """取消正在进行的传输（关闭标签页时）"""
+        if self.transfer_worker is not None:
+            self.transfer_worker.cancel()
+    
     def on_transfer_progress(self, transferred: int, total: int):
+        if self.hibernating:
+            self._pending_progress = (transferred, total)
+            return
         if total > 0:
             percent = int(transferred * 100 / total)
             self.progress_bar.setValue(percent)
     
     def on_upload_finished(self, success: bool, message: str):
+        self._pending_progress = None
         self.progress_bar.setVisible(False)
         self.progress_label.setText("")
         
@@ -667,6 +692,7 @@ class SFTPFileInterface(QWidget):
                          position=InfoBarPosition.TOP)
     
     def on_download_finished(self, success: bool, message: str):
+        self._pending_progress = None
         self.progress_bar.setVisible(False)
         self.progress_label.setText("")
         
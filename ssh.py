@@ -1,18 +1,24 @@
-"""SSH连接管理模块"""
-import os
-import stat
+"""SSH连接管理模块（Qt部分）
+
+连接本身在 connection.py 中实现，这里的 SSHClient 把它的回调接到Qt信号上，
+以及在共享任务池中执行的命令、传输、连接等任务。
+"""
 import time
-import socket
+import queue
+import select
 import threading
-from typing import Optional, Callable, List, Tuple
-import paramiko
-from PyQt5.QtCore import QObject, pyqtSignal, QThread
+from collections import deque
+from typing import Optional, Tuple
+from PyQt5.QtCore import QObject, pyqtSignal
 
 from config import ServerConfig
+from connection import SSHConnection, tcp_ping
+from predict import PASSWORD_PROMPT_RE
+from tasks import Task, INTERACTIVE, COMMAND, TRANSFER, BACKGROUND, PRIORITY_HIGH, PRIORITY_LOW
 
 
-class SSHClient(QObject):
-    """支持实时输出的SSH客户端封装"""
+class SSHClient(SSHConnection, QObject):
+    """支持实时输出的SSH客户端封装（SSHConnection 的回调以Qt信号发出）"""
     
     # 信号定义
     connected = pyqtSignal()
@@ -21,260 +27,140 @@ class SSHClient(QObject):
     error_occurred = pyqtSignal(str)
     
     def __init__(self, server: ServerConfig, parent=None):
-        super().__init__(parent)
-        self.server = server
-        self.client: Optional[paramiko.SSHClient] = None
-        self.sftp: Optional[paramiko.SFTPClient] = None
-        self.channel = None
-        self.current_channel = None  # 当前执行命令的channel
-        self._connected = False
-        self.hostname = ""
-        self.current_path = "~"
-        
-    def connect(self) -> bool:
-        """连接到服务器"""
-        try:
-            self.client = paramiko.SSHClient()
-            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            if self.server.use_key and self.server.key_file:
-                # 使用密钥认证
-                key = paramiko.RSAKey.from_private_key_file(self.server.key_file)
-                self.client.connect(
-                    hostname=self.server.host,
-                    port=self.server.port,
-                    username=self.server.username,
-                    pkey=key,
-                    timeout=10
-                )
-            else:
-                # 使用密码认证
-                self.client.connect(
-                    hostname=self.server.host,
-                    port=self.server.port,
-                    username=self.server.username,
-                    password=self.server.password,
-                    timeout=10
-                )
-            
-            self._connected = True
-            # 获取主机名
-            try:
-                _, hostname_output, _ = self.client.exec_command("hostname")
-                self.hostname = hostname_output.read().decode('utf-8', errors='replace').strip()
-            except:
-                self.hostname = self.server.host
-            
-            self.connected.emit()
-            return True
-            
-        except paramiko.AuthenticationException:
-            self.error_occurred.emit("认证失败：用户名或密码错误")
-            return False
-        except paramiko.SSHException as e:
-            self.error_occurred.emit(f"SSH错误：{str(e)}")
-            return False
-        except TimeoutError:
-            self.error_occurred.emit(f"连接超时：无法连接到 {self.server.host}:{self.server.port}")
-            return False
-        except OSError as e:
-            if "No route to host" in str(e) or "Network is unreachable" in str(e):
-                self.error_occurred.emit(f"网络错误：无法访问 {self.server.host}")
-            elif "Connection refused" in str(e):
-                self.error_occurred.emit(f"连接被拒绝：请检查端口 {self.server.port} 是否正确")
-            else:
-                self.error_occurred.emit(f"连接错误：{str(e)}")
-            return False
-        except Exception as e:
-            error_msg = str(e)
-            if "timed out" in error_msg.lower():
-                self.error_occurred.emit(f"连接超时：请检查IP地址和端口是否正确")
-            else:
-                self.error_occurred.emit(f"连接失败：{error_msg}")
-            return False
-    
-    def disconnect(self):
-        """断开连接"""
-        try:
-            if self.sftp:
-                self.sftp.close()
-                self.sftp = None
-            if self.channel:
-                self.channel.close()
-                self.channel = None
-            if self.client:
-                self.client.close()
-                self.client = None
-            self._connected = False
-            self.disconnected.emit()
-        except Exception as e:
-            self.error_occurred.emit(f"断开连接失败: {str(e)}")
-    
-    def is_connected(self) -> bool:
-        """检查是否已连接"""
-        return self._connected and self.client is not None
-    
-    def execute_command(self, command: str) -> Tuple[str, str]:
-        """执行命令（快速命令，等待完成）"""
-        if not self.is_connected():
-            return "", "未连接到服务器"
-        
-        try:
-            stdin, stdout, stderr = self.client.exec_command(command, timeout=30)
-            output = stdout.read().decode('utf-8', errors='replace')
-            error = stderr.read().decode('utf-8', errors='replace')
-            return output, error
-        except Exception as e:
-            return "", str(e)
-    
-    def execute_command_interactive(self, command: str):
-        """执行交互式命令（支持实时输出和中断）"""
-        if not self.is_connected():
-            return None
-        
-        try:
-            transport = self.client.get_transport()
-            self.current_channel = transport.open_session()
-            self.current_channel.get_pty()  # 获取伪TTY，支持Ctrl+C
-            self.current_channel.exec_command(command)
-            return self.current_channel
-        except Exception as e:
-            self.error_occurred.emit(f"执行命令失败: {str(e)}")
-            return None
-    
-    def send_ctrl_c(self):
-        """发送Ctrl+C中断信号"""
-        if self.current_channel:
-            try:
-                self.current_channel.send('\x03')  # Ctrl+C
-            except:
-                pass
-    
-    def close_current_channel(self):
-        """关闭当前命令channel"""
-        if self.current_channel:
-            try:
-                self.current_channel.close()
-            except:
-                pass
-            self.current_channel = None
-    
-    def get_sftp(self) -> Optional[paramiko.SFTPClient]:
-        """获取SFTP客户端"""
-        if not self.is_connected():
-            return None
-        
-        try:
-            if self.sftp is None:
-                self.sftp = self.client.open_sftp()
-            return self.sftp
-        except Exception as e:
-            self.error_occurred.emit(f"打开SFTP失败: {str(e)}")
-            return None
-    
-    def list_dir(self, path: str) -> List[Tuple[str, bool, int]]:
-        """列出目录内容，返回 (文件名, 是否为目录, 文件大小) 列表"""
-        sftp = self.get_sftp()
-        if not sftp:
-            return []
-        
-        try:
-            result = []
-            for attr in sftp.listdir_attr(path):
-                is_dir = stat.S_ISDIR(attr.st_mode)
-                result.append((attr.filename, is_dir, attr.st_size))
-            return sorted(result, key=lambda x: (not x[1], x[0].lower()))
-        except Exception as e:
-            self.error_occurred.emit(f"列出目录失败: {str(e)}")
-            return []
-    
-    def download_file(self, remote_path: str, local_path: str, 
-                     progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
-        """下载文件"""
-        sftp = self.get_sftp()
-        if not sftp:
-            return False
-        
-        try:
-            sftp.get(remote_path, local_path, callback=progress_callback)
-            return True
-        except Exception as e:
-            self.error_occurred.emit(f"下载失败: {str(e)}")
-            return False
-    
-    def upload_file(self, local_path: str, remote_path: str,
-                   progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
-        """上传文件"""
-        sftp = self.get_sftp()
-        if not sftp:
-            return False
-        
-        try:
-            sftp.put(local_path, remote_path, callback=progress_callback)
-            return True
-        except Exception as e:
-            self.error_occurred.emit(f"上传失败: {str(e)}")
-            return False
-    
-    def mkdir(self, path: str) -> bool:
-        """创建目录"""
-        sftp = self.get_sftp()
-        if not sftp:
-            return False
-        
-        try:
-            sftp.mkdir(path)
-            return True
-        except Exception as e:
-            self.error_occurred.emit(f"创建目录失败: {str(e)}")
-            return False
-    
-    def remove_file(self, path: str) -> bool:
-        """删除文件"""
-        sftp = self.get_sftp()
-        if not sftp:
-            return False
-        
-        try:
-            sftp.remove(path)
-            return True
-        except Exception as e:
-            self.error_occurred.emit(f"删除文件失败: {str(e)}")
-            return False
-    
-    def rmdir(self, path: str) -> bool:
-        """删除目录"""
-        sftp = self.get_sftp()
-        if not sftp:
-            return False
-        
-        try:
-            sftp.rmdir(path)
-            return True
-        except Exception as e:
-            self.error_occurred.emit(f"删除目录失败: {str(e)}")
-            return False
+        QObject.__init__(self, parent)
+        SSHConnection.__init__(self, server)
+        self.on_connected = self.connected.emit
+        self.on_disconnected = self.disconnected.emit
+        self.on_error = self.error_occurred.emit
+    
+    def command_worker(self, command: str) -> "SSHWorker":
+        """创建执行交互式命令并实时输出的工作线程"""
+        return SSHWorker(self, command)
+
 
+def looks_like_input_prompt(data: str) -> bool:
+    """输出是否像是在等待用户输入（确认提示或密码提示）"""
+    return ('[Y/n]' in data or '[y/N]' in data or 'yes/no' in data.lower()
+            or bool(PASSWORD_PROMPT_RE.search(data.rsplit('\n', 1)[-1])))
+
+
+class InputLatencyStats:
+    """按键到上线（channel.send 完成）的延迟统计，单位毫秒"""
+    
+    def __init__(self, max_samples: int = 512):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+    
+    def record(self, latency_ms: float):
+        with self._lock:
+            self._samples.append(latency_ms)
+    
+    def summary(self) -> dict:
+        """返回 count/last/p50/p99/max 统计"""
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return {"count": 0, "last": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(samples)
+        return {
+            "count": len(samples),
+            "last": samples[-1],
+            "p50": ordered[len(ordered) // 2],
+            "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "max": ordered[-1],
+        }
 
-class SSHWorker(QThread):
-    """支持实时输出的SSH命令执行工作线程"""
+
+class SSHWorker(Task):
+    """支持实时输出的SSH命令执行任务（执行期间占用 command 池的一个线程）"""
+    
+    pool_name = COMMAND
     
     output_ready = pyqtSignal(str)
     error_ready = pyqtSignal(str)
     finished_signal = pyqtSignal()
     input_requested = pyqtSignal()  # 请求用户输入信号
+    echo_rtt = pyqtSignal(float)  # 按键发送到收到回显的往返时间（毫秒）
     
     def __init__(self, ssh_client: SSHClient, command: str, parent=None):
         super().__init__(parent)
         self.ssh_client = ssh_client
         self.command = command
-        self._stop_requested = False
         self.channel = None
-        self.input_queue = []  # 输入队列
+        # 线程安全的输入队列，由专用写线程阻塞读取，按键入队后立即发送
+        self._input_queue: "queue.Queue[Optional[Tuple[str, float]]]" = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self.input_latency = InputLatencyStats()
+        self._echo_sent_at: Optional[float] = None  # 等待回显的按键发送时刻
+        self._record = None  # channel的收发字节统计
+        self._sink = None  # 标签页休眠时输出直接写入的缓存（terminal.OutputRing）
+        self._sink_lock = threading.Lock()
+    
+    def set_output_sink(self, sink):
+        """标签页休眠时设置输出缓存：之后的输出不解码、不发信号，原始字节直接写入缓存；
+        传入None恢复逐块发信号（可在任意线程调用）"""
+        with self._sink_lock:
+            self._sink = sink
+    
+    def _hold(self, data: bytes, is_error: bool = False) -> bool:
+        """设置了输出缓存时写入缓存并返回True"""
+        with self._sink_lock:
+            if self._sink is None:
+                return False
+            self._sink.append(data, is_error)
+            return True
     
     def send_input(self, text: str):
-        """发送用户输入到远程进程"""
-        self.input_queue.append(text)
+        """发送用户输入到远程进程（可在任意线程调用）"""
+        self._input_queue.put((text, time.perf_counter()))
+    
+    def _writer_loop(self):
+        """写线程：队列一有数据就写入channel，并记录按键到上线的延迟"""
+        while True:
+            item = self._input_queue.get()
+            if item is None:
+                break
+            text, queued_at = item
+            try:
+                data = text.encode('utf-8')
+                self.channel.sendall(data)
+            except Exception:
+                break
+            self._record.add_out(len(data))
+            sent_at = time.perf_counter()
+            self.input_latency.record((sent_at - queued_at) * 1000)
+            if self._echo_sent_at is None:
+                self._echo_sent_at = sent_at
+    
+    def _recv(self, stderr: bool = False) -> bytes:
+        """读取一块输出并计入channel的字节统计"""
+        data = self.channel.recv_stderr(4096) if stderr else self.channel.recv(4096)
+        self._record.add_in(len(data))
+        return data
+    
+    def _emit(self, data: bytes, is_error: bool = False):
+        """输出一块数据：休眠时写入缓存，否则解码后发信号"""
+        if not data or self._hold(data, is_error):
+            return
+        text = data.decode('utf-8', errors='replace')
+        if is_error:
+            self.error_ready.emit(text)
+            return
+        if self._echo_sent_at is not None:
+            self.echo_rtt.emit((time.perf_counter() - self._echo_sent_at) * 1000)
+            self._echo_sent_at = None
+        self.output_ready.emit(text)
+        
+        # 检查是否需要用户输入（简单检测）
+        if looks_like_input_prompt(text):
+            self.input_requested.emit()
+    
+    def _wait_readable(self, timeout: float):
+        """等待channel可读，有数据立即返回而不是固定休眠"""
+        try:
+            select.select([self.channel], [], [], timeout)
+        except (OSError, ValueError):
+            time.sleep(timeout)
     
     def run(self):
         """ 执行命令并实时输出"""
@@ -284,53 +170,45 @@ class SSHWorker(QThread):
             self.finished_signal.emit()
             return
         
+        self._record = self.ssh_client.telemetry.open_channel("command", self.command)
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+        
         try:
             # 实时读取输出
-            while not self.channel.exit_status_ready() and not self._stop_requested:
-                # 发送用户输入
-                while self.input_queue:
-                    text = self.input_queue.pop(0)
-                    try:
-                        self.channel.send(text)
-                    except:
-                        pass
-                
+            while not self.channel.exit_status_ready() and not self.cancelled:
                 if self.channel.recv_ready():
-                    data = self.channel.recv(4096).decode('utf-8', errors='replace')
-                    if data:
-                        self.output_ready.emit(data)
-                        
-                        # 检查是否需要用户输入（简单检测）
-                        if '[Y/n]' in data or '[y/N]' in data or 'yes/no' in data.lower():
-                            self.input_requested.emit()
+                    self._emit(self._recv())
                 
                 if self.channel.recv_stderr_ready():
-                    data = self.channel.recv_stderr(4096).decode('utf-8', errors='replace')
-                    if data:
-                        self.error_ready.emit(data)
+                    self._emit(self._recv(stderr=True), is_error=True)
                 
-                time.sleep(0.05)  # 避免CPU占用过高
+                if not self.channel.recv_ready() and not self.channel.recv_stderr_ready():
+                    self._wait_readable(0.05)  # 无数据时等待，有数据立即唤醒
             
             # 读取剩余输出
             while self.channel.recv_ready():
-                data = self.channel.recv(4096).decode('utf-8', errors='replace')
-                if data:
-                    self.output_ready.emit(data)
+                self._emit(self._recv())
             while self.channel.recv_stderr_ready():
-                data = self.channel.recv_stderr(4096).decode('utf-8', errors='replace')
-                if data:
-                    self.error_ready.emit(data)
+                self._emit(self._recv(stderr=True), is_error=True)
         except Exception as e:
             self.error_ready.emit(f"\n错误: {str(e)}\n")
         finally:
+            self._input_queue.put(None)
+            if self._writer_thread:
+                self._writer_thread.join(timeout=1)
             if self.channel:
                 self.channel.close()
+            self._record.close()
             self.ssh_client.current_channel = None
             self.finished_signal.emit()
     
+    def on_skipped(self, reason: str):
+        self.finished_signal.emit()
+    
     def stop(self):
         """停止命令执行"""
-        self._stop_requested = True
+        self.cancel()
         if self.channel:
             try:
                 self.channel.send('\x03')  # 发送Ctrl+C
@@ -338,8 +216,10 @@ class SSHWorker(QThread):
                 pass
 
 
-class FileTransferWorker(QThread):
-    """文件传输工作线程"""
+class FileTransferWorker(Task):
+    """文件传输任务"""
+    
+    pool_name = TRANSFER
     
     progress = pyqtSignal(int, int)  # 已传输, 总大小
     finished_signal = pyqtSignal(bool, str)  # 成功, 消息
@@ -354,6 +234,7 @@ class FileTransferWorker(QThread):
     
     def run(self):
         def progress_callback(transferred, total):
+            self.check_cancelled()  # 在paramiko的回调中抛出异常即可中止传输
             self.progress.emit(transferred, total)
         
         try:
@@ -369,13 +250,19 @@ class FileTransferWorker(QThread):
             if success:
                 self.finished_signal.emit(True, "传输完成")
             else:
-                self.finished_signal.emit(False, "传输失败")
+                self.finished_signal.emit(False, "已取消" if self.cancelled else "传输失败")
         except Exception as e:
             self.finished_signal.emit(False, str(e))
 
+    def on_skipped(self, reason: str):
+        self.finished_signal.emit(False, reason)
+
 
-class SSHConnectWorker(QThread):
-    """异步SSH连接工作线程"""
+class SSHConnectWorker(Task):
+    """异步SSH连接任务"""
+    
+    pool_name = INTERACTIVE
+    priority = PRIORITY_HIGH
     
     connected = pyqtSignal()
     failed = pyqtSignal(str)
@@ -387,14 +274,21 @@ class SSHConnectWorker(QThread):
     def run(self):
         """ 在后台线程中执行连接"""
         if self.ssh_client.connect():
+            if self.cancelled:
+                # 连接期间标签页已关闭
+                self.ssh_client.disconnect()
+                return
             self.connected.emit()
         else:
             # 错误信息已经通过ssh_client.error_occurred发送
             pass
 
 
-class PingWorker(QThread):
-    """服务器延迟检测工作线程"""
+class PingWorker(Task):
+    """服务器延迟检测任务"""
+    
+    pool_name = BACKGROUND
+    timeout = 10.0
     
     ping_result = pyqtSignal(str, int)  # server_id, latency_ms (-1表示超时)
     
@@ -406,25 +300,15 @@ class PingWorker(QThread):
     
     def run(self):
         """ 检测服务器延迟"""
-        try:
-            start_time = time.time()
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(3)  # 3秒超时
-            result = sock.connect_ex((self.host, self.port))
-            end_time = time.time()
-            sock.close()
-            
-            if result == 0:
-                latency = int((end_time - start_time) * 1000)
-                self.ping_result.emit(self.server_id, latency)
-            else:
-                self.ping_result.emit(self.server_id, -1)
-        except Exception:
-            self.ping_result.emit(self.server_id, -1)
+        self.ping_result.emit(self.server_id, tcp_ping(self.host, self.port))
 
 
-class SystemInfoWorker(QThread):
-    """服务器系统信息获取工作线程"""
+class SystemInfoWorker(Task):
+    """服务器系统信息获取任务"""
+    
+    pool_name = BACKGROUND
+    priority = PRIORITY_LOW
+    timeout = 30.0
     
     info_ready = pyqtSignal(dict)  # {“cpu”: ..., “memory”: ..., “disk”: ...}
     
@@ -454,6 +338,7 @@ class SystemInfoWorker(QThread):
             if output.strip():
                 info["cpu"] = output.strip()
             
+            self.check_cancelled()
             # 获取内存信息
             output, _ = self.ssh_client.execute_command(
                 "free -h | grep Mem | awk '{print $2, $3, $3/$2*100}'"
@@ -469,6 +354,7 @@ class SystemInfoWorker(QThread):
                     except:
                         pass
             
+            self.check_cancelled()
             # 获取磁盘信息（根目录）
             output, _ = self.ssh_client.execute_command(
                 "df -h / | tail -1 | awk '{print $2, $3, $5}'"
@@ -481,6 +367,7 @@ class SystemInfoWorker(QThread):
                 if len(parts) >= 3:
                     info["disk_percent"] = parts[2]
             
+            self.check_cancelled()
             # 获取操作系统信息
             output, _ = self.ssh_client.execute_command(
                 "cat /etc/os-release 2>/dev/null | grep PRETTY_NAME | cut -d '=' -f 2 | tr -d '\"' || uname -s"
@@ -488,6 +375,7 @@ class SystemInfoWorker(QThread):
             if output.strip():
                 info["os"] = output.strip()
             
+            self.check_cancelled()
             # 获取运行时间
             output, _ = self.ssh_client.execute_command("uptime -p 2>/dev/null || uptime")
             if output.strip():
@@ -499,4 +387,5 @@ class SystemInfoWorker(QThread):
         except Exception as e:
             pass
         
-        self.info_ready.emit(info)
+        if not self.cancelled:
+            self.info_ready.emit(info)
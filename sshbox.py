@@ -0,0 +1,435 @@
+"""命令行工具（不加载界面，适合脚本与定时任务）
+
+使用与界面相同的服务器列表（servers.db）与凭据库，不导入PyQt5：
+    python -m sshbox exec 目标 命令...           在一台或多台服务器上执行命令
+    python -m sshbox get 服务器 远程文件 [本地路径]
+    python -m sshbox put 目标 本地文件 [远程路径]
+    python -m sshbox sync 目标 本地目录 远程目录  单向同步（默认上传，--pull 下载）
+    python -m sshbox ping [目标...]              TCP连接延迟
+
+目标可以是服务器名称或ID、通配符（如 "web-*"）、"#标签"，多个用逗号分隔。
+多台服务器时并行执行，exec 按服务器分块输出，返回码为其中最大的退出码。
+密码加密保存时需要主密码：交互运行时提示输入，也可以通过环境变量 SSHBOX_MASTER_PASSWORD 传入。
+"""
+import argparse
+import fnmatch
+import io
+import os
+import posixpath
+import stat
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from config import ServerConfig, config_manager
+
+EXIT_CONNECT_FAILED = 255  # 与ssh一致：连接失败
+MASTER_PASSWORD_ENV = "SSHBOX_MASTER_PASSWORD"
+
+
+def fail(message: str, code: int = 2):
+    print(f"sshbox: {message}", file=sys.stderr)
+    sys.exit(code)
+
+
+def resolve_targets(spec: str) -> List[ServerConfig]:
+    """按名称/ID、通配符或 #标签 选择服务器，保持列表中的顺序并去重"""
+    servers = config_manager.get_all_servers()
+    selected = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith('#'):
+            matched = config_manager.find_by_tag(item[1:])
+        elif any(c in item for c in "*?["):
+            matched = [s for s in servers if fnmatch.fnmatchcase(s.name, item)]
+        else:
+            server = config_manager.get_server(item)
+            matched = [server] if server is not None else config_manager.find_by_name(item)
+        if not matched:
+            fail(f"没有匹配 \"{item}\" 的服务器")
+        for server in matched:
+            selected[server.id] = server
+    if not selected:
+        fail("没有指定服务器")
+    order = {s.id: i for i, s in enumerate(servers)}
+    return sorted(selected.values(), key=lambda s: order.get(s.id, 0))
+
+
+def single_target(spec: str) -> ServerConfig:
+    servers = resolve_targets(spec)
+    if len(servers) > 1:
+        fail(f"\"{spec}\" 匹配了 {len(servers)} 台服务器，这里只能指定一台")
+    return servers[0]
+
+
+def unlock_vault(servers: List[ServerConfig]):
+    """需要时解锁凭据库（包括跳板机的密码）"""
+    from connection import resolve_jump_hosts
+    from vault import vault, VaultError
+    
+    passwords = []
+    for server in servers:
+        passwords.append(server.password)
+        if server.proxy_jump:
+            passwords.extend(hop.password for hop in resolve_jump_hosts(server))
+    if not vault.needs_unlock(*passwords):
+        return
+    master_password = os.environ.get(MASTER_PASSWORD_ENV)
+    if master_password is None:
+        if not sys.stdin.isatty():
+            fail(f"服务器密码已加密，请通过环境变量 {MASTER_PASSWORD_ENV} 提供主密码")
+        import getpass
+        master_password = getpass.getpass("主密码: ")
+    try:
+        vault.unlock(master_password)
+    except VaultError as e:
+        fail(str(e))
+
+
+def open_connection(server: ServerConfig):
+    """连接到服务器，失败时返回None（错误信息已输出到stderr）"""
+    from connection import SSHConnection
+    
+    conn = SSHConnection(server)
+    conn.on_error = lambda message: print(f"{server.name}: {message}", file=sys.stderr)
+    return conn if conn.connect() else None
+
+
+def run_parallel(func, servers: List[ServerConfig], parallel: int) -> list:
+    """在每台服务器上执行 func(server)，按服务器顺序返回结果"""
+    if len(servers) == 1:
+        return [func(servers[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(servers)))) as executor:
+        return list(executor.map(func, servers))
+
+
+class _Progress:
+    """传输进度（仅在stderr是终端时显示）"""
+    
+    def __init__(self, label: str):
+        self.label = label
+        self.enabled = sys.stderr.isatty()
+        self.started = time.perf_counter()
+        self._last = 0.0
+    
+    def __call__(self, transferred: int, total: int):
+        now = time.perf_counter()
+        if not self.enabled or (now - self._last < 0.1 and transferred < total):
+            return
+        self._last = now
+        percent = transferred * 100 // total if total else 100
+        speed = transferred / max(now - self.started, 1e-6) / 1e6
+        sys.stderr.write(f"\r{self.label}  {percent:3d}%  {speed:.1f} MB/s ")
+        if transferred >= total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def cmd_exec(args) -> int:
+    servers = resolve_targets(args.target)
+    command = " ".join(args.command)
+    if not command:
+        fail("没有指定要执行的命令")
+    unlock_vault(servers)
+    
+    if len(servers) == 1:
+        conn = open_connection(servers[0])
+        if conn is None:
+            return EXIT_CONNECT_FAILED
+        try:
+            status = conn.run_command(command, sys.stdout.buffer, sys.stderr.buffer)
+        finally:
+            conn.disconnect()
+        return status if status >= 0 else EXIT_CONNECT_FAILED
+    
+    def run(server: ServerConfig):
+        conn = open_connection(server)
+        if conn is None:
+            return EXIT_CONNECT_FAILED, b"", b""
+        stdout, stderr = io.BytesIO(), io.BytesIO()
+        try:
+            status = conn.run_command(command, stdout, stderr)
+        finally:
+            conn.disconnect()
+        return (status if status >= 0 else EXIT_CONNECT_FAILED), stdout.getvalue(), stderr.getvalue()
+    
+    results = run_parallel(run, servers, args.parallel)
+    for server, (status, out, err) in zip(servers, results):
+        sys.stdout.write(f"==> {server.name} (退出码 {status}) <==\n")
+        sys.stdout.flush()
+        sys.stdout.buffer.write(out)
+        if out and not out.endswith(b"\n"):
+            sys.stdout.buffer.write(b"\n")
+        sys.stdout.buffer.flush()
+        sys.stderr.buffer.write(err)
+        sys.stderr.buffer.flush()
+    return max(status for status, _, _ in results)
+
+
+def cmd_get(args) -> int:
+    server = single_target(args.server)
+    local = args.local or posixpath.basename(args.remote.rstrip('/'))
+    if os.path.isdir(local):
+        local = os.path.join(local, posixpath.basename(args.remote.rstrip('/')))
+    unlock_vault([server])
+    conn = open_connection(server)
+    if conn is None:
+        return EXIT_CONNECT_FAILED
+    try:
+        ok = conn.download_file(args.remote, local, _Progress(os.path.basename(local)))
+    finally:
+        conn.disconnect()
+    return 0 if ok else 1
+
+
+def cmd_put(args) -> int:
+    servers = resolve_targets(args.target)
+    if not os.path.isfile(args.local):
+        fail(f"本地文件不存在: {args.local}")
+    name = os.path.basename(args.local)
+    remote = args.remote or name
+    unlock_vault(servers)
+    
+    def run(server: ServerConfig) -> int:
+        conn = open_connection(server)
+        if conn is None:
+            return EXIT_CONNECT_FAILED
+        try:
+            target = remote
+            sftp = conn.get_sftp()
+            if remote.endswith('/') or (sftp is not None and _is_remote_dir(sftp, remote)):
+                target = posixpath.join(remote, name)
+            progress = _Progress(f"{server.name}: {name}") if len(servers) == 1 else None
+            return 0 if conn.upload_file(args.local, target, progress) else 1
+        finally:
+            conn.disconnect()
+    
+    return max(run_parallel(run, servers, args.parallel))
+
+
+def _is_remote_dir(sftp, path: str) -> bool:
+    try:
+        return stat.S_ISDIR(sftp.stat(path).st_mode)
+    except IOError:
+        return False
+
+
+class SyncError(Exception):
+    """无法列出同步的根目录"""
+
+
+def _local_tree(root: str) -> Tuple[dict, List[str]]:
+    """本地目录下所有文件：相对路径（/分隔） -> (大小, 修改时间)，以及无法读取的子目录"""
+    files, unreadable = {}, []
+    
+    def on_error(e: OSError):
+        relative = os.path.relpath(e.filename, root).replace(os.sep, '/')
+        if relative == '.':
+            raise SyncError(f"无法列出本地目录 {root}: {e}")
+        unreadable.append(relative)
+    
+    for dirpath, _, filenames in os.walk(root, onerror=on_error):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            try:
+                st = os.stat(path)
+            except OSError:
+                unreadable.append(relative)
+                continue
+            files[relative] = (st.st_size, int(st.st_mtime))
+    return files, unreadable
+
+
+def _remote_tree(sftp, root: str, missing_ok: bool) -> Tuple[dict, List[str]]:
+    """远程目录下所有文件，以及无法列出的子目录
+    
+    根目录无法列出时抛出 SyncError；missing_ok 时根目录不存在视为空目录（上传时会创建）。
+    """
+    files, unreadable, pending = {}, [], [""]
+    while pending:
+        relative = pending.pop()
+        try:
+            attrs = sftp.listdir_attr(posixpath.join(root, relative) if relative else root)
+        except IOError as e:
+            if relative:
+                unreadable.append(relative)
+                continue
+            if missing_ok and isinstance(e, FileNotFoundError):
+                break
+            raise SyncError(f"无法列出远程目录 {root}: {e}")
+        for attr in attrs:
+            path = posixpath.join(relative, attr.filename) if relative else attr.filename
+            if stat.S_ISDIR(attr.st_mode):
+                pending.append(path)
+            elif stat.S_ISREG(attr.st_mode):
+                files[path] = (attr.st_size, int(attr.st_mtime))
+    return files, unreadable
+
+
+def _remote_makedirs(sftp, path: str, known: set):
+    """逐级创建远程目录（类似 mkdir -p）"""
+    if not path or path in known or path == '/':
+        return
+    _remote_makedirs(sftp, posixpath.dirname(path), known)
+    if not _is_remote_dir(sftp, path):
+        sftp.mkdir(path)
+    known.add(path)
+
+
+def sync_one(conn, server: ServerConfig, args) -> int:
+    """按大小与修改时间比较，只传输有变化的文件；传输后同步修改时间"""
+    sftp = conn.get_sftp()
+    if sftp is None:
+        return 1
+    prefix = f"{server.name}: " if args.multiple else ""
+    try:
+        local_files, local_unreadable = _local_tree(args.local) if os.path.isdir(args.local) else ({}, [])
+        remote_files, remote_unreadable = _remote_tree(sftp, args.remote, missing_ok=not args.pull)
+    except SyncError as e:
+        print(f"{prefix}{e}", file=sys.stderr)
+        return 1
+    source, target = (remote_files, local_files) if args.pull else (local_files, remote_files)
+    # 源目录中无法列出的子目录不知道有哪些文件，其下的文件一律不删除
+    unreadable = remote_unreadable if args.pull else local_unreadable
+    for path in unreadable:
+        print(f"{prefix}无法列出 {path}，跳过其中的删除", file=sys.stderr)
+    changed = sorted(path for path, info in source.items() if target.get(path) != info)
+    extra = sorted(path for path in set(target) - set(source)
+                   if not any(path == d or path.startswith(d + '/') for d in unreadable)) if args.delete else []
+    
+    failed = len(unreadable)
+    known_dirs = set()
+    for path in changed:
+        local = os.path.join(args.local, *path.split('/'))
+        remote = posixpath.join(args.remote, path)
+        print(f"{prefix}{'下载' if args.pull else '上传'} {path}")
+        if args.dry_run:
+            continue
+        _, mtime = source[path]
+        if args.pull:
+            os.makedirs(os.path.dirname(local) or '.', exist_ok=True)
+            if conn.download_file(remote, local):
+                os.utime(local, (mtime, mtime))
+            else:
+                failed += 1
+        else:
+            try:
+                _remote_makedirs(sftp, posixpath.dirname(remote), known_dirs)
+            except IOError as e:
+                print(f"{prefix}创建目录失败: {e}", file=sys.stderr)
+                failed += 1
+                continue
+            if not conn.upload_file(local, remote):
+                failed += 1
+                continue
+            try:
+                sftp.utime(remote, (mtime, mtime))
+            except IOError as e:
+                print(f"{prefix}设置修改时间失败: {e}", file=sys.stderr)
+                failed += 1
+    for path in extra:
+        print(f"{prefix}删除 {path}")
+        if args.dry_run:
+            continue
+        try:
+            if args.pull:
+                os.remove(os.path.join(args.local, *path.split('/')))
+            else:
+                sftp.remove(posixpath.join(args.remote, path))
+        except (IOError, OSError) as e:
+            print(f"{prefix}删除失败: {e}", file=sys.stderr)
+            failed += 1
+    print(f"{prefix}{len(changed)} 个文件有变化，{len(source) - len(changed)} 个相同"
+          + (f"，{len(extra)} 个删除" if args.delete else "")
+          + ("（未实际执行）" if args.dry_run else ""))
+    return 1 if failed else 0
+
+
+def cmd_sync(args) -> int:
+    servers = resolve_targets(args.target)
+    if args.pull and len(servers) > 1:
+        fail("--pull 只能指定一台服务器")
+    if not args.pull and not os.path.isdir(args.local):
+        fail(f"本地目录不存在: {args.local}")
+    args.multiple = len(servers) > 1
+    unlock_vault(servers)
+    
+    def run(server: ServerConfig) -> int:
+        conn = open_connection(server)
+        if conn is None:
+            return EXIT_CONNECT_FAILED
+        try:
+            return sync_one(conn, server, args)
+        finally:
+            conn.disconnect()
+    
+    return max(run_parallel(run, servers, args.parallel))
+
+
+def cmd_ping(args) -> int:
+    from connection import tcp_ping
+    
+    servers = resolve_targets(",".join(args.targets)) if args.targets else config_manager.get_all_servers()
+    if not servers:
+        fail("服务器列表为空")
+    results = run_parallel(lambda s: tcp_ping(s.host, s.port, args.timeout), servers, args.parallel)
+    width = max(len(s.name) for s in servers)
+    for server, latency in zip(servers, results):
+        text = f"{latency} ms" if latency >= 0 else "超时"
+        print(f"{server.name:<{width}}  {server.host}:{server.port}  {text}")
+    return 1 if any(latency < 0 for latency in results) else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sshbox", description="sshbox 命令行工具（使用界面中的服务器列表）")
+    parser.add_argument("-P", "--parallel", type=int, default=8, help="多台服务器时的并发数（默认8）")
+    commands = parser.add_subparsers(dest="command", metavar="命令")
+    commands.required = True
+    
+    exec_parser = commands.add_parser("exec", help="执行命令")
+    exec_parser.add_argument("target", help="服务器名称/ID、通配符或 #标签，多个用逗号分隔")
+    exec_parser.add_argument("command", nargs=argparse.REMAINDER, help="要执行的命令")
+    exec_parser.set_defaults(func=cmd_exec)
+    
+    get_parser = commands.add_parser("get", help="下载文件")
+    get_parser.add_argument("server", help="服务器名称或ID")
+    get_parser.add_argument("remote", help="远程文件路径")
+    get_parser.add_argument("local", nargs="?", help="本地路径（默认当前目录下同名文件）")
+    get_parser.set_defaults(func=cmd_get)
+    
+    put_parser = commands.add_parser("put", help="上传文件")
+    put_parser.add_argument("target", help="服务器名称/ID、通配符或 #标签，多个用逗号分隔")
+    put_parser.add_argument("local", help="本地文件路径")
+    put_parser.add_argument("remote", nargs="?", help="远程路径（默认登录目录下同名文件，以/结尾或为目录时放到其中）")
+    put_parser.set_defaults(func=cmd_put)
+    
+    sync_parser = commands.add_parser("sync", help="单向同步目录（按大小与修改时间比较）")
+    sync_parser.add_argument("target", help="服务器名称/ID、通配符或 #标签，多个用逗号分隔")
+    sync_parser.add_argument("local", help="本地目录")
+    sync_parser.add_argument("remote", help="远程目录")
+    sync_parser.add_argument("--pull", action="store_true", help="从服务器同步到本地（默认从本地同步到服务器）")
+    sync_parser.add_argument("--delete", action="store_true", help="删除目标中源目录没有的文件")
+    sync_parser.add_argument("-n", "--dry-run", action="store_true", help="只列出要做的操作")
+    sync_parser.set_defaults(func=cmd_sync)
+    
+    ping_parser = commands.add_parser("ping", help="TCP连接延迟（不指定目标时检测所有服务器）")
+    ping_parser.add_argument("targets", nargs="*", help="服务器名称/ID、通配符或 #标签")
+    ping_parser.add_argument("-t", "--timeout", type=float, default=3, help="超时（秒，默认3）")
+    ping_parser.set_defaults(func=cmd_ping)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
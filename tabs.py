@@ -1,3 +1,5 @@
+import uuid
+
 from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QInputDialog, 
                             QMessageBox, QSplitter, QTabWidget, QTabBar as QtTabBar)
@@ -7,6 +9,9 @@ from qfluentwidgets import (FluentIcon as FIF, InfoBar, InfoBarPosition,
 from config import ServerConfig
 from terminal import SSHTerminalInterface
 from sftp import SFTPFileInterface
+from session import TabState, trim_scrollback
+
+SESSION_PROPERTY = "session_id"
 
 
 class TerminalTabWidget(QWidget):
@@ -14,8 +19,9 @@ class TerminalTabWidget(QWidget):
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.terminals = {}
+        self.terminals = {}  # 会话ID -> 会话信息
         self.is_closing = False
+        self.connect_guard = None  # 占位标签页连接前的检查回调 (服务器配置) -> bool
         self.setup_ui()
     
     def setup_ui(self):
@@ -40,77 +46,147 @@ class TerminalTabWidget(QWidget):
         self.tab_widget.setMovable(True)
         self.tab_widget.tabCloseRequested.connect(self.close_terminal)
         self.tab_widget.tabBarDoubleClicked.connect(self.rename_terminal)
+        self.tab_widget.currentChanged.connect(self.update_hibernation)
         layout.addWidget(self.tab_widget)
     
     def request_new_terminal(self):
         InfoBar.info("提示", "请从服务器列表选择要连接的服务器", parent=self,
                     position=InfoBarPosition.TOP)
     
-    def add_terminal(self, server: ServerConfig, custom_name: str = None):
+    def add_terminal(self, server: ServerConfig, custom_name: str = None, lazy: bool = False,
+                     sftp_path: str = "/", scrollback: str = "") -> str:
+        """新建终端标签页，返回会话ID
+        
+        lazy为True时只创建占位标签页（用于恢复上次的会话），第一次切换到该标签页时才连接。
+        """
         if custom_name:
             tab_name = custom_name
         else:
             tab_name = f"{server.name}"
         
+        # 会话ID保存在标签页的控件上，标签页移动或前面的标签页关闭时不会变
+        session_id = uuid.uuid4().hex
         terminal = SSHTerminalInterface(server)
+        if scrollback:
+            terminal.restore_scrollback(scrollback)
         
         splitter = QSplitter(Qt.Horizontal)
+        splitter.setProperty(SESSION_PROPERTY, session_id)
         splitter.addWidget(terminal)
         
-        index = self.tab_widget.addTab(splitter, f"{tab_name} (连接中...)")
+        index = self.tab_widget.addTab(splitter, f"{tab_name} (未连接)" if lazy else f"{tab_name} (连接中...)")
         
-        self.terminals[index] = {
+        self.terminals[session_id] = {
             "terminal": terminal,
             "sftp": None,
             "server": server,
             "name": tab_name,
-            "splitter": splitter
+            "splitter": splitter,
+            "sftp_path": sftp_path,
+            "pending": True  # 尚未开始连接
         }
         
+        terminal.disconnected.connect(lambda: self.on_terminal_disconnected(session_id))
+        
+        if not lazy:
+            self._connect_session(session_id)
+            self.tab_widget.setCurrentIndex(index)
+        self.update_hibernation()
+        
+        return session_id
+    
+    def _connect_session(self, session_id: str):
+        """开始连接会话，连接成功后打开SFTP面板"""
+        info = self.terminals[session_id]
+        info["pending"] = False
+        terminal, splitter = info["terminal"], info["splitter"]
+        self.tab_widget.setTabText(self.index_of(session_id), f"{info['name']} (连接中...)")
+        
         terminal.connect_to_server()
         
         def on_connect_success():
-            current_index = self.get_terminal_index(terminal)
-            if current_index >= 0:
-                self.tab_widget.setTabText(current_index, tab_name)
+            info = self.terminals.get(session_id)
+            if info is None:
+                return
+            self.tab_widget.setTabText(self.index_of(session_id), info["name"])
                 
-                ssh_client = terminal.get_ssh_client()
-                if ssh_client:
-                    sftp = SFTPFileInterface(ssh_client)
-                    splitter.addWidget(sftp)
-                    splitter.setSizes([800, 400])
-                    splitter.setStretchFactor(0, 3)
-                    splitter.setStretchFactor(1, 2)
-                    sftp.load_directory("/")
-                    self.terminals[current_index]["sftp"] = sftp
+            ssh_client = terminal.get_ssh_client()
+            if ssh_client and info["sftp"] is None:
+                sftp = SFTPFileInterface(ssh_client)
+                splitter.addWidget(sftp)
+                splitter.setSizes([800, 400])
+                splitter.setStretchFactor(0, 3)
+                splitter.setStretchFactor(1, 2)
+                sftp.current_path = info["sftp_path"]
+                sftp.set_hibernating(terminal.hibernating)
+                sftp.refresh()
+                info["sftp"] = sftp
         
         def on_connect_error(error):
-            current_index = self.get_terminal_index(terminal)
-            if current_index >= 0:
-                self.tab_widget.setTabText(current_index, f"{tab_name} (连接失败)")
+            info = self.terminals.get(session_id)
+            if info is not None:
+                self.tab_widget.setTabText(self.index_of(session_id), f"{info['name']} (连接失败)")
         
         terminal.ssh_client.connected.connect(on_connect_success) if terminal.ssh_client else None
         terminal.ssh_client.error_occurred.connect(on_connect_error) if terminal.ssh_client else None
-        
-        terminal.disconnected.connect(lambda: self.on_terminal_disconnected_by_object(terminal))
-        
-        self.tab_widget.setCurrentIndex(index)
-        
-        return index
     
-    def get_terminal_index(self, terminal):
-        for idx, info in self.terminals.items():
-            if info["terminal"] == terminal:
-                return idx
-        return -1
+    def _connect_pending(self, session_id: str):
+        """占位标签页第一次显示时开始连接"""
+        info = self.terminals.get(session_id)
+        if info is None or not info["pending"] or info["terminal"].hibernating:
+            return
+        # 例如凭据库未解锁且用户取消了解锁，保持占位，下次切换到该标签页时重试
+        if self.connect_guard is not None and not self.connect_guard(info["server"]):
+            return
+        self._connect_session(session_id)
+    
+    def update_hibernation(self, *_):
+        """只有可见的当前标签页保持活动，其余标签页休眠（缓存输出、暂停刷新）"""
+        current = self.session_at(self.tab_widget.currentIndex()) if self.isVisible() else None
+        for session_id, info in self.terminals.items():
+            hibernating = session_id != current
+            info["terminal"].set_hibernating(hibernating)
+            if info["sftp"] is not None:
+                info["sftp"].set_hibernating(hibernating)
+            if not hibernating and info["pending"]:
+                # 推迟到当前事件处理完成后再连接（连接前可能需要弹出解锁对话框）
+                QTimer.singleShot(0, lambda sid=session_id: self._connect_pending(sid))
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_hibernation()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_hibernation()
+    
+    def session_at(self, index: int):
+        """标签页位置对应的会话ID"""
+        widget = self.tab_widget.widget(index)
+        return widget.property(SESSION_PROPERTY) if widget is not None else None
+    
+    def index_of(self, session_id: str) -> int:
+        """会话当前所在的标签页位置，不存在时返回-1"""
+        info = self.terminals.get(session_id)
+        return self.tab_widget.indexOf(info["splitter"]) if info else -1
+    
+    def _remove_session(self, session_id: str):
+        info = self.terminals.pop(session_id)
+        if info["sftp"] is not None:
+            info["sftp"].cancel_transfer()
+        self.tab_widget.removeTab(self.tab_widget.indexOf(info["splitter"]))
+        info["splitter"].deleteLater()
+        if not self.terminals:
+            self.disconnected.emit()
     
     def close_terminal(self, index: int):
-        if index not in self.terminals or self.is_closing:
+        session_id = self.session_at(index)
+        if session_id not in self.terminals or self.is_closing:
             return
         
         reply = QMessageBox.question(
             self, "确认关闭",
-            f"确定要关闭终端 '{self.terminals[index]['name']}' 吗？",
+            f"确定要关闭终端 '{self.terminals[session_id]['name']}' 吗？",
             QMessageBox.Yes | QMessageBox.No
         )
         
@@ -119,8 +195,7 @@ class TerminalTabWidget(QWidget):
         
         self.is_closing = True
         
-        terminal_info = self.terminals[index]
-        terminal = terminal_info["terminal"]
+        terminal = self.terminals[session_id]["terminal"]
         
         try:
             terminal.disconnected.disconnect()
@@ -129,66 +204,63 @@ class TerminalTabWidget(QWidget):
         
         terminal.disconnect()
         
-        self.tab_widget.removeTab(index)
-        
-        terminal_info["splitter"].deleteLater()
-        del self.terminals[index]
-        
-        new_terminals = {}
-        tab_count = self.tab_widget.count()
-        sorted_indices = sorted(self.terminals.keys())
-        
-        for new_idx in range(tab_count):
-            old_idx = sorted_indices[new_idx if new_idx < index else new_idx + 1] if new_idx < len(sorted_indices) else None
-            if old_idx is not None and old_idx in self.terminals:
-                new_terminals[new_idx] = self.terminals[old_idx]
-        
-        self.terminals = new_terminals
+        self._remove_session(session_id)
         
         self.is_closing = False
         
-        if len(self.terminals) == 0:
-            self.disconnected.emit()
-    
-    def on_terminal_disconnected_by_object(self, terminal):
-        if self.is_closing:
+    def on_terminal_disconnected(self, session_id: str):
+        if self.is_closing or session_id not in self.terminals:
             return
         
-        index = self.get_terminal_index(terminal)
-        if index >= 0:
-            self.is_closing = True
-            self.tab_widget.removeTab(index)
-            if index in self.terminals:
-                self.terminals[index]["splitter"].deleteLater()
-                del self.terminals[index]
-            
-            new_terminals = {}
-            for new_idx in range(self.tab_widget.count()):
-                old_indices = sorted([k for k in self.terminals.keys() if k != index])
-                if new_idx < len(old_indices):
-                    new_terminals[new_idx] = self.terminals[old_indices[new_idx]]
-            
-            self.terminals = new_terminals
-            self.is_closing = False
-            
-            if len(self.terminals) == 0:
-                self.disconnected.emit()
+        self.is_closing = True
+        self._remove_session(session_id)
+        self.is_closing = False
     
     def rename_terminal(self, index: int):
-        if index not in self.terminals:
+        session_id = self.session_at(index)
+        if session_id not in self.terminals:
             return
         
-        current_name = self.terminals[index]["name"]
+        info = self.terminals[session_id]
         new_name, ok = QInputDialog.getText(
             self, "重命名终端", "输入新名称:",
-            text=current_name
+            text=info["name"]
         )
         
         if ok and new_name.strip():
-            self.terminals[index]["name"] = new_name.strip()
+            info["name"] = new_name.strip()
             self.tab_widget.setTabText(index, new_name.strip())
-            terminal = self.terminals[index]["terminal"]
-            terminal.status_label.setText(f"连接到: {new_name.strip()}")
+            info["terminal"].status_label.setText(f"连接到: {new_name.strip()}")
     
     def has_terminals(self) -> bool:
         return len(self.terminals) > 0
+
+    def open_tabs(self):
+        """当前打开的标签页 [(会话ID, 名称, 服务器配置)]，按标签页顺序"""
+        tabs = []
+        for index in range(self.tab_widget.count()):
+            session_id = self.session_at(index)
+            info = self.terminals.get(session_id)
+            if info is not None:
+                tabs.append((session_id, info["name"], info["server"]))
+        return tabs
+    
+    def session_state(self, scrollback_limit: int = 0) -> list:
+        """当前打开的标签页状态，用于下次启动时恢复"""
+        tabs = []
+        for session_id, name, server in self.open_tabs():
+            info = self.terminals[session_id]
+            sftp_path = info["sftp"].current_path if info["sftp"] is not None else info["sftp_path"]
+            scrollback = trim_scrollback(info["terminal"].scrollback(), scrollback_limit) if scrollback_limit > 0 else ""
+            tabs.append(TabState(server.id, name, sftp_path, scrollback))
+        return tabs
+    
+    def activate_tab(self, session_id: str):
+        index = self.index_of(session_id)
+        if index >= 0:
+            self.tab_widget.setCurrentIndex(index)
+    
+    def current_terminal(self):
+        """当前标签页的终端界面，没有时返回None"""
+        info = self.terminals.get(self.session_at(self.tab_widget.currentIndex()))
+        return info["terminal"] if info else None
@@ -0,0 +1,294 @@
+"""共享的后台任务池
+
+原来每次连接、执行命令、传输文件都新建一个 QThread，没有数量限制，
+也没有地方统一取消。这里按用途分为几个线程池：
+- interactive：连接服务器等用户正在等待的操作
+- command：终端命令，每条命令在执行期间一直占用一个线程（top、tail -f 可能一直运行），
+  因此不设上限，也不会占住 interactive 池让新的连接排队
+- transfer：SFTP上传下载，并发数较小，避免大文件传输占满带宽和线程
+- background：系统信息、延迟检测、导入解析等可以慢一点的工作
+
+同一个池中按优先级（数值越小越先）再按提交顺序执行；任务可以协作式取消，
+也可以设置截止时间：排队超过截止时间的任务直接丢弃，运行中的任务通过
+cancelled 属性得知已超时。每个池记录排队长度、等待时间等指标。
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+INTERACTIVE = "interactive"
+COMMAND = "command"
+TRANSFER = "transfer"
+BACKGROUND = "background"
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 50
+PRIORITY_LOW = 100
+
+# 各池的最大线程数，None表示不限
+POOL_SIZES = {INTERACTIVE: 32, COMMAND: None, TRANSFER: 4, BACKGROUND: 4}
+IDLE_TIMEOUT = 60.0  # 空闲线程多久后退出（秒）
+WAIT_SAMPLES = 256  # 保留最近多少次排队等待时间
+
+
+class TaskCancelled(Exception):
+    """任务已被取消或超过截止时间"""
+
+
+class TaskTimeout(TaskCancelled):
+    """任务在排队中超过了截止时间"""
+
+
+class _WorkItem:
+    __slots__ = ("priority", "seq", "fn", "args", "future", "deadline", "cancel_event", "queued_at")
+    
+    def __lt__(self, other: "_WorkItem") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class WorkerPool:
+    """优先级线程池（线程按需创建，空闲一段时间后退出；max_workers 为None时不限线程数）"""
+    
+    def __init__(self, name: str, max_workers: Optional[int], idle_timeout: float = IDLE_TIMEOUT):
+        self.name = name
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._queue: List[_WorkItem] = []
+        self._seq = itertools.count()
+        self._threads = 0
+        self._idle = 0
+        self._active = 0
+        self._shutdown = False
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "timed_out": 0}
+        self._max_queued = 0
+    
+    def submit(self, fn: Callable, *args, priority: int = PRIORITY_NORMAL, timeout: float = None,
+               cancel_event: threading.Event = None) -> Future:
+        """提交任务，返回 Future
+        
+        timeout 为从提交开始计算的截止时间（秒）；cancel_event 被设置后，
+        还在排队的任务不再执行。
+        """
+        item = _WorkItem()
+        item.priority = priority
+        item.seq = next(self._seq)
+        item.fn, item.args = fn, args
+        item.future = Future()
+        item.queued_at = time.monotonic()
+        item.deadline = item.queued_at + timeout if timeout is not None else None
+        item.cancel_event = cancel_event
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError(f"任务池 {self.name} 已关闭")
+            heapq.heappush(self._queue, item)
+            self._counters["submitted"] += 1
+            self._max_queued = max(self._max_queued, len(self._queue))
+            if self._idle > 0:
+                self._cond.notify()
+            elif self.max_workers is None or self._threads < self.max_workers:
+                self._threads += 1
+                threading.Thread(target=self._worker, name=f"{self.name}-{self._threads}", daemon=True).start()
+        return item.future
+    
+    def _next_item(self) -> Optional[_WorkItem]:
+        """取出下一个要执行的任务，空闲超时或池已关闭时返回None（调用时持有锁）"""
+        while True:
+            while not self._queue:
+                if self._shutdown:
+                    return None
+                self._idle += 1
+                notified = self._cond.wait(self.idle_timeout)
+                self._idle -= 1
+                if not notified and not self._queue:
+                    return None
+            item = heapq.heappop(self._queue)
+            if item.cancel_event is not None and item.cancel_event.is_set():
+                item.future.cancel()
+            if not item.future.set_running_or_notify_cancel():
+                self._counters["cancelled"] += 1
+                continue
+            now = time.monotonic()
+            if item.deadline is not None and now >= item.deadline:
+                self._counters["timed_out"] += 1
+                item.future.set_exception(TaskTimeout(f"排队超过截止时间（{self.name}）"))
+                continue
+            self._waits.append(now - item.queued_at)
+            self._active += 1
+            return item
+    
+    def _worker(self):
+        while True:
+            with self._cond:
+                item = self._next_item()
+                if item is None:
+                    self._threads -= 1
+                    return
+            try:
+                result = item.fn(*item.args)
+            except TaskCancelled as e:
+                outcome = "cancelled"
+                item.future.set_exception(e)
+            except BaseException as e:
+                outcome = "failed"
+                item.future.set_exception(e)
+            else:
+                outcome = "completed"
+                item.future.set_result(result)
+            with self._cond:
+                self._active -= 1
+                self._counters[outcome] += 1
+            item = None  # 不在空闲等待期间持有任务的引用
+    
+    def stats(self) -> dict:
+        """当前指标：线程数、运行中与排队中的任务数、累计计数以及排队等待时间"""
+        with self._cond:
+            waits = sorted(self._waits)
+            stats = {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "threads": self._threads,
+                "active": self._active,
+                "queued": len(self._queue),
+                "max_queued": self._max_queued,
+                **self._counters,
+            }
+        stats["wait_p50_ms"] = waits[len(waits) // 2] * 1000 if waits else 0.0
+        stats["wait_max_ms"] = waits[-1] * 1000 if waits else 0.0
+        return stats
+    
+    def shutdown(self):
+        """取消所有排队中的任务，运行中的任务执行完后线程退出"""
+        with self._cond:
+            self._shutdown = True
+            for item in self._queue:
+                if item.future.cancel():
+                    self._counters["cancelled"] += 1
+            self._queue.clear()
+            self._cond.notify_all()
+
+
+_pools: Dict[str, WorkerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool(name: str) -> WorkerPool:
+    """按名称取得共享任务池（第一次使用时创建）"""
+    with _pools_lock:
+        worker_pool = _pools.get(name)
+        if worker_pool is None:
+            worker_pool = _pools[name] = WorkerPool(name, POOL_SIZES[name])
+        return worker_pool
+
+
+def pool_stats() -> List[dict]:
+    """所有已创建的任务池的指标"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [worker_pool.stats() for worker_pool in pools]
+
+
+def shutdown_pools():
+    """退出前取消所有排队中的任务（之后再使用会重新创建任务池）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for worker_pool in pools:
+        worker_pool.shutdown()
+
+
+class Task(QObject):
+    """在共享任务池中运行的任务，替代一次性的 QThread 子类
+    
+    子类实现 run() 并通过自己的信号汇报结果（信号在池线程中发出，
+    自动以队列方式送到界面线程）。长时间运行的任务应定期检查 cancelled。
+    任务提交后由任务池持有引用，调用方不保存也不会被提前回收。
+    """
+    
+    pool_name = BACKGROUND
+    priority = PRIORITY_NORMAL
+    timeout: Optional[float] = None  # 默认截止时间（秒），None表示不限
+    
+    _released = pyqtSignal()
+    _alive = set()  # 已提交但尚未结束的任务
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cancel_event = threading.Event()
+        self._deadline: Optional[float] = None
+        self._running = False
+        self._finished = False
+        self.future: Optional[Future] = None
+        self._released.connect(self._release)
+    
+    def start(self, priority: int = None, timeout: float = None):
+        """提交到任务池"""
+        timeout = self.timeout if timeout is None else timeout
+        if timeout is not None:
+            self._deadline = time.monotonic() + timeout
+        Task._alive.add(self)
+        try:
+            self.future = pool(self.pool_name).submit(
+                self._execute, priority=self.priority if priority is None else priority,
+                timeout=timeout, cancel_event=self._cancel_event)
+        except RuntimeError:
+            Task._alive.discard(self)
+            return
+        self.future.add_done_callback(self._on_future_done)
+    
+    def cancel(self):
+        """请求取消：排队中的任务不再执行，运行中的任务由 run() 自行检查 cancelled 后退出"""
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()  # 还在排队时立即结束，不必等到轮到它
+    
+    @property
+    def cancelled(self) -> bool:
+        """已请求取消或已超过截止时间"""
+        return self._cancel_event.is_set() or (
+            self._deadline is not None and time.monotonic() >= self._deadline)
+    
+    def check_cancelled(self):
+        """已取消时抛出 TaskCancelled，便于在较深的调用中退出"""
+        if self.cancelled:
+            raise TaskCancelled("任务已取消" if self._cancel_event.is_set() else "任务已超时")
+    
+    def isRunning(self) -> bool:
+        return self._running
+    
+    def isFinished(self) -> bool:
+        return self._finished
+    
+    def run(self):
+        raise NotImplementedError
+    
+    def on_skipped(self, reason: str):
+        """任务在排队中被取消或超时、没有执行时调用（在池线程中），需要通知界面的子类重写"""
+    
+    def _execute(self):
+        self._running = True
+        try:
+            self.run()
+        finally:
+            self._running = False
+    
+    def _on_future_done(self, future: Future):
+        if future.cancelled():
+            self.on_skipped("已取消")
+        elif isinstance(future.exception(), TaskTimeout):
+            self.on_skipped("已超时")
+        elif future.exception() is not None and not isinstance(future.exception(), TaskCancelled):
+            print(f"后台任务 {type(self).__name__} 失败: {future.exception()}")
+        self._finished = True
+        # 经由队列信号在界面线程释放引用，保证在此之前发出的信号都已送达
+        self._released.emit()
+    
+    def _release(self):
+        Task._alive.discard(self)
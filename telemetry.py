@@ -0,0 +1,279 @@
+"""单个连接的性能数据
+
+连接建立时记录各阶段耗时（DNS、TCP、密钥交换、认证、主机名探测），
+连接期间记录线路上的收发字节数、各channel的收发字节数、SFTP请求耗时分布，
+并定期发送 keepalive@openssh.com 全局请求测量往返时间。
+所有数据可导出为JSON，在诊断面板中查看。
+"""
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 耗时分布的桶上限（毫秒），最后一个桶收集更慢的请求
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+RTT_INTERVAL = 15.0  # keepalive 测量往返时间的间隔（秒）
+RTT_TIMEOUT = 10.0  # 超过这么久没有回应记为超时
+GLOBAL_REQUEST_WAIT = 10.0  # 端口转发等待其它全局请求（如卡住的往返时间探测）的最长时间（秒）
+RTT_SAMPLES = 120  # 保留最近多少次往返时间
+CLOSED_CHANNELS = 50  # 保留最近关闭的channel数量
+
+_global_request_locks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_global_request_locks_guard = threading.Lock()
+
+
+def global_request_lock(transport) -> threading.Lock:
+    """同一传输层上需要应答的全局请求必须串行发送
+    
+    paramiko 每个传输层只有一个 completion_event/global_response，
+    并发的两个请求（往返时间探测与 -R 端口转发）可能拿到对方的应答，另一个则一直等到断开。
+    """
+    with _global_request_locks_guard:
+        lock = _global_request_locks.get(transport)
+        if lock is None:
+            lock = _global_request_locks[transport] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def global_request_slot(transport, timeout: float = GLOBAL_REQUEST_WAIT):
+    """在 global_request_lock 下发送全局请求；global_request 本身没有超时，
+    持有锁的请求可能一直等不到应答，所以等锁超过 timeout 时抛出 TimeoutError"""
+    lock = global_request_lock(transport)
+    if not lock.acquire(timeout=timeout):
+        raise TimeoutError("等待上一个全局请求的应答超时")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+class Histogram:
+    """按固定桶统计的耗时分布，另保留最近的样本用于计算分位数"""
+    
+    def __init__(self, samples: int = 512):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._recent = deque(maxlen=samples)
+    
+    def record(self, ms: float):
+        index = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS) if ms <= bound), len(HISTOGRAM_BOUNDS))
+        self.counts[index] += 1
+        self.total += ms
+        self.count += 1
+        self.max = max(self.max, ms)
+        self._recent.append(ms)
+    
+    def percentile(self, q: float) -> float:
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    
+    def to_dict(self) -> dict:
+        buckets = OrderedDict()
+        for i, count in enumerate(self.counts):
+            label = f"<={HISTOGRAM_BOUNDS[i]}ms" if i < len(HISTOGRAM_BOUNDS) else f">{HISTOGRAM_BOUNDS[-1]}ms"
+            buckets[label] = count
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets": buckets,
+        }
+
+
+class ChannelRecord:
+    """一个channel的收发字节数"""
+    
+    def __init__(self, telemetry: "ConnectionTelemetry", kind: str, label: str):
+        self._telemetry = telemetry
+        self.kind = kind
+        self.label = label
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.opened_at = time.time()
+        self.closed_at: Optional[float] = None
+    
+    def add_in(self, n: int):
+        self.bytes_in += n
+    
+    def add_out(self, n: int):
+        self.bytes_out += n
+    
+    def close(self):
+        if self.closed_at is None:
+            self.closed_at = time.time()
+            self._telemetry._channel_closed(self)
+    
+    def to_dict(self) -> dict:
+        end = self.closed_at or time.time()
+        return {
+            "kind": self.kind,
+            "label": self.label,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "open": self.closed_at is None,
+            "duration_s": end - self.opened_at,
+        }
+
+
+class _CountingSocket:
+    """统计线路上收发字节数的socket包装，其余属性原样转发"""
+    
+    def __init__(self, sock, telemetry: "ConnectionTelemetry"):
+        self._sock = sock
+        self._telemetry = telemetry
+    
+    def send(self, data, *args):
+        n = self._sock.send(data, *args)
+        self._telemetry.wire_out += n
+        return n
+    
+    def sendall(self, data, *args):
+        self._sock.sendall(data, *args)
+        self._telemetry.wire_out += len(data)
+    
+    def recv(self, size, *args):
+        data = self._sock.recv(size, *args)
+        self._telemetry.wire_in += len(data)
+        return data
+    
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class ConnectionTelemetry:
+    """一个SSH连接的计时与计数（可在任意线程中更新）"""
+    
+    def __init__(self, host: str = "", port: int = 0):
+        self.host = host
+        self.port = port
+        self.phases: "OrderedDict[str, float]" = OrderedDict()  # 阶段 -> 耗时（毫秒）
+        self.connected_at: Optional[float] = None
+        self.wire_in = 0
+        self.wire_out = 0
+        self._lock = threading.Lock()
+        self._open: List[ChannelRecord] = []
+        self._closed = deque(maxlen=CLOSED_CHANNELS)
+        self._channels_total = 0
+        self._sftp: Dict[str, Histogram] = {}
+        self._rtt = Histogram(RTT_SAMPLES)
+        self._rtt_recent = deque(maxlen=RTT_SAMPLES)  # (时间戳, 毫秒)
+        self._rtt_timeouts = 0
+        self._rtt_pending_since: Optional[float] = None
+        self._probe_stop = threading.Event()
+    
+    @contextmanager
+    def phase(self, name: str):
+        """记录连接阶段耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (time.perf_counter() - start) * 1000
+    
+    def set_phase(self, name: str, ms: float):
+        self.phases[name] = ms
+    
+    def wrap_socket(self, sock):
+        return _CountingSocket(sock, self)
+    
+    def open_channel(self, kind: str, label: str = "") -> ChannelRecord:
+        record = ChannelRecord(self, kind, label)
+        with self._lock:
+            self._open.append(record)
+            self._channels_total += 1
+        return record
+    
+    def _channel_closed(self, record: ChannelRecord):
+        with self._lock:
+            if record in self._open:
+                self._open.remove(record)
+                self._closed.append(record)
+    
+    @contextmanager
+    def sftp_request(self, op: str):
+        """记录一次SFTP请求的耗时（失败的请求同样计入）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                histogram = self._sftp.get(op)
+                if histogram is None:
+                    histogram = self._sftp[op] = Histogram()
+                histogram.record(ms)
+    
+    def start_rtt_probe(self, transport, interval: float = RTT_INTERVAL):
+        """定期测量往返时间；每个连接一个线程，连接断开后自动退出
+        
+        请求的回应只有paramiko的传输线程能收到，global_request 本身没有超时，
+        所以放在独立线程中等待，超过 RTT_TIMEOUT 只记为超时，不会影响其它工作。
+        与端口转发的全局请求共用 global_request_lock，避免应答串到对方；
+        锁被占用时（端口转发请求正在等待应答）跳过这一次测量，不排队等锁。
+        """
+        lock = global_request_lock(transport)
+        
+        def loop():
+            while not self._probe_stop.wait(interval) and transport.is_active():
+                if not lock.acquire(blocking=False):
+                    continue
+                try:
+                    self._rtt_pending_since = time.monotonic()
+                    start = time.perf_counter()
+                    try:
+                        transport.global_request("keepalive@openssh.com", wait=True)
+                    except Exception:
+                        break
+                    ms = (time.perf_counter() - start) * 1000
+                finally:
+                    lock.release()
+                self._rtt_pending_since = None
+                if not transport.is_active():
+                    break
+                with self._lock:
+                    if ms > RTT_TIMEOUT * 1000:
+                        self._rtt_timeouts += 1
+                    self._rtt.record(ms)
+                    self._rtt_recent.append((time.time(), ms))
+        threading.Thread(target=loop, name=f"rtt-{self.host}", daemon=True).start()
+    
+    def stop(self):
+        self._probe_stop.set()
+    
+    def snapshot(self) -> dict:
+        """当前数据（可直接序列化为JSON）"""
+        with self._lock:
+            channels = [record.to_dict() for record in self._open + list(self._closed)]
+            sftp = {op: histogram.to_dict() for op, histogram in self._sftp.items()}
+            rtt = self._rtt.to_dict()
+            rtt["recent"] = [{"time": t, "ms": ms} for t, ms in self._rtt_recent]
+            rtt["timeouts"] = self._rtt_timeouts
+            pending = self._rtt_pending_since
+            rtt["last_ms"] = self._rtt_recent[-1][1] if self._rtt_recent else None
+            open_count, total = len(self._open), self._channels_total
+        if pending is not None and time.monotonic() - pending > RTT_TIMEOUT:
+            rtt["waiting_s"] = time.monotonic() - pending
+        return {
+            "host": self.host,
+            "port": self.port,
+            "connected_at": self.connected_at,
+            "phases_ms": dict(self.phases),
+            "wire": {"bytes_in": self.wire_in, "bytes_out": self.wire_out},
+            "channels": {"open": open_count, "total": total, "items": channels},
+            "sftp": sftp,
+            "rtt": rtt,
+        }
+    
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
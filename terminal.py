@@ -1,14 +1,91 @@
 """SSH终端界面"""
 import re
-from PyQt5.QtCore import pyqtSignal, Qt
+import threading
+from collections import deque
+from typing import List, Tuple
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QApplication)
-from PyQt5.QtGui import QFont, QTextCursor, QColor, QClipboard
+from PyQt5.QtGui import QFont, QTextCursor, QColor, QClipboard, QTextCharFormat
 from qfluentwidgets import (PushButton, LineEdit, SubtitleLabel, BodyLabel,
                            InfoBar, InfoBarPosition, FluentIcon as FIF,
                            PrimaryPushButton, CardWidget)
 
 from config import ServerConfig
-from ssh import SSHClient, SSHWorker, SSHConnectWorker, SystemInfoWorker
+from palette import QUICK_COMMANDS
+from predict import PredictiveEcho
+from appsettings import app_settings, ENGINE
+from ssh import SSHClient, SSHConnectWorker, SystemInfoWorker, looks_like_input_prompt
+
+HIBERNATE_BUFFER_SIZE = 512 * 1024  # 休眠的标签页最多缓存多少原始输出（字节）
+CATCHUP_SLICE = 64 * 1024  # 唤醒时按行切成这么大的片渲染，一次插入过大的文本反而更慢
+
+
+class OutputRing:
+    """休眠标签页的输出缓存
+    
+    只保存原始字节，不做解码、ANSI解析和排版；超出容量时丢弃最旧的部分。
+    命令执行线程在标签页隐藏期间直接把收到的字节写进来（见 SSHWorker.set_output_sink），
+    因此各方法都加锁。相邻的同类输出（正常/错误）合并为一段，唤醒时每段只需渲染一次。
+    """
+    
+    def __init__(self, capacity: int = HIBERNATE_BUFFER_SIZE):
+        self.capacity = capacity
+        self.size = 0
+        self.dropped = 0  # 因超出容量丢弃的字节数
+        self._chunks = deque()  # [是否为错误输出, bytearray]
+        self._lock = threading.Lock()
+    
+    def append(self, data: bytes, is_error: bool = False):
+        if not data:
+            return
+        with self._lock:
+            if self._chunks and self._chunks[-1][0] == is_error:
+                self._chunks[-1][1] += data
+            else:
+                self._chunks.append([is_error, bytearray(data)])
+            self.size += len(data)
+            while self.size > self.capacity:
+                excess = self.size - self.capacity
+                chunk = self._chunks[0][1]
+                if len(chunk) <= excess:
+                    self._chunks.popleft()
+                    excess = len(chunk)
+                else:
+                    # 不要从UTF-8多字节字符中间截断
+                    while excess < len(chunk) and 0x80 <= chunk[excess] < 0xC0:
+                        excess += 1
+                    del chunk[:excess]
+                self.size -= excess
+                self.dropped += excess
+    
+    def snapshot(self) -> List[Tuple[str, bool]]:
+        """缓存的输出 [(文本, 是否为错误输出)]，不清空"""
+        with self._lock:
+            return self._decode()
+    
+    def drain(self) -> List[Tuple[str, bool]]:
+        """取出全部缓存的输出 [(文本, 是否为错误输出)] 并清空"""
+        with self._lock:
+            segments = self._decode()
+            dropped = self.dropped
+            self._chunks.clear()
+            self.size = 0
+            self.dropped = 0
+        if dropped and segments:
+            text, is_error = segments[0]
+            # 丢弃的部分通常截断在行中间，从下一行开始显示
+            newline = text.find('\n')
+            if newline >= 0:
+                text = text[newline + 1:]
+            segments[0] = (f"[已省略较早的 {-(-dropped // 1024)} KB 输出]\n{text}", is_error)
+        return segments
+    
+    def _decode(self) -> List[Tuple[str, bool]]:
+        return [(bytes(data).decode('utf-8', errors='replace'), is_error)
+                for is_error, data in self._chunks]
+    
+    def __len__(self):
+        return self.size
 
 
 class TerminalWidget(QTextEdit):
@@ -16,7 +93,7 @@ class TerminalWidget(QTextEdit):
     
     commandEntered = pyqtSignal(str)
     ctrlCPressed = pyqtSignal()  # Ctrl+C信号
-    inputSubmitted = pyqtSignal(str)  # 用户输入提交信号
+    inputSubmitted = pyqtSignal(str)  # 用户按键即时转发信号
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -27,6 +104,8 @@ class TerminalWidget(QTextEdit):
         self.prompt = "$ "
         self.is_command_running = False  # 是否有命令在执行
         self.waiting_for_input = False  # 是否在等待用户输入
+        self.predictor = PredictiveEcho()  # 高延迟链路下的预测回显
+        self._prediction_anchor = -1  # 预测字符在文档中的起始位置，-1表示无预测
     
     def set_prompt(self, username: str, hostname: str, path: str = "~", is_root: bool = False):
         """设置提示符"""
@@ -70,33 +149,24 @@ class TerminalWidget(QTextEdit):
                                    position=InfoBarPosition.TOP)
                 return
         
-        # 如果在等待用户输入，直接发送输入
+        # 如果在等待用户输入，按键立即转发到远程，由远程pty负责回显
         if self.waiting_for_input:
             if event.key() in (Qt.Key_Return, Qt.Key_Enter):
-                # 提交输入
-                cursor = self.textCursor()
-                cursor.movePosition(QTextCursor.End)
-                self.setTextCursor(cursor)
-                
-                # 获取当前行的输入内容（去掉提示符）
-                line_start = cursor.position() - len(self.current_input)
-                cursor.setPosition(line_start, QTextCursor.KeepAnchor)
-                input_text = cursor.selectedText()
-                
-                # 发送输入
-                self.inputSubmitted.emit(input_text + "\n")
-                self.append_output("\n")
+                self.inputSubmitted.emit("\n")
                 self.waiting_for_input = False
                 self.current_input = ""
             elif event.key() == Qt.Key_Backspace:
-                # 允许删除输入内容
                 if len(self.current_input) > 0:
                     self.current_input = self.current_input[:-1]
-                    super().keyPressEvent(event)
-            elif event.key() >= Qt.Key_Space and event.key() <= Qt.Key_AsciiTilde:
-                # 添加可打印字符
+                    # 退格无法可靠预测，放弃未确认的预测，以服务器回显为准
+                    self.discard_predictions()
+                    self.inputSubmitted.emit("\x7f")
+            elif event.text() and event.text().isprintable():
+                # 可打印字符（含中文等非ASCII输入）
                 self.current_input += event.text()
-                super().keyPressEvent(event)
+                if self.predictor.predict(event.text()):
+                    self._insert_prediction(event.text())
+                self.inputSubmitted.emit(event.text())
             else:
                 # 其他按键忽略
                 pass
@@ -174,6 +244,22 @@ class TerminalWidget(QTextEdit):
     
     def append_output(self, text, is_error=False):
         """添加输出"""
+        if not is_error and self._prediction_anchor >= 0:
+            text = self._reconcile_predictions(text)
+        if not is_error:
+            self.predictor.observe_output(text)
+            if self._prediction_anchor >= 0 and not self.predictor.active:
+                self.discard_predictions()
+        if not text:
+            return
+        
+        # 错误输出不参与预测确认：先移走末尾的预测字符，输出后再放回，
+        # 否则下次确认或放弃预测时会把这段输出一起删掉
+        pending = ""
+        if is_error and self._prediction_anchor >= 0:
+            pending = self.predictor.pending
+            self._remove_prediction_text()
+        
         # 移除ANSI转义序列
         clean_text = self.remove_ansi_escape_sequences(text)
         
@@ -189,10 +275,56 @@ class TerminalWidget(QTextEdit):
         
         self.insertPlainText(clean_text)
         self.setTextColor(QColor("#d4d4d4"))
+        if pending:
+            self._insert_prediction(pending)
         
         # 滚动到底部
         self.moveCursor(QTextCursor.End)
     
+    def _insert_prediction(self, text: str):
+        """以灰色下划线样式在末尾显示预测字符"""
+        cursor = self.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        if self._prediction_anchor < 0:
+            self._prediction_anchor = cursor.position()
+        fmt = QTextCharFormat()
+        fmt.setForeground(QColor("#808080"))
+        fmt.setFontUnderline(True)
+        cursor.insertText(text, fmt)
+        self.setTextCursor(cursor)
+    
+    def _remove_prediction_text(self):
+        """从文档末尾移除预测字符"""
+        if self._prediction_anchor < 0:
+            return
+        cursor = self.textCursor()
+        cursor.setPosition(self._prediction_anchor)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self.setTextCursor(cursor)
+        self._prediction_anchor = -1
+    
+    def _reconcile_predictions(self, text: str) -> str:
+        """用服务器回显确认或回滚预测，返回剩余需要正常显示的输出"""
+        predicted = self.predictor.pending
+        confirmed, rest, _ = self.predictor.reconcile(text)
+        self._remove_prediction_text()
+        if confirmed:
+            cursor = self.textCursor()
+            cursor.movePosition(QTextCursor.End)
+            fmt = QTextCharFormat()
+            fmt.setForeground(QColor("#d4d4d4"))
+            cursor.insertText(predicted[:confirmed], fmt)
+            self.setTextCursor(cursor)
+        if self.predictor.pending:
+            self._insert_prediction(self.predictor.pending)
+        return rest
+    
+    def discard_predictions(self):
+        """放弃所有未确认的预测"""
+        self.predictor.reset()
+        self._remove_prediction_text()
+    
     def remove_ansi_escape_sequences(self, text):
         """移除ANSI转义序列和控制字符"""
         # ANSI转义序列的正则表达式
@@ -239,6 +371,7 @@ class TerminalWidget(QTextEdit):
         if not running:
             self.waiting_for_input = False
             self.current_input = ""
+            self.discard_predictions()
     
     def clear_terminal(self):
         """清除终端"""
@@ -260,6 +393,9 @@ class SSHTerminalInterface(QWidget):
         self.system_info_worker = None
         self.current_path = "~"
         self.system_info = {}  # 存储系统信息
+        self.hibernating = False  # 标签页不可见时休眠
+        self._hidden_output = OutputRing()
+        self._prompt_pending = False  # 休眠期间命令结束，唤醒时再显示提示符
         self.setup_ui()
     
     def setup_ui(self):
@@ -284,6 +420,12 @@ class SSHTerminalInterface(QWidget):
         
         top_row.addStretch()
         
+        self.diagnostics_button = PushButton("诊断")
+        self.diagnostics_button.setIcon(FIF.INFO)
+        self.diagnostics_button.setToolTip("连接阶段耗时、往返时间与流量统计")
+        self.diagnostics_button.clicked.connect(self.show_diagnostics)
+        top_row.addWidget(self.diagnostics_button)
+        
         self.clear_button = PushButton("清屏")
         self.clear_button.setIcon(FIF.DELETE)
         self.clear_button.clicked.connect(self.clear_terminal)
@@ -301,6 +443,16 @@ class SSHTerminalInterface(QWidget):
         self.system_info_label.setWordWrap(True)
         header_layout.addWidget(self.system_info_label)
         
+        # 第三行：端口转发状态（有转发时才显示）
+        self.forward_label = BodyLabel("")
+        self.forward_label.setWordWrap(True)
+        self.forward_label.setVisible(False)
+        header_layout.addWidget(self.forward_label)
+        
+        self.forward_timer = QTimer(self)
+        self.forward_timer.setInterval(1000)
+        self.forward_timer.timeout.connect(self.update_forward_stats)
+        
         layout.addWidget(header_card)
         
         # 终端区域
@@ -319,15 +471,7 @@ class SSHTerminalInterface(QWidget):
         # 快捷命令栏
         quick_layout = QHBoxLayout()
         
-        quick_commands = [
-            ("ls -la", "列出文件"),
-            ("pwd", "当前目录"),
-            ("top", "进程监控"),
-            ("df -h", "磁盘使用"),
-            ("free -h", "内存使用"),
-        ]
-        
-        for cmd, tip in quick_commands:
+        for cmd, tip in QUICK_COMMANDS:
             btn = PushButton(cmd)
             btn.setToolTip(tip)
             btn.clicked.connect(lambda checked, c=cmd: self.execute_command(c))
@@ -360,7 +504,12 @@ class SSHTerminalInterface(QWidget):
     
     def connect_to_server(self):
         """异步连接到服务器"""
-        self.ssh_client = SSHClient(self.server)
+        if app_settings.get(ENGINE):
+            # 连接、加解密与输出处理在独立的引擎进程中进行
+            from engine import EngineSSHClient
+            self.ssh_client = EngineSSHClient(self.server)
+        else:
+            self.ssh_client = SSHClient(self.server)
         self.ssh_client.connected.connect(self.on_connected)
         self.ssh_client.disconnected.connect(self.on_disconnected)
         self.ssh_client.error_occurred.connect(self.on_error)
@@ -384,7 +533,7 @@ class SSHTerminalInterface(QWidget):
     def on_connect_failed(self, error: str):
         """连接失败回调"""
         # 错误已经通过error_occurred信号发送
-        self.terminal.show_prompt()
+        self.show_prompt()
     
     def on_connected(self):
         """连接成功"""
@@ -397,10 +546,14 @@ class SSHTerminalInterface(QWidget):
         hostname = self.ssh_client.hostname if self.ssh_client.hostname else self.server.host
         self.terminal.set_prompt(self.server.username, hostname, "~", is_root)
         
-        self.terminal.show_prompt()
+        self.show_prompt()
         
         # 异步获取系统信息
         self.fetch_system_info()
+        
+        if self.server.forwards and not self.hibernating:
+            self.forward_timer.start()
+            self.update_forward_stats()
     
     def fetch_system_info(self):
         """异步获取系统信息"""
@@ -422,24 +575,49 @@ class SSHTerminalInterface(QWidget):
         )
         self.system_info_label.setText(info_text)
     
+    def update_forward_stats(self):
+        """刷新端口转发的吞吐量与连接数"""
+        if not self.ssh_client or not self.ssh_client.is_connected():
+            self.forward_timer.stop()
+            return
+        
+        stats = self.ssh_client.forward_stats()
+        self.forward_label.setVisible(bool(stats))
+        parts = [
+            f"🔀 {s['spec']}  连接 {s['active']}/{s['total']}  "
+            f"↓{s['rate_in'] / 1024:.1f} KB/s ↑{s['rate_out'] / 1024:.1f} KB/s"
+            for s in stats
+        ]
+        self.forward_label.setText("  |  ".join(parts))
+    
+    def show_diagnostics(self):
+        """打开连接诊断面板"""
+        from diagnostics import ConnectionDiagnosticsDialog
+        
+        def snapshot():
+            return self.ssh_client.telemetry_snapshot() if self.ssh_client else None
+        dialog = ConnectionDiagnosticsDialog(self.server.name, snapshot, self.window())
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
+    
     def get_system_info(self) -> dict:
         """获取系统信息"""
         return self.system_info
     
     def on_disconnected(self):
         """断开连接"""
-        self.terminal.append_output("\n连接已断开\n")
+        self.write_output("\n连接已断开\n")
         self.disconnected.emit()
     
     def on_error(self, error):
         """错误处理"""
-        self.terminal.append_output(f"\n错误: {error}\n", is_error=True)
+        self.write_output(f"\n错误: {error}\n", is_error=True)
     
     def execute_command(self, command: str):
         """执行命令"""
         if not self.ssh_client or not self.ssh_client.is_connected():
-            self.terminal.append_output("未连接到服务器\n", is_error=True)
-            self.terminal.show_prompt()
+            self.write_output("未连接到服务器\n", is_error=True)
+            self.show_prompt()
             return
         
         # 特殊命令处理
@@ -453,17 +631,20 @@ class SSHTerminalInterface(QWidget):
         
         # 创建工作线程执行命令
         self.terminal.set_command_running(True)
-        self.current_worker = SSHWorker(self.ssh_client, command)
+        self.current_worker = self.ssh_client.command_worker(command)
         self.current_worker.output_ready.connect(self.on_output)
         self.current_worker.error_ready.connect(self.on_command_error)
         self.current_worker.finished_signal.connect(self.on_command_finished)
         self.current_worker.input_requested.connect(self.on_input_requested)
+        self.current_worker.echo_rtt.connect(self.terminal.predictor.update_rtt)
+        if self.hibernating:
+            self.current_worker.set_output_sink(self._hidden_output)
         self.current_worker.start()
     
     def on_input_requested(self):
         """处理输入请求"""
         self.terminal.set_waiting_for_input(True)
-        self.terminal.append_output("")  # 添加新行以接收输入
+        self.write_output("")  # 添加新行以接收输入
     
     def on_user_input(self, text: str):
         """处理用户输入"""
@@ -472,17 +653,17 @@ class SSHTerminalInterface(QWidget):
     
     def on_output(self, output: str):
         """命令输出"""
-        self.terminal.append_output(output)
+        self.write_output(output)
     
     def on_command_error(self, error: str):
         """命令错误"""
-        self.terminal.append_output(error, is_error=True)
+        self.write_output(error, is_error=True)
     
     def on_command_finished(self):
         """命令执行完成"""
         self.terminal.set_command_running(False)
         self.current_worker = None
-        self.terminal.show_prompt()
+        self.show_prompt()
     
     def on_ctrl_c(self):
         """处理Ctrl+C中断"""
@@ -490,12 +671,94 @@ class SSHTerminalInterface(QWidget):
             self.current_worker.stop()
             self.terminal.set_command_running(False)
     
+    def write_output(self, text: str, is_error: bool = False):
+        """显示输出；休眠时只缓存原始输出，唤醒后再渲染
+        
+        休眠期间命令输出由执行线程直接以字节写入缓存，走到这里的只有状态提示
+        和切换前已经排队的少量信号。
+        """
+        if self.hibernating:
+            self._hidden_output.append(text.encode('utf-8', errors='replace'), is_error)
+        else:
+            self.terminal.append_output(text, is_error)
+    
+    def show_prompt(self):
+        """显示提示符；休眠时推迟到缓存的输出之后"""
+        if self.hibernating:
+            self._prompt_pending = True
+        else:
+            self.terminal.show_prompt()
+    
+    def set_hibernating(self, hibernating: bool):
+        """标签页隐藏时休眠：输出只缓存不渲染，暂停定时刷新；重新显示时一次性补上"""
+        if hibernating == self.hibernating:
+            return
+        self.hibernating = hibernating
+        if self.current_worker:
+            self.current_worker.set_output_sink(self._hidden_output if hibernating else None)
+        if hibernating:
+            self.forward_timer.stop()
+            return
+        
+        self.flush_hidden_output()
+        if self.server.forwards and self.ssh_client and self.ssh_client.is_connected():
+            self.forward_timer.start()
+            self.update_forward_stats()
+    
+    def flush_hidden_output(self):
+        """把休眠期间缓存的输出一次性渲染出来"""
+        segments = self._hidden_output.drain()
+        if not segments and not self._prompt_pending:
+            return
+        self.terminal.setUpdatesEnabled(False)
+        for text, is_error in segments:
+            start = 0
+            while start < len(text):
+                end = text.rfind('\n', start, start + CATCHUP_SLICE) + 1
+                if end <= start or len(text) - start <= CATCHUP_SLICE:
+                    end = start + CATCHUP_SLICE
+                self.terminal.append_output(text[start:end], is_error)
+                start = end
+        if self._prompt_pending:
+            self._prompt_pending = False
+            self.terminal.show_prompt()
+        elif self.current_worker and segments:
+            # 休眠期间不检测输入提示，补上对最后一段输出的检测
+            text, is_error = segments[-1]
+            if not is_error and looks_like_input_prompt(text):
+                self.on_input_requested()
+        self.terminal.setUpdatesEnabled(True)
+    
+    def restore_scrollback(self, text: str):
+        """显示上次会话保存的终端内容（灰色）"""
+        cursor = self.terminal.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        fmt = QTextCharFormat()
+        fmt.setForeground(QColor("#808080"))
+        cursor.insertText(text.rstrip('\n') + "\n—— 以上为上次会话的内容 ——\n", fmt)
+        self.terminal.setTextCursor(cursor)
+    
+    def scrollback(self) -> str:
+        """终端内容（纯文本），包括休眠期间尚未渲染的输出"""
+        text = self.terminal.toPlainText()
+        hidden = "".join(text for text, _ in self._hidden_output.snapshot())
+        if hidden:
+            text += self.terminal.remove_ansi_escape_sequences(hidden)
+        return text
+    
     def clear_terminal(self):
         """清除终端"""
         self.terminal.clear_terminal()
     
     def disconnect(self):
         """断开连接"""
+        self.forward_timer.stop()
+        # 取消还在排队或运行中的任务
+        for worker in (self.connect_worker, self.system_info_worker):
+            if worker is not None:
+                worker.cancel()
+        if self.current_worker:
+            self.current_worker.stop()
         if self.ssh_client:
             self.ssh_client.disconnect()
             self.ssh_client = None
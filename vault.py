@@ -0,0 +1,272 @@
+"""加密凭据库
+
+密码用主密码派生的密钥（scrypt）以AES-GCM加密后保存，数据库中只有 "vault:" 开头的密文。
+主密钥每个会话只派生一次；解密后的密码和解析好的私钥（Ed25519/ECDSA/RSA）缓存在内存中，
+一段时间不用后自动丢弃，批量打开大量标签页时不会重复做KDF或重新解析私钥。
+paramiko 与 cryptography 在第一次用到时才导入，不拖慢程序启动。
+"""
+import base64
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import paramiko
+
+VAULT_FILE = "vault.json"
+TOKEN_PREFIX = "vault:v1:"
+CACHE_IDLE_TIMEOUT = 15 * 60  # 缓存的明文/私钥闲置多久后丢弃（秒）
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 15, 8, 1
+_CHECK_PLAINTEXT = "sshbox-vault"
+
+
+class VaultError(Exception):
+    """凭据库相关错误"""
+
+
+class VaultLockedError(VaultError):
+    """凭据库未解锁"""
+
+
+class _IdleCache:
+    """按最后访问时间过期的缓存"""
+    
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._items: Dict[object, Tuple[object, float]] = {}
+    
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        now = time.monotonic()
+        if now - item[1] > self.timeout:
+            del self._items[key]
+            return None
+        self._items[key] = (item[0], now)
+        return item[0]
+    
+    def put(self, key, value):
+        self._items[key] = (value, time.monotonic())
+    
+    def purge(self) -> int:
+        now = time.monotonic()
+        expired = [k for k, (_, used) in self._items.items() if now - used > self.timeout]
+        for key in expired:
+            del self._items[key]
+        return len(expired)
+    
+    def clear(self):
+        self._items.clear()
+    
+    def __len__(self):
+        return len(self._items)
+
+
+def _derive_key(master_password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+    return Scrypt(salt=salt, length=32, n=n, r=r, p=p).derive(master_password.encode('utf-8'))
+
+
+def _load_pkey(path: str, passphrase: Optional[str]) -> "paramiko.PKey":
+    """解析私钥文件，自动识别 Ed25519/ECDSA/RSA
+    
+    先不带口令解析，只有私钥确实加密时才使用口令：密钥认证的服务器也可能保存了密码，
+    把它传给未加密的私钥会被paramiko拒绝。
+    """
+    import paramiko
+    try:
+        return _parse_pkey(path, None)
+    except paramiko.PasswordRequiredException:
+        if not passphrase:
+            raise
+    return _parse_pkey(path, passphrase)
+
+
+def _parse_pkey(path: str, passphrase: Optional[str]) -> "paramiko.PKey":
+    import paramiko
+    from_path = getattr(paramiko.PKey, "from_path", None)
+    if from_path is not None:
+        try:
+            return from_path(path, passphrase.encode('utf-8') if passphrase else None)
+        except TypeError as e:
+            # cryptography 对缺少口令的加密私钥抛出 TypeError
+            raise paramiko.PasswordRequiredException(str(e))
+    # 旧版paramiko没有 PKey.from_path，逐个类型尝试
+    last_error = None
+    for key_class in (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey):
+        try:
+            return key_class.from_private_key_file(path, passphrase or None)
+        except paramiko.PasswordRequiredException:
+            raise
+        except paramiko.SSHException as e:
+            last_error = e
+    raise last_error or paramiko.SSHException(f"无法识别的私钥格式: {path}")
+
+
+def is_sealed(value: str) -> bool:
+    """是否为凭据库密文"""
+    return bool(value) and value.startswith(TOKEN_PREFIX)
+
+
+class Vault:
+    """凭据库（线程安全）"""
+    
+    def __init__(self, path: str = None, idle_timeout: float = CACHE_IDLE_TIMEOUT):
+        self.path = path or os.path.join(os.path.dirname(__file__), VAULT_FILE)
+        self._lock = threading.RLock()
+        self._aead = None  # AESGCM，解锁后才有
+        self._secrets = _IdleCache(idle_timeout)  # 密文 -> 明文
+        self._keys = _IdleCache(idle_timeout)  # (路径, 修改时间, 大小, 口令) -> PKey
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.kdf_count = 0  # 本次会话做过的KDF次数
+        self._header = self._read_header()
+    
+    def _read_header(self) -> Optional[dict]:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"加载凭据库失败: {e}")
+        return None
+    
+    def is_initialized(self) -> bool:
+        return self._header is not None
+    
+    def is_unlocked(self) -> bool:
+        return self._aead is not None
+    
+    def setup(self, master_password: str):
+        """首次设置主密码并解锁"""
+        if not master_password:
+            raise VaultError("主密码不能为空")
+        salt = os.urandom(16)
+        key = _derive_key(master_password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        with self._lock:
+            self.kdf_count += 1
+            self._aead = AESGCM(key)
+            header = {
+                "version": 1,
+                "salt": base64.b64encode(salt).decode('ascii'),
+                "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P,
+                "check": self._encrypt(_CHECK_PLAINTEXT),
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(header, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._header = header
+    
+    def unlock(self, master_password: str):
+        """用主密码解锁（每个会话只需一次），密码错误时抛出VaultError"""
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        with self._lock:
+            if self._aead is not None:
+                return
+            if self._header is None:
+                raise VaultError("尚未设置主密码")
+            header = self._header
+            key = _derive_key(master_password, base64.b64decode(header["salt"]),
+                              header["n"], header["r"], header["p"])
+            self.kdf_count += 1
+            aead = AESGCM(key)
+            try:
+                self._decrypt_with(aead, header["check"])
+            except InvalidTag:
+                raise VaultError("主密码错误")
+            self._aead = aead
+    
+    def lock(self):
+        """锁定并清空内存中的密钥与缓存"""
+        with self._lock:
+            self._aead = None
+            self._secrets.clear()
+            self._keys.clear()
+    
+    def purge_expired(self) -> int:
+        """丢弃闲置超时的缓存，返回丢弃的数量"""
+        with self._lock:
+            return self._secrets.purge() + self._keys.purge()
+    
+    def _encrypt(self, plaintext: str) -> str:
+        nonce = os.urandom(12)
+        data = nonce + self._aead.encrypt(nonce, plaintext.encode('utf-8'), None)
+        return TOKEN_PREFIX + base64.b64encode(data).decode('ascii')
+    
+    @staticmethod
+    def _decrypt_with(aead, token: str) -> str:
+        data = base64.b64decode(token[len(TOKEN_PREFIX):])
+        return aead.decrypt(data[:12], data[12:], None).decode('utf-8')
+    
+    def seal(self, value: str) -> str:
+        """加密明文；已是密文、空值或凭据库未解锁时原样返回"""
+        if not value or is_sealed(value):
+            return value
+        with self._lock:
+            if self._aead is None:
+                return value
+            token = self._encrypt(value)
+            self._secrets.put(token, value)
+            return token
+    
+    def reveal(self, value: str) -> str:
+        """取得明文；明文原样返回，密文在凭据库未解锁时抛出VaultLockedError"""
+        if not is_sealed(value):
+            return value
+        from cryptography.exceptions import InvalidTag
+        with self._lock:
+            plaintext = self._secrets.get(value)
+            if plaintext is not None:
+                return plaintext
+            if self._aead is None:
+                raise VaultLockedError("凭据库未解锁")
+            try:
+                plaintext = self._decrypt_with(self._aead, value)
+            except (InvalidTag, ValueError) as e:
+                raise VaultError(f"密文已损坏: {e}")
+            self._secrets.put(value, plaintext)
+            return plaintext
+    
+    def same_secret(self, stored: str, plaintext: str) -> bool:
+        """已保存的值（可能是密文）是否与明文相同；无法解密时视为不同"""
+        if not is_sealed(stored):
+            return stored == plaintext
+        try:
+            return self.reveal(stored) == plaintext
+        except VaultError:
+            return False
+    
+    def needs_unlock(self, *values: str) -> bool:
+        """这些值中是否有需要解锁才能使用的密文"""
+        return not self.is_unlocked() and any(is_sealed(v) for v in values)
+    
+    def load_key(self, path: str, passphrase: str = "") -> "paramiko.PKey":
+        """解析私钥文件（带缓存），passphrase可以是密文
+        
+        同一私钥的并发请求只解析一次，其余线程等待并复用结果。
+        """
+        passphrase = self.reveal(passphrase)
+        st = os.stat(path)
+        cache_key = (path, st.st_mtime_ns, st.st_size, passphrase)
+        with self._lock:
+            pkey = self._keys.get(cache_key)
+            if pkey is not None:
+                return pkey
+            path_lock = self._key_locks.setdefault(path, threading.Lock())
+        with path_lock:
+            with self._lock:
+                pkey = self._keys.get(cache_key)
+            if pkey is None:
+                pkey = _load_pkey(path, passphrase)
+                with self._lock:
+                    self._keys.put(cache_key, pkey)
+            return pkey
+
+
+# 全局凭据库
+vault = Vault()
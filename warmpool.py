@@ -0,0 +1,124 @@
+"""预连接池：提前为常用服务器建立并保持已认证的SSH连接
+
+点击连接时直接接管池中已就绪的连接，省去TCP、密钥交换与认证的握手时间。
+池中连接空闲超过 idle_timeout 后自动关闭。
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class _WarmEntry:
+    def __init__(self, conn, fingerprint: dict):
+        self.conn = conn
+        self.fingerprint = fingerprint  # 建立连接时的配置快照，配置变更后不再复用
+        self.created = time.monotonic()
+        self.last_touch = self.created
+
+
+class WarmPool:
+    """已认证连接的预热池
+    
+    connector(server) 负责建立连接，返回的对象需提供 is_active() 与 close()。
+    """
+    
+    def __init__(self, connector: Callable, idle_timeout: float = 300.0, max_workers: int = 4):
+        self._connector = connector
+        self.idle_timeout = idle_timeout
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _WarmEntry] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm-pool")
+        self._reaper = threading.Thread(target=self._reap_loop, name="warm-pool-reaper", daemon=True)
+        self._stopped = threading.Event()
+        self._reaper.start()
+    
+    def warm(self, server):
+        """后台为服务器建立连接（已就绪或正在建立时忽略）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(server.id)
+            if entry is not None:
+                entry.last_touch = time.monotonic()
+                return
+            if server.id in self._inflight:
+                return
+            future = self._executor.submit(self._establish, server)
+            self._inflight[server.id] = future
+    
+    def take(self, server, wait: bool = True):
+        """取走服务器的预热连接，没有可用连接时返回None
+        
+        wait为True时若该服务器正在预热，会等待其完成而不是重复握手。
+        """
+        with self._lock:
+            future = self._inflight.get(server.id)
+        if future is not None and wait:
+            try:
+                future.result()
+            except Exception:
+                pass
+        
+        with self._lock:
+            entry = self._entries.pop(server.id, None)
+        if entry is None:
+            return None
+        if entry.fingerprint != server.to_dict() or not entry.conn.is_active():
+            entry.conn.close()
+            return None
+        return entry.conn
+    
+    def discard(self, server_id: str):
+        """关闭并移除某台服务器的预热连接"""
+        with self._lock:
+            entry = self._entries.pop(server_id, None)
+        if entry:
+            entry.conn.close()
+    
+    def warm_ids(self):
+        """当前已就绪的服务器ID"""
+        with self._lock:
+            return list(self._entries.keys())
+    
+    def close_all(self):
+        """关闭所有预热连接并停止后台线程"""
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.conn.close()
+    
+    def _establish(self, server):
+        conn = None
+        try:
+            conn = self._connector(server)
+        except Exception as e:
+            print(f"预连接 {server.name} 失败: {e}")
+        
+        with self._lock:
+            self._inflight.pop(server.id, None)
+            if conn is None:
+                return
+            # 建立期间预连接可能已被关闭（设置中关掉或程序退出），这时不再放入池中
+            unwanted = self._stopped.is_set() or not self.enabled or server.id in self._entries
+            if not unwanted:
+                self._entries[server.id] = _WarmEntry(conn, server.to_dict())
+        if unwanted:
+            conn.close()
+    
+    def _reap_loop(self):
+        """定期关闭空闲超时或已断开的连接"""
+        while not self._stopped.wait(10):
+            now = time.monotonic()
+            expired = []
+            with self._lock:
+                for server_id, entry in list(self._entries.items()):
+                    if now - entry.last_touch > self.idle_timeout or not entry.conn.is_active():
+                        expired.append(self._entries.pop(server_id))
+            for entry in expired:
+                entry.conn.close()